@@ -0,0 +1,279 @@
+"""
+Throughput and latency benchmark for the stream runners.
+
+Each configuration builds a pipeline of one `videotestsrc` per input feeding the runner under test, whose output goes
+to a `fakesink`, and runs it to EOS in its own subprocess so that peak RSS and CPU time are per configuration. Results
+are written as a JSON list with one entry per configuration holding the fps, per-frame latency percentiles through the
+runner, CPU time, and peak RSS, eg.:
+
+    python -m monaistream.bin.benchmark_runners --runners inplace backend --resolutions 640x480 -o results.json
+
+Frames and fps count the buffers leaving the runner's src pad. Latency is measured with pad probes on the runner's
+sink and src pads matching buffers by PTS, so it covers the runner alone and not the time frames spend in the queues
+before it.
+"""
+
+import argparse
+import itertools
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+RUNNERS = ("inplace", "adaptor", "aggregator", "backend", "numpyinplace")
+MULTI_INPUT_RUNNERS = ("aggregator", "backend")
+ARRAY_TYPE_RUNNERS = ("backend",)
+
+_class_ids = itertools.count()
+
+
+
+def _invert(frames):
+    return [255 - frames[0]]
+
+
+
+def _invert_inplace(self, data):
+    np.subtract(255, data, out=data)
+
+
+
+def _invert_adaptor(self, in_data, out_data):
+    np.subtract(255, in_data, out=out_data)
+
+
+
+def _invert_aggregated(self, images):
+    return _invert(images)[0]
+
+
+
+def create_runner_type(runner, caps, num_inputs, array_type):
+    """
+    Create the element type for the named runner with a trivial do_op inverting its first input, returning the type and
+    the names of its sink and src pads as used in a pipeline description.
+    """
+    import gi
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    Gst.init(None)
+
+    from monaistream.streamrunners import gstreamer_plugin
+    from monaistream.streamrunners.gstreamer.backend import GstStreamRunnerBackend
+    from monaistream.streamrunners.gstreamer.utils import PadEntry
+
+    name = f"Benchmark{runner.title()}{next(_class_ids)}"
+
+    if runner == "inplace":
+        return type(name, (gstreamer_plugin.GstInPlaceStreamRunner,), {"do_op": _invert_inplace}), ["sink"], "src"
+    if runner == "adaptor":
+        return type(name, (gstreamer_plugin.GstAdaptorStreamRunner,), {"do_op": _invert_adaptor}), ["sink"], "src"
+    if runner == "aggregator":
+        base = gstreamer_plugin.GstMultiInputStreamRunner
+        return type(name, (base,), {"do_op": _invert_aggregated}), [f"sink_{i}" for i in range(num_inputs)], "src"
+    if runner == "backend":
+        inputs = [PadEntry(f"sink_{i}", caps) for i in range(num_inputs)]
+        outputs = [PadEntry("src_0", caps)]
+
+        def __init__(self):
+            GstStreamRunnerBackend.__init__(self, inputs, outputs, _invert, array_type)
+
+        return type(name, (GstStreamRunnerBackend,), {"__init__": __init__}), [i.name for i in inputs], "src_0"
+    if runner == "numpyinplace":
+        from monaistream.gstreamer.numpy_transforms import NumpyInplaceTransform
+
+        return type(name, (NumpyInplaceTransform,), {}), ["sink"], "src"
+
+    raise ValueError(f"unknown runner {runner}; must be one of {RUNNERS}")
+
+
+
+def run_config(config):
+    """
+    Run the pipeline for one configuration to EOS in this process and return its measurements.
+    """
+    import gi
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    from monaistream.streamrunners.gstreamer.utils import register
+
+    width, height = config["width"], config["height"]
+    caps = f"video/x-raw,format={config['format']},width={width},height={height}"
+
+    runner_type, sink_names, src_name = create_runner_type(
+        config["runner"], caps, config["inputs"], config["array_type"]
+    )
+    alias = runner_type.__name__.lower()  # unique so that several configurations can be run in one process
+    register(runner_type, alias)
+
+    sources = " ".join(
+        f"videotestsrc num-buffers={config['num_buffers']} pattern={i} ! {caps} ! queue ! runner.{s}"
+        for i, s in enumerate(sink_names)
+    )
+    pipeline = Gst.parse_launch(f"{alias} name=runner {sources} runner.{src_name} ! fakesink sync=false")
+    runner = pipeline.get_by_name("runner")
+
+    arrivals = dict()
+    latencies = list()
+    num_frames = 0
+
+    def _on_sink_buffer(pad, info):
+        arrivals.setdefault(info.get_buffer().pts, time.perf_counter())
+        return Gst.PadProbeReturn.OK
+
+    def _on_src_buffer(pad, info):
+        nonlocal num_frames
+        num_frames += 1
+        arrival = arrivals.pop(info.get_buffer().pts, None)
+        if arrival is not None:
+            latencies.append(time.perf_counter() - arrival)
+        return Gst.PadProbeReturn.OK
+
+    for pad in runner.sinkpads:
+        pad.add_probe(Gst.PadProbeType.BUFFER, _on_sink_buffer)
+    for pad in runner.srcpads:
+        pad.add_probe(Gst.PadProbeType.BUFFER, _on_src_buffer)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    pipeline.set_state(Gst.State.NULL)
+
+    if message.type == Gst.MessageType.ERROR:
+        error, debug = message.parse_error()
+        raise RuntimeError(f"{error.message} ({debug})")
+
+    latencies_ms = np.asarray(latencies) * 1000
+    latency = None
+    if len(latencies):
+        latency = {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+        }
+
+    return {
+        "frames": num_frames,
+        "wall_time_s": wall_time,
+        "fps": num_frames / wall_time if wall_time > 0 else 0.0,
+        "latency_ms": latency,
+        "cpu_time_s": cpu_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # ru_maxrss is in KiB on Linux
+    }
+
+
+
+def iter_configs(runners, resolutions, formats, input_counts, array_types, num_buffers):
+    """
+    Yield the configurations to benchmark, skipping input counts and array types the runners don't support.
+    """
+    for runner, resolution, format, inputs, array_type in itertools.product(
+        runners, resolutions, formats, input_counts, array_types
+    ):
+        if inputs > 1 and runner not in MULTI_INPUT_RUNNERS:
+            continue
+        if array_type != array_types[0] and runner not in ARRAY_TYPE_RUNNERS:
+            continue
+
+        width, height = (int(v) for v in resolution.split("x"))
+        yield {
+            "runner": runner,
+            "width": width,
+            "height": height,
+            "format": format,
+            "inputs": inputs,
+            "array_type": array_type if runner in ARRAY_TYPE_RUNNERS else "numpy",
+            "num_buffers": num_buffers,
+        }
+
+
+
+def run_config_in_subprocess(config, timeout):
+    """
+    Run one configuration in a new interpreter, returning its measurements or an "error" entry if it failed.
+    """
+    cmd = [sys.executable, "-m", "monaistream.bin.benchmark_runners", "--config", json.dumps(config)]
+
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout}s"}
+
+    # runners print to stdout as well, so the result is the last line
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        errors = proc.stderr.strip().splitlines()
+        return {"error": errors[-1] if errors else f"exit code {proc.returncode}"}
+    return json.loads(lines[-1])
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runners", nargs="+", choices=RUNNERS, default=RUNNERS)
+    parser.add_argument(
+        "--resolutions", nargs="+", default=["320x240", "1280x720", "1920x1080"], help="frame sizes as WIDTHxHEIGHT"
+    )
+    parser.add_argument("--formats", nargs="+", default=["RGB", "RGBA"])
+    parser.add_argument(
+        "--inputs",
+        nargs="+",
+        type=int,
+        default=[1, 2],
+        help="input counts, only multi-input runners are run with more than one",
+    )
+    parser.add_argument(
+        "--array-types",
+        nargs="+",
+        choices=("numpy", "torch"),
+        default=["numpy", "torch"],
+        help="array types, only used by runners that support them",
+    )
+    parser.add_argument("-n", "--num-buffers", type=int, default=300, help="frames produced by each source")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds allowed for each configuration")
+    parser.add_argument(
+        "--in-process", action="store_true", help="run configurations in this process, so peak RSS is cumulative"
+    )
+    parser.add_argument("-o", "--output", help="file to write the JSON results to, stdout if not given")
+    parser.add_argument("--config", help=argparse.SUPPRESS)  # used to run a single configuration in a subprocess
+
+    args = parser.parse_args()
+
+    if args.config is not None:
+        print(json.dumps(run_config(json.loads(args.config))))
+        sys.exit(0)
+
+    results = list()
+    configs = iter_configs(
+        args.runners, args.resolutions, args.formats, args.inputs, args.array_types, args.num_buffers
+    )
+
+    for config in configs:
+        print(f"running {config}", file=sys.stderr)
+
+        if args.in_process:
+            try:
+                measurements = run_config(config)
+            except Exception as e:
+                measurements = {"error": repr(e)}
+        else:
+            measurements = run_config_in_subprocess(config, args.timeout)
+
+        results.append({**config, **measurements})
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -42,6 +42,7 @@ if HAS_GI:
     # Gst.debug_set_default_threshold(5)
 
     from monaistream.gstreamer.utils import *
+    from monaistream.gstreamer.numpy_ops import *
     from monaistream.gstreamer.numpy_transforms import *
 
     # TODO: import more things here
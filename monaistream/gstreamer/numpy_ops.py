@@ -0,0 +1,435 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Vectorized Numpy operations on video frames used by the transforms in `numpy_transforms`. These don't depend on
+GStreamer so that they can be used and tested without it.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+
+__all__ = [
+    "Roi",
+    "find_content_roi",
+    "FrameNormalizer",
+    "RESIZE_METHODS",
+    "resize_frame",
+    "upscale_mask",
+    "DEFAULT_LABEL_COLORS",
+    "LabelOverlay",
+]
+
+RESIZE_METHODS = ("nearest", "bilinear")
+
+# RGB colours for labels 1 onwards, cycled for higher labels
+DEFAULT_LABEL_COLORS = (
+    (230, 25, 75),
+    (60, 180, 75),
+    (255, 225, 25),
+    (0, 130, 200),
+    (245, 130, 48),
+    (145, 30, 180),
+    (70, 240, 240),
+    (240, 50, 230),
+)
+
+
+@dataclass(frozen=True)
+class Roi:
+    """
+    A rectangular region of interest of a frame, with its top left corner at column `x` and row `y`.
+    """
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+    @classmethod
+    def full(cls, height, width):
+        return cls(0, 0, width, height)
+
+    def clamp(self, height, width):
+        """
+        Get this region clipped to a frame of the given size, which is the whole frame if the region is empty.
+        """
+        x = min(max(self.x, 0), width)
+        y = min(max(self.y, 0), height)
+        w = min(max(self.width, 0), width - x)
+        h = min(max(self.height, 0), height - y)
+
+        if w == 0 or h == 0:
+            return Roi.full(height, width)
+
+        return Roi(x, y, w, h)
+
+    def view(self, frame):
+        """
+        Get the region of `frame` as a view, so that writing to it writes to the frame.
+        """
+        return frame[self.y : self.y + self.height, self.x : self.x + self.width]
+
+    def to_frame(self, coords):
+        """
+        Map coordinates in the region to coordinates in the full frame. `coords` is an array whose last dimension holds
+        alternating x and y values, eg. points as (x, y) or boxes as (x1, y1, x2, y2).
+        """
+        coords = np.array(coords)
+        coords[..., 0::2] += self.x
+        coords[..., 1::2] += self.y
+        return coords
+
+    def from_frame(self, coords):
+        """
+        Map coordinates in the full frame to coordinates in the region, the inverse of `to_frame`.
+        """
+        coords = np.array(coords)
+        coords[..., 0::2] -= self.x
+        coords[..., 1::2] -= self.y
+        return coords
+
+
+def find_content_roi(frame, threshold=16, step=4, margin=0) -> Optional[Roi]:
+    """
+    Find the bounding box of the pixels of the (H, W) or (H, W, C) `frame` with a component above `threshold`, such as
+    the image area of an ultrasound or endoscope frame inside a black border. Only every `step`th row and column is
+    checked so the box is grown by `step` to cover the pixels skipped, then by `margin` pixels. Returns None if no
+    pixel is above the threshold.
+    """
+    height, width = frame.shape[:2]
+    sampled = frame[::step, ::step]
+    content = sampled > threshold
+    if content.ndim == 3:
+        content = content.any(axis=2)
+
+    rows = np.flatnonzero(content.any(axis=1))
+    cols = np.flatnonzero(content.any(axis=0))
+    if len(rows) == 0:
+        return None
+
+    pad = step - 1 + margin
+    y0 = max(rows[0] * step - pad, 0)
+    x0 = max(cols[0] * step - pad, 0)
+    y1 = min(rows[-1] * step + pad + 1, height)
+    x1 = min(cols[-1] * step + pad + 1, width)
+
+    return Roi(int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+
+
+class FrameNormalizer:
+    """
+    Converts (H, W, C) integer frames into normalized float arrays, computing `(frame * scale - mean) / std` per channel
+    as a multiply written straight into the output followed by an in place add, with the constants folded together so
+    that no intermediate arrays are allocated. `channels` selects and orders the input channels of the output, eg.
+    (2, 1, 0) to convert BGR to RGB or (0, 1, 2) to drop the padding of RGBx, and is every channel in order by default.
+    The output is (C, H, W) if `channels_first` is set, otherwise (H, W, C).
+
+    Outputs are written into preallocated arrays which are reused rather than allocated per frame, cycling through
+    `num_outputs` of them so that earlier outputs stay valid while later frames are converted, eg. while batched or
+    queued: an output is reused only once `num_outputs` later ones have been returned. Call `reserve` to increase the
+    number if more outputs may be in use at once. The constants derived from the scale, mean and std are cached until
+    one of those is set.
+    """
+
+    def __init__(
+        self,
+        scale: float = 1.0 / 255,
+        mean: Optional[Sequence[float]] = None,
+        std: Optional[Sequence[float]] = None,
+        channels: Optional[Sequence[int]] = None,
+        channels_first: bool = True,
+        dtype=np.float32,
+        num_outputs: int = 1,
+    ):
+        self._scale = scale
+        self._mean = mean
+        self._std = std
+        self._cached = None  # (number of channels, scales, offsets) for the current constants
+        self.channels = None if channels is None else tuple(channels)
+        self.channels_first = channels_first
+        self.dtype = np.dtype(dtype)
+        self.num_outputs = num_outputs
+        self._outputs = deque()  # least recently returned first
+
+    @property
+    def scale(self):
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale):
+        self._scale = scale
+        self._cached = None
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @mean.setter
+    def mean(self, mean):
+        self._mean = mean
+        self._cached = None
+
+    @property
+    def std(self):
+        return self._std
+
+    @std.setter
+    def std(self, std):
+        self._std = std
+        self._cached = None
+
+    def reserve(self, num_outputs):
+        """
+        Make sure at least `num_outputs` outputs are cycled through. Only newly allocated outputs are returned until
+        there are that many, so outputs already returned aren't reused any sooner.
+        """
+        self.num_outputs = max(self.num_outputs, num_outputs)
+
+    def _coefficients(self, num_channels):
+        cached = self._cached
+        if cached is None or cached[0] != num_channels or cached[1].dtype != self.dtype:
+            mean = np.broadcast_to(np.asarray(0.0 if self._mean is None else self._mean, np.float64), (num_channels,))
+            std = np.broadcast_to(np.asarray(1.0 if self._std is None else self._std, np.float64), (num_channels,))
+            scales, offsets = (self._scale / std).astype(self.dtype), (-mean / std).astype(self.dtype)
+            cached = self._cached = (num_channels, scales, offsets)
+        return cached[1], cached[2]
+
+    def _output(self, shape):
+        """
+        Get the least recently returned output array of the given shape, allocating one if fewer than `num_outputs`
+        have been.
+        """
+        if self._outputs and self._outputs[0].shape != shape:
+            self._outputs.clear()
+
+        if len(self._outputs) < self.num_outputs:
+            out = np.empty(shape, self.dtype)
+        else:
+            out = self._outputs.popleft()
+
+        self._outputs.append(out)
+        return out
+
+    def __call__(self, frame, out=None):
+        """
+        Convert `frame`, writing into `out` if given or else into the next reused output, which is returned.
+        """
+        if frame.ndim == 2:
+            frame = frame[..., None]
+
+        height, width, num_channels = frame.shape
+        channels = self.channels if self.channels is not None else tuple(range(num_channels))
+        shape = (len(channels), height, width) if self.channels_first else (height, width, len(channels))
+
+        if out is None:
+            out = self._output(shape)
+        elif out.shape != shape:
+            raise ValueError(f"Output shape {out.shape} doesn't match the expected shape {shape}.")
+
+        scales, offsets = self._coefficients(len(channels))
+        dest = out if self.channels_first else out.transpose(2, 0, 1)
+
+        for dest_channel, channel, scale, offset in zip(dest, channels, scales, offsets):
+            np.multiply(frame[..., channel], scale, out=dest_channel)
+            dest_channel += offset
+
+        return out
+
+
+def _source_coords(src_size, dst_size):
+    """
+    Get the position in the source of the centre of each destination pixel when resizing along one dimension.
+    """
+    return (np.arange(dst_size, dtype=np.float64) + 0.5) * (src_size / dst_size) - 0.5
+
+
+@lru_cache(maxsize=32)
+def _nearest_table(src_size, dst_size):
+    """
+    Get the index of the source pixel nearest to each destination pixel, cached per geometry.
+    """
+    indices = np.floor(_source_coords(src_size, dst_size) + 0.5).astype(np.intp)
+    return np.clip(indices, 0, src_size - 1)
+
+
+@lru_cache(maxsize=32)
+def _linear_table(src_size, dst_size):
+    """
+    Get the indices of the two source pixels each destination pixel is interpolated from and the weight of the second,
+    cached per geometry.
+    """
+    coords = np.clip(_source_coords(src_size, dst_size), 0, src_size - 1)
+    lower = np.floor(coords).astype(np.intp)
+    upper = np.minimum(lower + 1, src_size - 1)
+    return lower, upper, (coords - lower).astype(np.float32)
+
+
+def _lerp(frame, table, axis):
+    lower, upper, weights = table
+    low = np.take(frame, lower, axis=axis).astype(np.float32)
+    high = np.take(frame, upper, axis=axis).astype(np.float32)
+    shape = [1] * frame.ndim
+    shape[axis] = len(weights)
+    high -= low
+    high *= weights.reshape(shape)
+    low += high
+    return low
+
+
+def resize_frame(frame, height, width, method="bilinear", out=None):
+    """
+    Resize the (H, W) or (H, W, C) `frame` to the given size with nearest neighbour or bilinear interpolation, writing
+    into `out` if given. Both methods look up which source pixels each output pixel comes from in tables computed once
+    per geometry, and bilinear interpolation is done as two separable passes, first along rows so that downscaling
+    reduces the data as early as possible. Integer frames are rounded back to their own dtype.
+    """
+    if method not in RESIZE_METHODS:
+        raise ValueError(f"method must be one of {RESIZE_METHODS}, got {method}")
+
+    src_height, src_width = frame.shape[:2]
+
+    if method == "nearest":
+        result = np.take(frame, _nearest_table(src_height, height), axis=0)
+        result = np.take(result, _nearest_table(src_width, width), axis=1)
+    else:
+        result = _lerp(frame, _linear_table(src_height, height), axis=0)
+        result = _lerp(result, _linear_table(src_width, width), axis=1)
+        if np.issubdtype(frame.dtype, np.integer):
+            np.rint(result, out=result)
+
+    if out is None:
+        return result.astype(frame.dtype, copy=False)
+
+    np.copyto(out, result, casting="unsafe")
+    return out
+
+
+def upscale_mask(mask, height, width, out=None):
+    """
+    Resize the label `mask`, computed on a downscaled frame, back to the source resolution with nearest neighbour
+    interpolation so that labels aren't blended together, writing into `out` if given.
+    """
+    return resize_frame(mask, height, width, method="nearest", out=out)
+
+
+class LabelOverlay:
+    """
+    Alpha blends label masks onto frames in place, colouring each labelled pixel with the colour of its label. The
+    `colors` of labels 1 onwards are (R, G, B) or (R, G, B, A) tuples of 8 bit values, cycled for labels beyond the end
+    of the sequence, and label 0 is left transparent. The alpha of each label is multiplied by `opacity`.
+
+    The blend is computed with 8 bit fixed point integer arithmetic over the bounding box of the labelled pixels, using
+    tables of the premultiplied colour and inverse alpha of each of the `num_labels` labels which are computed once
+    whenever the colours or opacity change. Transparent labels blend back to the original values exactly, and labels
+    beyond the tables are given the colour of the last.
+
+    `channels` are the contiguous positions of the red, green and blue components in the frames, eg. (2, 1, 0) for BGR,
+    or a single position for grayscale frames which are blended with the luma of the colours.
+    """
+
+    def __init__(
+        self,
+        colors: Sequence[Sequence[int]] = DEFAULT_LABEL_COLORS,
+        opacity: float = 0.5,
+        channels: Sequence[int] = (0, 1, 2),
+        num_labels: int = 256,
+    ):
+        self.num_labels = num_labels
+        self._colors = colors
+        self._opacity = opacity
+        self._channels = tuple(channels)
+        self._build_tables()
+
+    @property
+    def colors(self):
+        return self._colors
+
+    @colors.setter
+    def colors(self, colors):
+        self._colors = colors
+        self._build_tables()
+
+    @property
+    def opacity(self):
+        return self._opacity
+
+    @opacity.setter
+    def opacity(self, opacity):
+        self._opacity = opacity
+        self._build_tables()
+
+    @property
+    def channels(self):
+        return self._channels
+
+    @channels.setter
+    def channels(self, channels):
+        self._channels = tuple(channels)
+        self._build_tables()
+
+    def _build_tables(self):
+        start, stop = min(self._channels), max(self._channels) + 1
+        if stop - start != len(self._channels) or len(set(self._channels)) != len(self._channels):
+            raise ValueError(f"Channels must be contiguous positions, got {self._channels}")
+
+        colors = np.zeros((self.num_labels, 4), np.int64)
+        colors[:, 3] = 255
+        if self._colors:
+            for label in range(1, self.num_labels):
+                color = self._colors[(label - 1) % len(self._colors)]
+                colors[label, : len(color)] = color
+        colors[0, 3] = 0
+
+        if len(self._channels) == 1:
+            rgb = (colors[:, :1] * 77 + colors[:, 1:2] * 150 + colors[:, 2:3] * 29 + 128) >> 8
+        else:
+            rgb = np.zeros((self.num_labels, len(self._channels)), np.int64)
+            rgb[:, np.array(self._channels) - start] = colors[:, :3]
+
+        alpha = np.rint(colors[:, 3] * np.clip(self._opacity, 0.0, 1.0) * 256 / 255).astype(np.int64)
+
+        self._slice = slice(start, stop)
+        self._inverse = (256 - alpha).astype(np.uint16)
+        self._weighted = (rgb * alpha[:, None] + 128).astype(np.uint16)  # rounded once the blend is shifted back
+
+    def __call__(self, frame, mask):
+        """
+        Blend the (H, W) or (H, W, 1) integer `mask` onto the (H, W, C) uint8 `frame` in place and return the frame.
+        Masks of a different size, eg. computed on a downscaled frame, are upscaled to the frame's with `upscale_mask`.
+        """
+        if mask.ndim == 3:
+            mask = mask[..., 0]
+        if mask.shape != frame.shape[:2]:
+            mask = upscale_mask(mask, *frame.shape[:2])
+
+        rows = np.flatnonzero(mask.any(axis=1))
+        if len(rows) == 0:
+            return frame
+
+        rows = slice(rows[0], rows[-1] + 1)
+        cols = np.flatnonzero(mask[rows].any(axis=0))
+        cols = slice(cols[0], cols[-1] + 1)
+
+        labels = mask[rows, cols]
+        target = frame[rows, cols, self._slice] if frame.ndim == 3 else frame[rows, cols, None]
+
+        pixels = target.astype(np.uint16)
+        pixels *= np.take(self._inverse, labels, mode="clip")[..., None]
+        pixels += np.take(self._weighted, labels, axis=0, mode="clip")
+        np.right_shift(pixels, 8, out=pixels)
+        np.copyto(target, pixels, casting="unsafe")
+
+        return frame
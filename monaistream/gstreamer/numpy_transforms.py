@@ -9,14 +9,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from contextlib import contextmanager
 import numpy as np
 
-from gi.repository import Gst, GObject, GstBase
+from gi.repository import GLib, Gst, GObject, GstBase
 
-from monaistream.gstreamer.utils import map_buffer_to_numpy, get_video_pad_template
+from monaistream.gstreamer.numpy_ops import RESIZE_METHODS, FrameNormalizer, Roi, find_content_roi, resize_frame
+from monaistream.gstreamer.utils import (
+    map_buffer_to_numpy, get_color_channels, get_video_geometry, get_video_pad_template
+)
 
-__all__=["NumpyInplaceTransform"]
+__all__=[
+    "NumpyInplaceTransform", "NumpyRoiTransform", "NumpyNormalizeTransform", "NumpyResizeTransform", "get_tensor_caps"
+]
 
 class NumpyInplaceTransform(GstBase.BaseTransform):
     """ 
@@ -28,15 +32,361 @@ class NumpyInplaceTransform(GstBase.BaseTransform):
         get_video_pad_template("sink", Gst.PadDirection.SINK),
     )
 
+    def do_set_caps(self, incaps: Gst.Caps, outcaps: Gst.Caps) -> bool:
+        """
+        Store the frame geometry for the negotiated capabilities so that it isn't recomputed for every buffer.
+        """
+        self._geometry = get_video_geometry(incaps)
+        return True
+
     def do_transform_ip(self, buffer: Gst.Buffer) -> Gst.FlowReturn:
         """ 
         """
-        with map_buffer_to_numpy(buffer, Gst.MapFlags.WRITE, self.sinkpad.get_current_caps()) as image_array:
+        with map_buffer_to_numpy(buffer, Gst.MapFlags.WRITE, self._geometry) as image_array:
             height, width, _ = image_array.shape
             image_array[: height // 2, : width // 2] = 128
 
         return Gst.FlowReturn.OK
 
 
+class NumpyRoiTransform(GstBase.BaseTransform):
+    """
+    Restricts an in place operation to a region of interest of each frame, such as the image area of an ultrasound or
+    endoscope frame without its border and UI overlays. Subclasses implement `do_op(self, roi_frame, roi)` where
+    `roi_frame` is a zero-copy view of the region in the mapped buffer, so results written to it appear in place in the
+    full frame, and `roi` is the Roi whose `to_frame` method maps coordinates computed in the region back to full frame
+    coordinates. Nothing is done outside the region.
+
+    The region is set with the "roi-x", "roi-y", "roi-width" and "roi-height" properties, which can be changed while
+    playing and are clipped to the frame, and an empty region is the whole frame. If "auto-roi" is set the region is
+    instead the bounding box of the pixels brighter than "auto-threshold", found every "auto-interval" frames.
+    """
+    __gstmetadata__ = ("Numpy ROI Transform", "Transform", "Applies an operation to a region of interest", "MONAI")
+
+    __gsttemplates__ = (
+        get_video_pad_template("src", Gst.PadDirection.SRC),
+        get_video_pad_template("sink", Gst.PadDirection.SINK),
+    )
+
+    __gproperties__ = {
+        "roi-x": (int, "ROI x", "Left column of the region", 0, GLib.MAXINT, 0, GObject.ParamFlags.READWRITE),
+        "roi-y": (int, "ROI y", "Top row of the region of interest", 0, GLib.MAXINT, 0, GObject.ParamFlags.READWRITE),
+        "roi-width": (
+            int, "ROI width", "Width of the region of interest, 0 for the whole frame", 0, GLib.MAXINT, 0,
+            GObject.ParamFlags.READWRITE,
+        ),
+        "roi-height": (
+            int, "ROI height", "Height of the region of interest, 0 for the whole frame", 0, GLib.MAXINT, 0,
+            GObject.ParamFlags.READWRITE,
+        ),
+        "auto-roi": (
+            bool, "Automatic ROI", "Use the bounding box of the non-black pixels as the region of interest", False,
+            GObject.ParamFlags.READWRITE,
+        ),
+        "auto-threshold": (
+            int, "Automatic ROI threshold", "Pixel value above which pixels are part of the automatic region", 0, 65535,
+            16, GObject.ParamFlags.READWRITE,
+        ),
+        "auto-interval": (
+            int, "Automatic ROI interval", "Frames between updates of the automatic region", 1, GLib.MAXINT, 30,
+            GObject.ParamFlags.READWRITE,
+        ),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.roi = Roi(0, 0, 0, 0)
+        self.auto_roi = False
+        self.auto_threshold = 16
+        self.auto_interval = 30
+        self._auto_roi = None
+        self._frame_count = 0
+        self._color_channels = slice(None)  # the components thresholded to find the content, excluding alpha or padding
+
+    def do_get_property(self, prop):
+        if prop.name == "roi-x":
+            return self.roi.x
+        if prop.name == "roi-y":
+            return self.roi.y
+        if prop.name == "roi-width":
+            return self.roi.width
+        if prop.name == "roi-height":
+            return self.roi.height
+        if prop.name == "auto-roi":
+            return self.auto_roi
+        if prop.name == "auto-threshold":
+            return self.auto_threshold
+        if prop.name == "auto-interval":
+            return self.auto_interval
+        raise AttributeError(f"No such property {prop.name}")
+
+    def do_set_property(self, prop, value):
+        # the region is replaced rather than modified so the streaming thread always sees a consistent one
+        if prop.name == "roi-x":
+            self.roi = Roi(value, self.roi.y, self.roi.width, self.roi.height)
+        elif prop.name == "roi-y":
+            self.roi = Roi(self.roi.x, value, self.roi.width, self.roi.height)
+        elif prop.name == "roi-width":
+            self.roi = Roi(self.roi.x, self.roi.y, value, self.roi.height)
+        elif prop.name == "roi-height":
+            self.roi = Roi(self.roi.x, self.roi.y, self.roi.width, value)
+        elif prop.name == "auto-roi":
+            self.auto_roi = value
+            self._auto_roi = None
+            self._frame_count = 0
+        elif prop.name == "auto-threshold":
+            self.auto_threshold = value
+        elif prop.name == "auto-interval":
+            self.auto_interval = value
+        else:
+            raise AttributeError(f"No such property {prop.name}")
+
+    def do_set_caps(self, incaps: Gst.Caps, outcaps: Gst.Caps) -> bool:
+        self._geometry = get_video_geometry(incaps)
+        channels = get_color_channels(self._geometry.format)
+        self._color_channels = slice(min(channels), max(channels) + 1)
+        self._auto_roi = None
+        return True
+
+    def current_roi(self, frame):
+        """
+        Get the region of interest to use for `frame`, clipped to its size.
+        """
+        height, width = frame.shape[:2]
+
+        if not self.auto_roi:
+            return self.roi.clamp(height, width)
+
+        if self._auto_roi is None or self._frame_count % self.auto_interval == 0:
+            content = frame[..., self._color_channels] if frame.ndim == 3 else frame
+            self._auto_roi = find_content_roi(content, self.auto_threshold) or Roi.full(height, width)
+        self._frame_count += 1
+
+        return self._auto_roi.clamp(height, width)
+
+    def do_op(self, roi_frame, roi):
+        pass
+
+    def do_transform_ip(self, buffer: Gst.Buffer) -> Gst.FlowReturn:
+        with map_buffer_to_numpy(buffer, Gst.MapFlags.WRITE, self._geometry) as image_array:
+            roi = self.current_roi(image_array)
+            self.do_op(roi.view(image_array), roi)
+
+        return Gst.FlowReturn.OK
+
+
+def _parse_list(value, dtype=float):
+    return None if not value else [dtype(v) for v in value.split(",")]
+
+
+def get_tensor_caps(shape, dtype="float32", framerate=None):
+    """
+    Get NNStreamer style "other/tensor" caps for tensors of the given shape, whose dimensions are listed innermost
+    first so that (C, H, W) becomes "W:H:C".
+    """
+    caps = f"other/tensor,type={dtype},dimension={':'.join(str(d) for d in reversed(shape))}"
+    if framerate is not None:
+        caps += f",framerate={framerate[0]}/{framerate[1]}"
+    return Gst.Caps.from_string(caps)
+
+
+class NumpyNormalizeTransform(GstBase.BaseTransform):
+    """
+    Converts video frames into normalized float32 tensors with FrameNormalizer writing directly into the output buffer,
+    so that a model downstream receives its input ready to use rather than every operation casting, transposing and
+    normalizing frames itself. Each output value is `(value * scale - mean) / std` for its channel, with "mean" and
+    "std" given as comma separated lists, "channels" selects and orders the input channels, eg. "2,1,0" to convert BGR
+    to RGB, and the layout is (C, H, W) if "channels-first" is set and otherwise (H, W, C). The output caps are
+    "other/tensor" caps as produced by `get_tensor_caps`, renegotiated if "channels" or "channels-first" are changed
+    while playing.
+    """
+    __gstmetadata__ = ("Numpy Normalize Transform", "Transform", "Converts frames to normalized float tensors", "MONAI")
+
+    __gsttemplates__ = (
+        Gst.PadTemplate.new(
+            "src", Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS, Gst.Caps.from_string("other/tensor,type=float32")
+        ),
+        get_video_pad_template("sink", Gst.PadDirection.SINK),
+    )
+
+    __gproperties__ = {
+        "scale": (
+            float, "Scale", "Factor pixel values are multiplied by", 0.0, GLib.MAXDOUBLE, 1.0 / 255,
+            GObject.ParamFlags.READWRITE,
+        ),
+        "mean": (str, "Mean", "Comma separated per channel means", "", GObject.ParamFlags.READWRITE),
+        "std": (str, "Standard deviation", "Comma separated per channel deviations", "", GObject.ParamFlags.READWRITE),
+        "channels": (str, "Channels", "Comma separated input channels to output", "", GObject.ParamFlags.READWRITE),
+        "channels-first": (bool, "Channels first", "Output (C, H, W) tensors", True, GObject.ParamFlags.READWRITE),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.normalizer = FrameNormalizer()
+        self._properties = {"mean": "", "std": "", "channels": ""}
+
+    def do_get_property(self, prop):
+        if prop.name == "scale":
+            return self.normalizer.scale
+        if prop.name == "channels-first":
+            return self.normalizer.channels_first
+        if prop.name in self._properties:
+            return self._properties[prop.name]
+        raise AttributeError(f"No such property {prop.name}")
+
+    def do_set_property(self, prop, value):
+        if prop.name == "scale":
+            self.normalizer.scale = value
+        elif prop.name == "channels-first":
+            self.normalizer.channels_first = value
+        elif prop.name == "mean":
+            self.normalizer.mean = _parse_list(value)
+        elif prop.name == "std":
+            self.normalizer.std = _parse_list(value)
+        elif prop.name == "channels":
+            channels = _parse_list(value, int)
+            self.normalizer.channels = None if channels is None else tuple(channels)
+        else:
+            raise AttributeError(f"No such property {prop.name}")
+
+        if prop.name in self._properties:
+            self._properties[prop.name] = value
+
+        if prop.name in ("channels", "channels-first"):
+            self.reconfigure_src()  # the output shape has changed so the src caps are renegotiated
+
+    def _output_shape(self, geometry):
+        channels = self.normalizer.channels or range(geometry.components)
+        if self.normalizer.channels_first:
+            return (len(channels), geometry.height, geometry.width)
+        return (geometry.height, geometry.width, len(channels))
+
+    def do_transform_caps(self, direction, caps, filter):
+        if direction == Gst.PadDirection.SRC:
+            result = self.sinkpad.get_pad_template_caps()
+        else:
+            result = Gst.Caps.new_empty()
+            for i in range(caps.get_size()):
+                structure_caps = Gst.Caps.from_string(caps.get_structure(i).to_string())
+                if structure_caps.is_fixed():
+                    result.append(get_tensor_caps(self._output_shape(get_video_geometry(structure_caps))))
+                else:
+                    result.append(self.srcpad.get_pad_template_caps())
+
+        if filter is not None:
+            result = filter.intersect(result, Gst.CapsIntersectMode.FIRST)
+        return result
+
+    def do_set_caps(self, incaps: Gst.Caps, outcaps: Gst.Caps) -> bool:
+        self._geometry = get_video_geometry(incaps)
+        self._output_size = int(np.prod(self._output_shape(self._geometry))) * np.dtype(np.float32).itemsize
+        return True
+
+    def do_transform_size(self, direction, caps, size, othercaps):
+        if direction == Gst.PadDirection.SINK:
+            return True, self._output_size
+        return True, self._geometry.size
+
+    def do_transform(self, in_buffer: Gst.Buffer, out_buffer: Gst.Buffer) -> Gst.FlowReturn:
+        with map_buffer_to_numpy(in_buffer, Gst.MapFlags.READ, self._geometry) as frame:
+            is_mapped, map_info = out_buffer.map(Gst.MapFlags.WRITE)
+            if not is_mapped:
+                return Gst.FlowReturn.ERROR
+
+            try:
+                out = np.ndarray(self._output_shape(self._geometry), np.float32, buffer=map_info.data)
+                self.normalizer(frame, out=out)
+            finally:
+                out_buffer.unmap(map_info)
+
+        return Gst.FlowReturn.OK
+
+
+class NumpyResizeTransform(GstBase.BaseTransform):
+    """
+    Resizes video frames to the size given by the "width" and "height" properties with `resize_frame`, using either
+    "bilinear" interpolation, eg. to downscale frames to the input size of a model, or "nearest" neighbour which keeps
+    label values intact, eg. to upscale a mask computed at the model's resolution back to that of the source frames so
+    that it can be composited with them. The interpolation tables are computed once per geometry, and the output caps
+    are renegotiated if the size is changed while playing.
+    """
+    __gstmetadata__ = ("Numpy Resize Transform", "Transform", "Resizes frames with precomputed tables", "MONAI")
+
+    __gsttemplates__ = (
+        get_video_pad_template("src", Gst.PadDirection.SRC),
+        get_video_pad_template("sink", Gst.PadDirection.SINK),
+    )
+
+    __gproperties__ = {
+        "width": (int, "Width", "Width of the output frames", 1, GLib.MAXINT, 256, GObject.ParamFlags.READWRITE),
+        "height": (int, "Height", "Height of the output frames", 1, GLib.MAXINT, 256, GObject.ParamFlags.READWRITE),
+        "method": (str, "Method", f"Interpolation, one of {RESIZE_METHODS}", "bilinear", GObject.ParamFlags.READWRITE),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._properties = {"width": 256, "height": 256, "method": "bilinear"}
+
+    def do_get_property(self, prop):
+        if prop.name not in self._properties:
+            raise AttributeError(f"No such property {prop.name}")
+        return self._properties[prop.name]
+
+    def do_set_property(self, prop, value):
+        if prop.name not in self._properties:
+            raise AttributeError(f"No such property {prop.name}")
+        if prop.name == "method" and value not in RESIZE_METHODS:
+            raise ValueError(f"method must be one of {RESIZE_METHODS}, got {value}")
+        self._properties[prop.name] = value
+
+        if prop.name in ("width", "height"):
+            self.reconfigure_src()  # the output size has changed so the src caps are renegotiated
+
+    def do_transform_caps(self, direction, caps, filter):
+        result = Gst.Caps.new_empty()
+        for i in range(caps.get_size()):
+            structure = caps.get_structure(i).copy()
+            if direction == Gst.PadDirection.SINK:
+                structure.set_value("width", self._properties["width"])
+                structure.set_value("height", self._properties["height"])
+            else:
+                structure.remove_fields(["width", "height"])
+            result.append_structure(structure)
+
+        if filter is not None:
+            result = filter.intersect(result, Gst.CapsIntersectMode.FIRST)
+        return result
+
+    def do_set_caps(self, incaps: Gst.Caps, outcaps: Gst.Caps) -> bool:
+        self._in_geometry = get_video_geometry(incaps)
+        self._out_geometry = get_video_geometry(outcaps)
+        return True
+
+    def do_transform_size(self, direction, caps, size, othercaps):
+        return True, get_video_geometry(othercaps).size
+
+    def do_transform(self, in_buffer: Gst.Buffer, out_buffer: Gst.Buffer) -> Gst.FlowReturn:
+        with map_buffer_to_numpy(in_buffer, Gst.MapFlags.READ, self._in_geometry) as frame:
+            with map_buffer_to_numpy(out_buffer, Gst.MapFlags.WRITE, self._out_geometry) as out:
+                g = self._out_geometry
+                resize_frame(frame, g.height, g.width, self._properties["method"], out=out)
+
+        return Gst.FlowReturn.OK
+
+
+def _register_element(name, element_type):
+    """
+    Register an element factory for `element_type` so that it can be used by name in pipeline descriptions. The plugin
+    loader only registers the one element named by `__gstelementfactory__` per module, so the other elements of this
+    module are registered as static elements when it's imported.
+    """
+    GObject.type_register(element_type)
+    if Gst.ElementFactory.find(name) is None and not Gst.Element.register(None, name, Gst.Rank.NONE, element_type):
+        raise ValueError(f"Failed to register {name}")
+
+
 GObject.type_register(NumpyInplaceTransform)
+_register_element("numpyroitransform", NumpyRoiTransform)
+_register_element("numpynormalizetransform", NumpyNormalizeTransform)
+_register_element("numpyresizetransform", NumpyResizeTransform)
 __gstelementfactory__ = ("numpyinplacetransform", Gst.Rank.NONE, NumpyInplaceTransform)
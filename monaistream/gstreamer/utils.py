@@ -9,12 +9,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from contextlib import contextmanager
+import ctypes
+import ctypes.util
+import itertools
+from contextlib import contextmanager, ExitStack
+from dataclasses import dataclass
 import numpy as np
 
 from gi.repository import Gst, GstVideo
 
-__all__ = ["BYTE_FORMATS", "get_dtype_from_bits", "map_buffer_to_numpy"]
+__all__ = [
+    "BYTE_FORMATS",
+    "get_dtype_from_bits",
+    "get_color_channels",
+    "VideoGeometry",
+    "get_video_geometry",
+    "map_buffer_to_numpy",
+    "map_buffers_to_numpy",
+    "wrap_array_in_buffer",
+    "get_gpointer",
+    "get_video_info",
+    "configure_video_buffer_pool",
+]
 
 
 BYTE_FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR,GRAY8,GRAY16_BE,GRAY16_LE}"
@@ -55,45 +71,252 @@ def get_components(cformat):
         return 1
 
     raise ValueError(f"Format `{cformat}` does not have a known number of components.") 
+
+
+def get_color_channels(cformat):
+    """
+    Get the positions of the red, green and blue components in each pixel of the given format, or of the single
+    component of grayscale formats.
+    """
+    if cformat.startswith("GRAY"):
+        return (0,)
+    if get_components(cformat) and all(c in cformat for c in "RGB"):
+        return tuple(cformat.index(c) for c in "RGB")
+
+    raise ValueError(f"Format `{cformat}` does not have known color channels.")
     
 
-@contextmanager
-def map_buffer_to_numpy(buffer, flags, caps, dtype=None):
+@dataclass(frozen=True)
+class VideoGeometry:
     """
-    Map the given buffer with the given flags and the capabilities from its associated pad. The dtype is inferred if not
-    given which may be inaccurate for certain formats. The context object is a Numpy array for the buffer which is
-    unmapped when the context exits. 
+    The layout of video frames for a set of fixed capabilities. This is computed once when capabilities are negotiated
+    so that the per-buffer code can map buffers without querying the capabilities or format information again.
+    """
+
+    format: str
+    height: int
+    width: int
+    components: int
+    dtype: np.dtype
+    strides: tuple
+    size: int
+
+    @property
+    def shape(self):
+        return (self.height, self.width, self.components)
+
+
+def get_video_geometry(caps, dtype=None):
+    """
+    Get the VideoGeometry for the given fixed capabilities. The dtype is inferred if not given which may be inaccurate
+    for certain formats. Rows are assumed to have GStreamer's default stride for packed formats, that is the row size in
+    bytes rounded up to a multiple of 4.
     """
     cstruct = caps.get_structure(0)
     height = cstruct.get_value("height")
     width = cstruct.get_value("width")
     cformat = cstruct.get_value("format")
 
-    fstruct = GstVideo.video_format_from_string(cformat)
-    ifstruct = GstVideo.video_format_get_info(fstruct)
-
     if dtype is None:
+        fstruct = GstVideo.video_format_from_string(cformat)
+        ifstruct = GstVideo.video_format_get_info(fstruct)
         dtype = get_dtype_from_bits(ifstruct.bits)
 
-    dtype=np.dtype(dtype)
-    is_mapped, map_info = buffer.map(flags)
-    if not is_mapped:
-        raise ValueError(f"Buffer {buffer} failed to map with flags `{flags}`.")
+    dtype = np.dtype(dtype)
+    components = get_components(cformat)
+    row_stride = (width * components * dtype.itemsize + 3) & ~3
+    strides = (row_stride, components * dtype.itemsize, dtype.itemsize)
+
+    return VideoGeometry(cformat, height, width, components, dtype, strides, row_stride * height)
 
-    shape = (height, width, get_components(cformat))
 
-    expected_size = np.product(shape) * dtype.itemsize
-    if expected_size != buffer.get_size():
+@contextmanager
+def map_buffer_to_numpy(buffer, flags, caps, dtype=None):
+    """
+    Map the given buffer with the given flags and the capabilities from its associated pad. The dtype is inferred if not
+    given which may be inaccurate for certain formats. The context object is a Numpy array for the buffer which is
+    unmapped when the context exits. Instead of capabilities a VideoGeometry can be given which avoids recomputing the
+    layout for every buffer, in which case `dtype` is ignored.
+    """
+    geometry = caps if isinstance(caps, VideoGeometry) else get_video_geometry(caps, dtype)
+
+    if buffer.get_size() < geometry.size:
         raise ValueError(
-            f"Buffer size {buffer.get_size()} does not match expected size "
-            "{expected_size} for shape {shape} and format {cformat}."
+            f"Buffer size {buffer.get_size()} is smaller than expected size "
+            f"{geometry.size} for shape {geometry.shape} and format {geometry.format}."
         )
 
+    is_mapped, map_info = buffer.map(flags)
+    if not is_mapped:
+        raise ValueError(f"Buffer {buffer} failed to map with flags `{flags}`.")
+
     # TODO: byte order for gray formats
 
-    bufarray = np.ndarray(shape, dtype=dtype, buffer=map_info.data)
-    
     try:
-        yield bufarray
+        yield np.ndarray(geometry.shape, dtype=geometry.dtype, buffer=map_info.data, strides=geometry.strides)
     finally:
         buffer.unmap(map_info)
+
+
+@contextmanager
+def map_buffers_to_numpy(buffers, flags, caps, dtype=None):
+    """
+    Map each of the given buffers with the given flags and the capabilities at the same position in `caps`. The context
+    object is a list of Numpy arrays, one for each buffer, which all remain mapped and valid until the context exits.
+    The entries of `caps` may be VideoGeometry objects as with `map_buffer_to_numpy`.
+    If any buffer fails to map then those already mapped are unmapped before the exception is raised.
+    """
+    with ExitStack() as stack:
+        yield [stack.enter_context(map_buffer_to_numpy(b, flags, c, dtype)) for b, c in zip(buffers, caps)]
+
+
+def get_video_info(caps):
+    """
+    Get the GstVideo.VideoInfo object describing the frames of the given fixed video capabilities.
+    """
+    if hasattr(GstVideo.VideoInfo, "new_from_caps"):  # added in 1.20
+        info = GstVideo.VideoInfo.new_from_caps(caps)
+    else:
+        info = GstVideo.VideoInfo()
+        if not info.from_caps(caps):
+            info = None
+
+    if info is None:
+        raise ValueError(f"Capabilities `{caps}` do not describe a video format.")
+
+    return info
+
+
+def configure_video_buffer_pool(query, min_buffers=2, max_buffers=0):
+    """
+    Configure a buffer pool in the given allocation query to provide buffers for the video format of the query's caps,
+    for use in `decide_allocation` implementations. The first pool proposed by downstream is used if present, otherwise
+    a new GstVideo.VideoBufferPool is created, and the query is updated with the pool and its configuration. The
+    VideoGeometry of the pool's buffers is returned.
+    """
+    caps, _ = query.parse_allocation()
+    if caps is None:
+        raise ValueError("Allocation query has no capabilities.")
+
+    info = get_video_info(caps)
+    pool = None
+
+    if query.get_n_allocation_pools() > 0:
+        pool, _, proposed_min, proposed_max = query.parse_nth_allocation_pool(0)
+        min_buffers = max(min_buffers, proposed_min)
+        max_buffers = proposed_max if proposed_max == 0 or max_buffers == 0 else min(max_buffers, proposed_max)
+
+    def _set_config(pool):
+        config = pool.get_config()
+        Gst.BufferPool.config_set_params(config, caps, info.size, min_buffers, max_buffers)
+        return pool.set_config(config)
+
+    # use a new pool if there's none from downstream or it can't be configured for this format
+    if pool is None or not _set_config(pool):
+        pool = GstVideo.VideoBufferPool.new()
+        if not _set_config(pool):
+            raise ValueError(f"Failed to configure buffer pool for capabilities `{caps}`.")
+
+    if query.get_n_allocation_pools() > 0:
+        query.set_nth_allocation_pool(0, pool, info.size, min_buffers, max_buffers)
+    else:
+        query.add_allocation_pool(pool, info.size, min_buffers, max_buffers)
+
+    return get_video_geometry(caps)
+
+
+_DESTROY_NOTIFY = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+_WRAPPED_ARRAYS = {}  # arrays whose memory is wrapped in a live Gst.Memory object, keyed by the notify user data
+_WRAPPED_KEYS = itertools.count(1)  # start at 1 since a user data value of 0 is passed to the callback as None
+
+
+@_DESTROY_NOTIFY
+def _release_wrapped_array(key):
+    _WRAPPED_ARRAYS.pop(key, None)
+
+
+def _load_gst_library():
+    """
+    Load the GStreamer core library through ctypes to access the memory wrapping functions which aren't usable through
+    introspection. If this fails then `wrap_array_in_buffer` falls back to copying.
+    """
+    libname = ctypes.util.find_library("gstreamer-1.0")
+    if libname is None:
+        return None
+
+    try:
+        lib = ctypes.CDLL(libname)
+    except OSError:
+        return None
+
+    lib.gst_memory_new_wrapped.restype = ctypes.c_void_p
+    lib.gst_memory_new_wrapped.argtypes = [
+        ctypes.c_int,
+        ctypes.c_void_p,
+        ctypes.c_size_t,
+        ctypes.c_size_t,
+        ctypes.c_size_t,
+        ctypes.c_void_p,
+        _DESTROY_NOTIFY,
+    ]
+    lib.gst_buffer_append_memory.restype = None
+    lib.gst_buffer_append_memory.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    return lib
+
+
+_LIBGST = _load_gst_library()
+
+_capsule_get_name = ctypes.pythonapi.PyCapsule_GetName
+_capsule_get_name.restype = ctypes.c_char_p
+_capsule_get_name.argtypes = [ctypes.py_object]
+_capsule_get_pointer = ctypes.pythonapi.PyCapsule_GetPointer
+_capsule_get_pointer.restype = ctypes.c_void_p
+_capsule_get_pointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+
+
+def get_gpointer(obj):
+    """
+    Get the address of the C instance wrapped by the GObject or boxed object `obj` from the capsule PyGObject gives as
+    its `__gpointer__` attribute, or None if it has no such capsule.
+    """
+    capsule = getattr(obj, "__gpointer__", None)
+    if capsule is None or type(capsule).__name__ != "PyCapsule":
+        return None
+
+    try:
+        return _capsule_get_pointer(capsule, _capsule_get_name(capsule))
+    except ValueError:
+        return None
+
+
+def wrap_array_in_buffer(array):
+    """
+    Create a new Gst.Buffer whose memory is that of the given Numpy array without copying it. The array is kept alive
+    until GStreamer frees the memory, so it must not be modified by the caller after this point. Non-contiguous arrays
+    are first made contiguous, and if the GStreamer library can't be accessed through ctypes the data is copied into a
+    new buffer instead, as it is if the address of the new buffer can't be found with `get_gpointer`. Memory for
+    read-only arrays is flagged as read-only so that downstream elements copy before writing to it.
+    """
+    array = np.ascontiguousarray(array)
+
+    buffer = Gst.Buffer.new()
+    buffer_ptr = get_gpointer(buffer) if _LIBGST is not None else None
+
+    if buffer_ptr is None or array.nbytes == 0:
+        return Gst.Buffer.new_wrapped(array.tobytes())
+
+    flags = 0 if array.flags.writeable else int(Gst.MemoryFlags.READONLY)
+    key = next(_WRAPPED_KEYS)
+    _WRAPPED_ARRAYS[key] = array
+
+    memory = _LIBGST.gst_memory_new_wrapped(
+        flags, array.ctypes.data, array.nbytes, 0, array.nbytes, key, _release_wrapped_array
+    )
+    if not memory:
+        _WRAPPED_ARRAYS.pop(key, None)
+        raise ValueError(f"Failed to wrap array of shape {array.shape} and dtype {array.dtype} in memory.")
+
+    _LIBGST.gst_buffer_append_memory(buffer_ptr, memory)
+
+    return buffer
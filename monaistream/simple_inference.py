@@ -9,24 +9,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import TYPE_CHECKING, Any, Callable, Sequence
+import threading
+from collections import deque
+from concurrent.futures import Future
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Sequence
 from monai.inferers import Inferer
 from monai.transforms import apply_transform, Transform
 from monai.engines import SupervisedEvaluator, default_metric_cmp_fn, default_prepare_batch
 from monai.utils import ForwardMode,CommonKeys
-from monai.data import Dataset
+from monai.data import Dataset, MetaTensor, decollate_batch
 from monai.handlers import MeanSquaredError, from_engine
 import torch
 from torch.nn import Module
 
 from monai.utils import IgniteInfo, min_version, optional_import
 
+from monaistream.threadsafe import IterableBufferDataset
+
 if TYPE_CHECKING:
     from ignite.engine import Engine, EventEnum
     from ignite.metrics import Metric
 else:
     version = IgniteInfo.OPT_IMPORT_VERSION
     Engine, _ = optional_import("ignite.engine", version, min_version, "Engine", as_type="decorator")
+    Events, _ = optional_import("ignite.engine", version, min_version, "Events")
     Metric, _ = optional_import("ignite.metrics", version, min_version, "Metric", as_type="decorator")
     EventEnum, _ = optional_import("ignite.engine", version, min_version, "EventEnum", as_type="decorator")
 
@@ -35,15 +42,29 @@ class SimpleInferenceEngine:
     """
     A simple engine-like class is for running inference on a per-input basis, such as with per-frame data in a
     video stream. It relies on a supplied Inferer instance and a network.
+
+    Frames can also be inferred in batches with `infer_batch`, or `stream` for an iterable of frames, so the network
+    is run once per batch. The preprocessed frames are stacked into an input tensor which is reused between batches
+    rather than reallocated. `preprocess` and `postprocess` are applied per frame unless `batched_preprocess` or
+    `batched_postprocess` is set, in which case they're applied once to the stacked inputs or the network's output.
     """
 
     def __init__(
-        self, inferer: Inferer, network: Module, preprocess: Callable | None = None, postprocess: Callable | None = None
+        self,
+        inferer: Inferer,
+        network: Module,
+        preprocess: Callable | None = None,
+        postprocess: Callable | None = None,
+        batched_preprocess: bool = False,
+        batched_postprocess: bool = False,
     ):
         self.inferer = inferer
         self.network = network
         self.preprocess = preprocess
         self.postprocess = postprocess
+        self.batched_preprocess = batched_preprocess
+        self.batched_postprocess = batched_postprocess
+        self._inputs: torch.Tensor | None = None
 
     def __call__(self, inputs: torch.Tensor, *args: Any, **kwargs: Any) -> Any:
         if self.preprocess:
@@ -56,6 +77,67 @@ class SimpleInferenceEngine:
 
         return outputs
 
+    def _stack(self, frames: Sequence[Any]) -> torch.Tensor:
+        """
+        Stack `frames` into the reused input tensor, reallocating it only if the batch is larger or the frames change.
+        """
+        frames = [f.as_tensor() if isinstance(f, MetaTensor) else torch.as_tensor(f) for f in frames]
+        first = frames[0]
+        inputs = self._inputs
+
+        if (
+            inputs is None
+            or inputs.shape[0] < len(frames)
+            or inputs.shape[1:] != first.shape
+            or inputs.dtype != first.dtype
+            or inputs.device != first.device
+        ):
+            inputs = self._inputs = torch.empty((len(frames),) + first.shape, dtype=first.dtype, device=first.device)
+
+        return torch.stack(frames, out=inputs[: len(frames)])
+
+    def infer_batch(self, frames: Sequence[Any], *args: Any, **kwargs: Any) -> list:
+        """
+        Infer a batch of frames with a single call to the inferer, returning the list of per-frame outputs.
+        """
+        if len(frames) == 0:
+            return []
+
+        if self.preprocess and not self.batched_preprocess:
+            frames = [apply_transform(self.preprocess, f) for f in frames]
+
+        inputs = self._stack(frames)
+
+        if self.preprocess and self.batched_preprocess:
+            inputs = apply_transform(self.preprocess, inputs)
+
+        with torch.no_grad():
+            outputs = self.inferer(inputs, self.network, *args, **kwargs)
+
+        # the input tensor is overwritten by the next batch so outputs mustn't be views of it
+        if isinstance(outputs, torch.Tensor) and outputs.untyped_storage().data_ptr() == (
+            self._inputs.untyped_storage().data_ptr()
+        ):
+            outputs = outputs.clone()
+
+        if self.postprocess and self.batched_postprocess:
+            outputs = apply_transform(self.postprocess, outputs)
+
+        outputs = decollate_batch(outputs, detach=False)
+
+        if self.postprocess and not self.batched_postprocess:
+            outputs = [apply_transform(self.postprocess, o) for o in outputs]
+
+        return outputs
+
+    def stream(self, frames: Iterable[Any], batch_size: int = 1, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        """
+        Infer the frames from the iterable `frames` in batches of up to `batch_size`, yielding the output per frame.
+        """
+        frames = iter(frames)
+        while batch := list(islice(frames, batch_size)):
+            yield from self.infer_batch(batch, *args, **kwargs)
+
 
 class SingleItemDataset(Dataset):
     """
@@ -78,6 +160,12 @@ class InferenceEngine(SupervisedEvaluator):
     for inference on per-frame video stream data where the state of the engine and other setup should be done initially
     but reused for every frame. This allows for synchronous use of an engine class rather than running one in a separate
     thread.
+
+    Calling the engine runs it for a single iteration so every frame pays for resetting the engine state and for the
+    per-run and per-epoch events. For a stream of frames, `start_streaming` instead runs the engine once in a background
+    thread over an `IterableBufferDataset`, applying `preprocessing` to each frame. Frames are then given to `submit`,
+    which returns a `Future` for the frame's prediction, so only the iteration events fire per frame. If an iteration
+    fails the streaming run ends and every pending future is given the exception.
     """
 
     def __init__(
@@ -128,7 +216,110 @@ class InferenceEngine(SupervisedEvaluator):
             compile_kwargs=compile_kwargs,
         )
 
+        self._stream_dataset: IterableBufferDataset | None = None
+        self._stream_thread: threading.Thread | None = None
+        self._stream_futures: deque = deque()
+        self._stream_lock = threading.Lock()  # guards the dataset and futures, shared with the engine thread
+        self._submit_lock = threading.Lock()  # keeps the futures in the order the frames are queued
+
+        # registered after the decollate and postprocessing handlers so futures get the final output
+        self.add_event_handler(Events.ITERATION_COMPLETED, self._complete_stream_future)
+
+    @property
+    def is_streaming(self) -> bool:
+        return self._stream_thread is not None
+
+    def start_streaming(self, buffer_size: int = 0, timeout: float = 1.0) -> None:
+        """
+        Start running the engine over an unbounded stream of frames given to `submit`. `buffer_size` and `timeout`
+        are those of the `IterableBufferDataset` the frames are queued in, so if `buffer_size` frames are waiting
+        `submit` blocks for up to `timeout` seconds.
+        """
+        if self.is_streaming:
+            raise RuntimeError("engine is already streaming")
+
+        transform = self.data_loader.transform or (lambda item: item)
+        self._stream_dataset = IterableBufferDataset(transform, buffer_size, timeout)
+        self._stream_thread = threading.Thread(target=self._run_streaming, daemon=True)
+        self._stream_thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queue `item` for inference while streaming, returning a future for its prediction.
+        """
+        if not self.is_streaming:
+            raise RuntimeError("engine isn't streaming, call start_streaming first")
+
+        future: Future = Future()
+        with self._submit_lock:
+            # queue the future first since the engine thread can complete the frame as soon as it's added, which is
+            # done outside the stream lock so waiting for buffer space doesn't stall the engine thread
+            with self._stream_lock:
+                dataset = self._stream_dataset
+                if dataset is None:
+                    raise RuntimeError("streaming run has ended, call stop_streaming and start_streaming to restart")
+                self._stream_futures.append(future)
+
+            try:
+                dataset.add_item(item)
+            except BaseException:
+                with self._stream_lock:
+                    if future in self._stream_futures:
+                        self._stream_futures.remove(future)
+                raise
+
+        return future
+
+    def stop_streaming(self, timeout: float | None = None) -> None:
+        """
+        Stop streaming once the frames already submitted have been processed, waiting up to `timeout` seconds.
+        """
+        if not self.is_streaming:
+            return
+
+        with self._stream_lock:
+            if self._stream_dataset is not None:
+                self._stream_dataset.buffer_size = 0  # the sentinel must not be refused when the buffer is full
+                self._stream_dataset.add_item(IterableBufferDataset.STOP)
+
+        self._stream_thread.join(timeout)
+        if not self._stream_thread.is_alive():
+            self._stream_thread = None
+
+    def _run_streaming(self) -> None:
+        dataset = self._stream_dataset
+        data_loader, epoch_length = self.data_loader, self.state.epoch_length
+        self.data_loader, self.state.epoch_length = dataset, None
+
+        error: BaseException | None = None
+        try:
+            self.run()
+        except BaseException as e:
+            error = e
+        finally:
+            self.data_loader, self.state.epoch_length = data_loader, epoch_length
+            dataset.stop()
+
+            with self._stream_lock:
+                futures, self._stream_futures = self._stream_futures, deque()
+                self._stream_dataset = None
+            for future in futures:
+                if not future.cancelled():
+                    future.set_exception(error or RuntimeError("streaming stopped before the frame was processed"))
+
+    def _complete_stream_future(self, engine: Engine) -> None:
+        with self._stream_lock:
+            if self._stream_thread is None or not self._stream_futures:
+                return
+            future = self._stream_futures.popleft()
+
+        if not future.cancelled():
+            future.set_result(engine.state.output[0][CommonKeys.PRED])
+
     def __call__(self, item: Any, include_metrics: bool = False) -> Any:
+        if self.is_streaming:
+            raise RuntimeError("engine is streaming, use submit instead")
+
         self.data_loader.set_item(item)
         self.run()
 
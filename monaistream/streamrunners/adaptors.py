@@ -1,6 +1,13 @@
+import queue
+import threading
+
 from ignite.engine import Engine, Events
 # from monai.engines.workflow import Workflow
 
+from monaistream.streamrunners.debug import LOG, get_logger
+
+_LOG = get_logger("monaistream-adaptors", "MONAI Stream workflow adaptors")
+
 
 class StreamingDataLoader:
     def __init__(self):
@@ -35,8 +42,172 @@ class IgniteEngineAdaptor:
 
     def __call__(self, src):
         # provide data sample 'src' to workflow dataset
-        print("IgniteEngineAdaptor: __call__")
+        _LOG.log_interval(1.0, LOG, "IgniteEngineAdaptor: __call__")
         self.data_loader.set_payload(src)
         self.engine.run(self.data_loader)
-        print("engine.state.output:", type(self.engine.state.output))
+        _LOG.log_interval(1.0, LOG, "engine.state.output: %s", type(self.engine.state.output))
         return self.engine.state.output
+
+
+class BlockingStreamingDataLoader:
+    """
+    A data loader over an unbounded stream of payloads given to `put`, blocking while none are waiting, which ends
+    once `STOP` is put. At most `buffer_size` payloads wait at once, or any number if it's 0.
+    """
+
+    STOP = object()
+
+    def __init__(self, buffer_size=1):
+        self._queue = queue.Queue(buffer_size)
+
+    def put(self, payload, timeout=None):
+        self._queue.put(payload, timeout=timeout)
+
+    def __iter__(self):
+        while True:
+            payload = self._queue.get()
+            if payload is BlockingStreamingDataLoader.STOP:
+                return
+            yield payload
+
+
+class PersistentIgniteEngineAdaptor:
+    """
+    Adapts an Ignite engine to be called per frame like IgniteEngineAdaptor, but runs the engine once on a background
+    thread over a BlockingStreamingDataLoader rather than restarting it for every frame. Frames and outputs are passed
+    through bounded queues of `buffer_size` entries, so `put` can queue the next frame while the engine is still busy
+    with the previous one, overlapping it with other work, and `get` takes the outputs in order.
+
+    Every `put` must be paired with a `get`. At most `max_pending` frames, those the queues and the engine can hold at
+    once, can be put without taking their outputs, beyond which `put` raises rather than blocking forever. If the
+    engine raises, the exception is raised from the next `get` or `put` and the engine is restarted by the next `put`.
+    """
+
+    _ERROR = object()
+
+    def __init__(self, engine, buffer_size=1, timeout=None):
+        self.engine = engine
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self._outputs = queue.Queue(buffer_size)
+        self._data_loader = None
+        self._thread = None
+        self._error = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.engine.add_event_handler(Events.ITERATION_COMPLETED, self._on_iteration)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def max_pending(self):
+        """
+        The number of frames which can be put without taking their outputs, or None if unlimited.
+        """
+        # a frame in each queue entry plus the one whose output the engine is waiting to queue
+        return None if self.buffer_size <= 0 else 2 * self.buffer_size + 1
+
+    def start(self):
+        """
+        Start the engine if it isn't running, discarding the outputs and error of a previous run.
+        """
+        if not self.running:
+            self._reset()
+            self._data_loader = BlockingStreamingDataLoader(self.buffer_size)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the engine once the frames already put have been processed. Outputs not yet taken are discarded.
+        """
+        thread = self._thread
+        if thread is not None:
+            while thread.is_alive():
+                try:
+                    self._data_loader.put(BlockingStreamingDataLoader.STOP, timeout=0.1)
+                    break
+                except queue.Full:
+                    self._drain()
+            while thread.is_alive():
+                self._drain()
+                thread.join(0.1)
+
+            self._reset()
+            self._thread = None
+
+    def put(self, src):
+        """
+        Queue the frame `src` for the engine, starting it if needed, waiting up to `timeout` seconds for space.
+        """
+        if self._error is not None:
+            self._raise_error()
+
+        self.start()
+
+        with self._lock:
+            if self.max_pending is not None and self._pending >= self.max_pending:
+                raise RuntimeError(f"{self._pending} frames are already waiting, get must be called for each put")
+            self._pending += 1
+
+        try:
+            self._data_loader.put(src, timeout=self.timeout)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def get(self):
+        """
+        Take the output of the oldest frame put, waiting up to `timeout` seconds for it.
+        """
+        output = self._outputs.get(timeout=self.timeout)
+        if output is PersistentIgniteEngineAdaptor._ERROR:
+            self._raise_error()
+
+        with self._lock:
+            self._pending -= 1
+        return output
+
+    def __call__(self, src):
+        _LOG.log_interval(1.0, LOG, "PersistentIgniteEngineAdaptor: __call__")
+        self.put(src)
+        return self.get()
+
+    def _drain(self):
+        try:
+            while True:
+                self._outputs.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _reset(self):
+        self._drain()
+        self._error = None
+        with self._lock:
+            self._pending = 0
+
+    def _raise_error(self):
+        error = self._error
+        thread = self._thread
+        while thread is not None and thread.is_alive():  # the thread may be waiting to queue the error
+            self._drain()
+            thread.join(0.1)
+
+        self._reset()
+        self._thread = None
+        raise error
+
+    def _on_iteration(self, engine):
+        self._outputs.put(engine.state.output)
+
+    def _run(self):
+        self.engine.state.max_epochs = None  # so a run that failed is started again rather than resumed
+        try:
+            self.engine.run(self._data_loader, max_epochs=1)
+        except Exception as e:
+            _LOG.error("engine failed: %r", e)
+            self._error = e
+            self._outputs.put(PersistentIgniteEngineAdaptor._ERROR)
@@ -0,0 +1,213 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import threading
+import time
+
+
+# the GstDebugLevel values
+NONE = 0
+ERROR = 1
+WARNING = 2
+FIXME = 3
+INFO = 4
+DEBUG = 5
+LOG = 6
+TRACE = 7
+
+_PYTHON_LEVELS = {
+    ERROR: logging.ERROR,
+    WARNING: logging.WARNING,
+    FIXME: logging.WARNING,
+    INFO: logging.INFO,
+    DEBUG: logging.DEBUG,
+    LOG: logging.DEBUG,
+    TRACE: logging.DEBUG,
+}
+
+_LEVEL_NAMES = {
+    "none": NONE, "error": ERROR, "warning": WARNING, "fixme": FIXME, "info": INFO, "debug": DEBUG, "log": LOG,
+    "trace": TRACE, "memdump": 9,
+}
+
+
+
+def _load_gst_debug():
+    """
+    Load the GStreamer debug functions through ctypes, since debug categories can't be created through introspection.
+    Returns None if the library isn't available, in which case messages go to Python logging instead.
+    """
+    libname = ctypes.util.find_library("gstreamer-1.0")
+    if libname is None:
+        return None
+
+    try:
+        lib = ctypes.CDLL(libname)
+        lib._gst_debug_category_new.restype = ctypes.c_void_p
+        lib._gst_debug_category_new.argtypes = [ctypes.c_char_p, ctypes.c_uint, ctypes.c_char_p]
+        lib.gst_debug_category_get_threshold.restype = ctypes.c_int
+        lib.gst_debug_category_get_threshold.argtypes = [ctypes.c_void_p]
+        lib.gst_debug_log_literal.restype = None
+        lib.gst_debug_log_literal.argtypes = [
+            ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p,
+            ctypes.c_char_p,
+        ]
+    except (OSError, AttributeError):
+        return None
+
+    return lib
+
+
+
+_LIBGST = _load_gst_debug()
+_loggers = dict()
+_loggers_lock = threading.Lock()
+
+
+
+def parse_gst_debug(spec, name):
+    """
+    Get the threshold for the category `name` from a GST_DEBUG style specification such as "2,monaistream*:6", where
+    later entries take precedence and a bare level applies to every category.
+    """
+    threshold = NONE
+    for entry in (spec or "").split(","):
+        pattern, _, level = entry.strip().rpartition(":")
+        level = level.strip().lower()
+        level = int(level) if level.isdigit() else _LEVEL_NAMES.get(level)
+        if level is not None and (not pattern or fnmatch.fnmatchcase(name, pattern)):
+            threshold = level
+    return threshold
+
+
+
+class DebugLogger:
+    """
+    Logs messages to the GStreamer debug category `name`, so they appear in the GStreamer debug log with the usual
+    GST_DEBUG thresholds, eg. GST_DEBUG=monaistream*:6. If the GStreamer library can't be loaded, messages go to the
+    Python logger "monaistream.<name>" with the threshold still taken from GST_DEBUG.
+
+    The threshold is cached so that checking it costs a comparison, and messages are formatted lazily with %-style
+    arguments. While messages are below the threshold it is read again at most every `refresh_interval` seconds, since
+    loggers are often created at import before `Gst.init` has applied GST_DEBUG, or thresholds may be changed at
+    runtime. Call `refresh` to read it immediately. Per-frame messages should use `log_every` or `log_interval` so that
+    even enabled logging doesn't write for every frame.
+    """
+
+    def __init__(self, name, description="", refresh_interval=1.0):
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self._counts = dict()
+        self._times = dict()
+
+        if _LIBGST is not None:
+            self._category = _LIBGST._gst_debug_category_new(name.encode(), 0, description.encode())
+            self._logger = None
+        else:
+            self._category = None
+            self._logger = logging.getLogger(f"monaistream.{name}")
+
+        self.refresh()
+
+
+    def refresh(self):
+        if self._category is not None:
+            self.threshold = _LIBGST.gst_debug_category_get_threshold(self._category)
+        else:
+            self.threshold = parse_gst_debug(os.environ.get("GST_DEBUG"), self.name)
+        self._next_refresh = time.monotonic() + self.refresh_interval
+
+
+    def enabled(self, level):
+        if level <= self.threshold:
+            return True
+        if time.monotonic() < self._next_refresh:
+            return False
+
+        self.refresh()
+        return level <= self.threshold
+
+
+    def log(self, level, msg, *args, obj=None):
+        """
+        Log `msg % args` at `level`, associated with the GObject `obj` (eg. the element logging) if given.
+        """
+        if not self.enabled(level):
+            return
+
+        message = msg % args if args else msg
+
+        if self._category is not None:
+            # imported here since this module doesn't otherwise need gi, and only if the GStreamer library was loaded
+            from monaistream.gstreamer.utils import get_gpointer
+
+            ptr = get_gpointer(obj) if obj is not None else None
+            _LIBGST.gst_debug_log_literal(self._category, level, b"", b"", 0, ptr, message.encode())
+        else:
+            prefix = f"{obj.get_name()}: " if obj is not None and hasattr(obj, "get_name") else ""
+            self._logger.log(_PYTHON_LEVELS.get(level, logging.DEBUG), "%s%s", prefix, message)
+
+
+    def log_every(self, n, level, msg, *args, obj=None):
+        """
+        Log only every `n`th call with this message and object, for sampling per-frame events. The count of calls
+        since the last message logged is appended to the message.
+        """
+        if not self.enabled(level):
+            return
+
+        key = (msg, id(obj))
+        count = self._counts.get(key, 0) + 1
+        if count < n:
+            self._counts[key] = count
+            return
+
+        self._counts[key] = 0
+        self.log(level, msg + " (%d calls)", *args, count, obj=obj)
+
+
+    def log_interval(self, interval, level, msg, *args, obj=None):
+        """
+        Log at most once every `interval` seconds for this message and object, for rate limiting per-frame events.
+        """
+        if not self.enabled(level):
+            return
+
+        key = (msg, id(obj))
+        now = time.monotonic()
+        last = self._times.get(key)
+        if last is not None and now - last < interval:
+            return
+
+        self._times[key] = now
+        self.log(level, msg, *args, obj=obj)
+
+
+    def error(self, msg, *args, obj=None):
+        self.log(ERROR, msg, *args, obj=obj)
+
+
+    def warning(self, msg, *args, obj=None):
+        self.log(WARNING, msg, *args, obj=obj)
+
+
+    def info(self, msg, *args, obj=None):
+        self.log(INFO, msg, *args, obj=obj)
+
+
+    def debug(self, msg, *args, obj=None):
+        self.log(DEBUG, msg, *args, obj=obj)
+
+
+
+def get_logger(name, description=""):
+    """
+    Get the DebugLogger for the category `name`, creating it on first use.
+    """
+    with _loggers_lock:
+        logger = _loggers.get(name)
+        if logger is None:
+            logger = _loggers[name] = DebugLogger(name, description)
+        return logger
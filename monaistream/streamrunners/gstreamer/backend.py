@@ -1,4 +1,6 @@
 import threading
+import time
+from contextlib import ExitStack
 
 import gi
 gi.require_version('Gst', '1.0')
@@ -10,11 +12,23 @@ import numpy as np
 import torch
 
 
-from monaistream.streamrunners.gstreamer.utils import PadEntry
+from monaistream.gstreamer.utils import get_video_geometry, map_buffers_to_numpy, wrap_array_in_buffer
+from monaistream.streamrunners.debug import LOG, get_logger
+from monaistream.streamrunners.gstreamer.utils import (
+    PROFILE_PROPERTIES,
+    PadEntry,
+    get_profile_property,
+    set_profile_property,
+)
+from monaistream.streamrunners.profiling import FrameProfiler
+from monaistream.streamrunners.queues import FrameBatcher, FrameSet, QueuePolicy
+from monaistream.streamrunners.tensors import TensorFormat, TensorRing
 
 
 Gst.init(None)
 
+_LOG = get_logger("monaistream-backend", "MONAI Stream runner backend")
+
 
 class GstStreamRunnerBackendStatic(Gst.Element):
     __gstmetadata__ = ("GstStreamRunnerBackend", "Filter", "Overlay images", "Author")
@@ -69,46 +83,40 @@ class GstStreamRunnerBackendStatic(Gst.Element):
     def do_chain(self, pad, parent, buffer):
 
         with self._lock:
-            print("=======================================")
-            print(f"do_chain called on {pad.get_name()} with thread id {threading.get_ident()}")
+            _LOG.log_interval(
+                1.0, LOG, "do_chain called on %s with thread id %d", pad.get_name(), threading.get_ident(), obj=self
+            )
             if pad == self.sinkpad_0:
                 self.buffer_0 = buffer
             elif pad == self.sinkpad_1:
                 self.buffer_1 = buffer
             else:
-                print("Unexpected pad!")
+                _LOG.error("Unexpected pad %s", pad.get_name(), obj=self)
 
             if self.buffer_0 and self.buffer_1:
                 buffers = (self.buffer_0, self.buffer_1)
 
 
-                frames = list()
-                # for sinkpad in (self.sinkpad_0, self.sinkpad_1):
-                for sinkpad, buffer in ((self.sinkpad_0, self.buffer_0), (self.sinkpad_1, self.buffer_1)):
-                    # Extract data from buffer
-                    success, map_info = buffer.map(Gst.MapFlags.READ)
-                    if not success:
-                        print("Unexpected failure!")
-                        return Gst.FlowReturn.ERROR
+                caps = (self.sinkpad_0.get_current_caps(), self.sinkpad_1.get_current_caps())
 
-                    caps = sinkpad.get_current_caps().get_structure(0)
-                    # print("caps:", caps)
-                    height, width, channels = caps.get_value("height"), caps.get_value("width"), caps.get_value("channels")
-                    # print("data:", len(map_info.data))
-                    frame = np.frombuffer(map_info.data, dtype=np.uint8).reshape((height, width, 3))
-                    frames.append(frame)
-                    buffer.unmap(map_info)
+                # keep the buffers mapped until the outputs are pushed so that the frames remain valid throughout
+                with ExitStack() as stack:
+                    try:
+                        frames = stack.enter_context(map_buffers_to_numpy(buffers, Gst.MapFlags.READ, caps))
+                    except ValueError as e:
+                        _LOG.error("Failed to map buffers: %s", e, obj=self)
+                        return Gst.FlowReturn.ERROR
 
-                self._do_op(frames)
+                    self._do_op(frames)
 
-                dframe = np.array(frames[0])
+                    dframe = np.array(frames[0])
 
-                dbuffer0 = Gst.Buffer.new_wrapped(dframe.tobytes())
-                dbuffer1 = Gst.Buffer.new_wrapped(dframe.tobytes())
+                    dbuffer0 = Gst.Buffer.new_wrapped(dframe.tobytes())
+                    dbuffer1 = Gst.Buffer.new_wrapped(dframe.tobytes())
 
-                # Push buffers downstream
-                self.srcpad_0.push(dbuffer0)
-                self.srcpad_1.push(dbuffer1)
+                    # Push buffers downstream
+                    self.srcpad_0.push(dbuffer0)
+                    self.srcpad_1.push(dbuffer1)
 
             return Gst.FlowReturn.OK
 
@@ -129,11 +137,18 @@ class GstStreamRunnerBackendStatic(Gst.Element):
 class GstStreamRunnerBackend(Gst.Element):
     __gstmetadata__ = ("GstStreamRunnerBackend", "Filter", "Overlay images", "Author")
 
-    def __init__(self, inputs=None, outputs=None, do_op=None, array_type="numpy"):
+    __gproperties__ = dict(PROFILE_PROPERTIES)
+
+    def __init__(self, inputs=None, outputs=None, do_op=None, array_type="numpy", queue_policy=None,
+                 tensor_format=None):
         super().__init__()
+        # the lock guards the input buffers and the state shared with do_chain and is only held briefly, while the
+        # process lock serialises the processing of frame sets so that do_op runs without blocking the inputs when
+        # frame sets are queued; when both are needed the process lock is taken first
         self._lock = threading.Lock()
+        self._process_lock = threading.Lock()
 
-        print(f"inputs = {inputs}")
+        _LOG.debug("inputs = %s", inputs)
         # if inputs is None:
         #     inputs = [
         #         PadEntry("sink_0", "video/x-raw, format=BGR, width=256, height=256"),
@@ -146,9 +161,23 @@ class GstStreamRunnerBackend(Gst.Element):
         #     ]
 
         self._array_type = array_type
-        self._frombuffer = np.frombuffer if array_type == "numpy" else torch.frombuffer
+        self._frombuffer = self._to_numpy if array_type == "numpy" else self._to_torch
         self._tobuffer = self._from_numpy if array_type == "numpy" else self._from_torch
+        self._stack = np.stack if array_type == "numpy" else torch.stack
         self._do_op = do_op
+        self._tensor_format = TensorFormat() if tensor_format is None else tensor_format
+        self._queue_policy = QueuePolicy()
+        self._batcher = None
+        self._matcher = None
+        self._queue = None
+        self._pool = None
+        self._worker = None
+        self._stats = None
+        self._profiler = FrameProfiler()
+        self._change_detector = None
+        self._preprocess = None
+        self._last_outputs = None  # output buffers of the last processed frame set, reused for unchanged frames
+        self._flow_return = Gst.FlowReturn.OK  # last flow return from pushing on the worker thread
 
         # Create pads
         sinkpads = list()
@@ -165,9 +194,10 @@ class GstStreamRunnerBackend(Gst.Element):
                     p.name, Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS, Gst.Caps.from_string(p.format))
                 srcpads.append(Gst.Pad.new_from_template(template, p.name))
 
-        # Set chain function for sink pads
+        # Set chain and event functions for sink pads
         for s in sinkpads:
             s.set_chain_function(self.do_chain)
+            s.set_event_function(self.do_event)
 
         # Add pads
         for s in sinkpads:
@@ -176,13 +206,23 @@ class GstStreamRunnerBackend(Gst.Element):
             self.add_pad(s)
 
         self._buffers = [None for _ in self.sinkpads]
+        self._geometries = [None for _ in self.sinkpads]  # negotiated frame geometry per sink pad
+        self._rings = [None for _ in self.sinkpads]  # tensors frames are converted into per sink pad if using torch
+
+        if queue_policy is not None:
+            self.set_queue_policy(queue_policy)
 
 
     def add_input(self, name, format):
         template = Gst.PadTemplate.new(name, Gst.PadDirection.SINK, Gst.PadPresence.ALWAYS, Gst.Caps.from_string(format))
         pad = Gst.Pad.new_from_template(template, name)
         pad.set_chain_function(self.do_chain)
+        pad.set_event_function(self.do_event)
         self.add_pad(pad)
+        self._buffers = [None for _ in self.sinkpads]
+        self._geometries = [None for _ in self.sinkpads]
+        self._rings = [None for _ in self.sinkpads]
+        self._matcher = self._queue_policy.create_matcher(len(self.sinkpads))
 
 
     def add_output(self, name, format):
@@ -196,43 +236,439 @@ class GstStreamRunnerBackend(Gst.Element):
         self._do_op = do_op
 
 
+    def set_stats(self, stats):
+        """
+        Record the time frame sets are queued before processing, the time in do_op, and the time taken to push the
+        results as the metrics "queue", "do_op" and "push" of this element in the LatencyStats `stats`, or stop
+        recording if None.
+        """
+        self._stats = stats
+
+
+    def set_change_detector(self, detector):
+        """
+        Set the ChangeDetector deciding whether each frame set has changed enough since the last processed one to run
+        do_op, otherwise its output buffers are pushed again with the new timestamps. The detector isn't used with
+        batching, since the output for unchanged frames isn't known until their batch has been processed. None
+        disables skipping.
+        """
+        with self._process_lock, self._lock:
+            self._change_detector = detector
+            self._last_outputs = None
+
+
+    def set_preprocess(self, preprocess):
+        """
+        Set the function converting each mapped frame before it's passed to do_op, such as a FrameNormalizer, or a list
+        with one function per input. The function is given the (H, W, C) numpy array of the frame and returns a numpy
+        array, which is converted to a tensor if the array type is "torch". Preprocessed frames aren't forwarded as
+        input buffers, and outputs aliasing them are copied. If the function has a `reserve` method it's called with
+        the number of frames which can be in use at once, so that it can reuse its outputs safely. None disables
+        preprocessing.
+        """
+        with self._process_lock, self._lock:
+            self._preprocess = preprocess
+            self._reserve_preprocess()
+
+
+    def profile(self, num_frames, path=None):
+        """
+        Profile the handling of the next `num_frames` buffers with cProfile and write the stats to `path`, the
+        "profile-path" property if None. Each call of the chain function counts as a frame, as does the processing of a
+        frame set by the queue worker if there is one.
+        """
+        self._profiler.start(num_frames, path)
+
+
+    def do_get_property(self, prop):
+        return get_profile_property(self._profiler, prop)
+
+
+    def do_set_property(self, prop, value):
+        set_profile_property(self._profiler, prop, value)
+
+
+    def set_tensor_format(self, tensor_format):
+        """
+        Set the TensorFormat describing the tensors frames are converted to if the array type is "torch".
+        """
+        with self._process_lock, self._lock:
+            self._tensor_format = tensor_format
+            self._reset_rings()
+
+
+    def set_queue_policy(self, policy):
+        """
+        Set the QueuePolicy describing how frame sets are queued and batched before being passed to do_op. If the policy
+        has a queue mode, complete frame sets are put into a queue of that kind and do_op is called on a separate
+        worker thread, so the streaming threads only block if the queue blocks. With batching each input to do_op is a
+        stacked array of frames with shape (N, H, W, C), and each result must have the same first dimension so that it
+        can be split back into one output buffer per frame set. If the policy has a sync tolerance, frame sets are made
+        of buffers with matching timestamps, otherwise of the latest buffer from each input. If the policy has workers,
+        the queue worker thread hands frame sets to a pool calling do_op asynchronously and a push thread pushes the
+        results in order, so that several frame sets are processed at once.
+        """
+        self._stop_worker()
+
+        with self._process_lock:
+            self._flush_batch()
+
+            with self._lock:
+                self._queue_policy = policy
+                self._batcher = FrameBatcher(policy.max_batch_size, policy.max_wait_ms) if policy.batching else None
+                self._matcher = policy.create_matcher(len(self.sinkpads))
+                self._queue = policy.create_queue()
+                self._pool = policy.create_pool(self._on_result)
+                self._reset_rings()  # the number of frames in use at once may have changed
+
+
+    @property
+    def dropped_frames(self):
+        """
+        The number of frame sets discarded by the queue policy.
+        """
+        return 0 if self._queue is None else self._queue.dropped
+
+
+    @property
+    def unmatched_frames(self):
+        """
+        The number of input buffers discarded because no buffers with matching timestamps arrived on the other inputs.
+        """
+        return 0 if self._matcher is None else self._matcher.dropped
+
+
+    def do_change_state(self, transition):
+        if transition == Gst.StateChange.PAUSED_TO_READY:
+            self._stop_worker()
+
+        return Gst.Element.do_change_state(self, transition)
+
+
+    def do_event(self, pad, parent, event):
+        if event.type == Gst.EventType.CAPS and pad in self.sinkpads:
+            # compute the frame geometry once here rather than querying the caps for every buffer
+            with self._process_lock, self._lock:
+                self._geometries[self.sinkpads.index(pad)] = get_video_geometry(event.parse_caps())
+                self._reset_rings()
+        elif event.type == Gst.EventType.EOS:
+            # process queued frames and those waiting in a partial batch before the stream ends
+            if self._queue is not None:
+                self._queue.join()
+            with self._process_lock:
+                self._flush_batch()
+            if self._pool is not None:
+                self._pool.join()
+        elif event.type == Gst.EventType.FLUSH_START:
+            if self._queue is not None:
+                self._queue.clear()  # also wakes the streaming thread if it's blocked on a full queue
+        elif event.type == Gst.EventType.FLUSH_STOP:
+            if self._pool is not None:
+                self._pool.join()  # wait for frames still being processed so their flow returns are discarded below
+            with self._process_lock, self._lock:
+                if self._batcher is not None:
+                    self._batcher.take()
+                if self._matcher is not None:
+                    self._matcher.clear()
+                if self._change_detector is not None:
+                    self._change_detector.reset()
+                self._last_outputs = None
+                self._flow_return = Gst.FlowReturn.OK
+
+        return pad.event_default(parent, event)
+
+
     def do_chain(self, pad, parent, buffer):
+        with self._profiler.frame():
+            if self._queue is None:
+                # without a queue frame sets are processed in the streaming thread in the order they're formed
+                with self._process_lock:
+                    with self._lock:
+                        framesets = self._add_buffer(pad, buffer)
+                        if framesets is None:
+                            return Gst.FlowReturn.ERROR
+                        batches = [b for b in map(self._take_batch, framesets) if b]
+
+                    ret = Gst.FlowReturn.OK
+                    for batch in batches:
+                        batch_ret = self._process(batch)
+                        if batch_ret != Gst.FlowReturn.OK:
+                            ret = batch_ret
+                    return ret
+
+            with self._lock:
+                framesets = self._add_buffer(pad, buffer)
+                if framesets is None:
+                    return Gst.FlowReturn.ERROR
+                if framesets:
+                    self._start_worker()
+                queue = self._queue
+
+            # put outside the lock so that only a blocking queue which is full holds up the streaming thread
+            for frameset in framesets:
+                queue.put(frameset)
+            return self._flow_return
+
+
+    def _add_buffer(self, pad, buffer):
+        """
+        Add a buffer arriving on the given pad, returning the list of frame sets completed by it or None if the pad
+        isn't one of the sink pads. Must be called with the lock held.
+        """
+        _LOG.log_interval(
+            1.0, LOG, "do_chain called on %s with thread id %d", pad.get_name(), threading.get_ident(), obj=self
+        )
+        pad_index = self.sinkpads.index(pad) if pad in self.sinkpads else None
+        if pad_index is None:
+            _LOG.error("Unexpected pad %s", pad.get_name(), obj=self)
+            return None
+
+        if self._matcher is None:
+            self._buffers[pad_index] = buffer
+            return [FrameSet(self._buffers)] if all(self._buffers) else []
+        if buffer.pts == Gst.CLOCK_TIME_NONE:
+            self._matcher.dropped += 1  # buffers without timestamps can't be matched
+            return []
+        return [FrameSet(m) for m in self._matcher.add(pad_index, buffer.pts, buffer)]
+
+
+    def _take_batch(self, frameset):
+        """
+        Return the frame sets to process now that the given one has arrived, which is just that frame set unless
+        batching, in which case it's added to the current batch and the batch is returned if this completes it or an
+        empty list otherwise. Must be called with the lock held.
+        """
+        if self._batcher is None:
+            return [frameset]
+
+        batch = self._batcher.add(frameset)
+        if not batch and len(self._batcher) == 1 and self._batcher.deadline is not None:
+            self._start_batch_timer()
+
+        return batch or []
+
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run_worker, args=(self._queue,), daemon=True)
+            self._worker.start()
+
+
+    def _stop_worker(self):
+        worker = self._worker
+        if worker is not None:
+            self._queue.close()
+            worker.join()
+            self._worker = None
+            self._queue = self._queue_policy.create_queue()
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = self._queue_policy.create_pool(self._on_result)
+
+
+    def _run_worker(self, queue):
+        """
+        Process frame sets from the queue until it's closed. A flow return other than OK from pushing the results is
+        kept to be returned to upstream by the next call to `do_chain`. With a worker pool, frame sets are left in the
+        queue while the pool has its maximum in flight so that the queue policy decides which are dropped.
+        """
+        while True:
+            if self._pool is not None:
+                self._pool.wait_for_slot()
+
+            frameset = queue.get()
+            if frameset is None:
+                break
+
+            try:
+                # only the process lock is held while processing so the streaming threads can keep queueing
+                with self._profiler.frame(), self._process_lock:
+                    with self._lock:
+                        batch = self._take_batch(frameset)
+                    ret = self._process(batch) if batch else Gst.FlowReturn.OK
+                    if ret != Gst.FlowReturn.OK:
+                        self._flow_return = ret
+            finally:
+                queue.task_done()
+
+
+    def _start_batch_timer(self):
+        """
+        Start a timer to pass on the current batch when its deadline is reached if it hasn't filled by then.
+        """
+        def _on_timeout():
+            with self._process_lock:
+                with self._lock:
+                    expired = self._batcher is not None and self._batcher.expired()
+                    batch = self._batcher.take() if expired else None
+                if batch:
+                    self._process(batch)
+
+        timer = threading.Timer(max(0.0, self._batcher.deadline - time.monotonic()), _on_timeout)
+        timer.daemon = True
+        timer.start()
 
+
+    def _flush_batch(self):
+        """
+        Process the frame sets waiting in an incomplete batch. Must be called with the process lock held.
+        """
         with self._lock:
-            print("=======================================")
-            print(f"do_chain called on {pad.get_name()} with thread id {threading.get_ident()}")
-            pad_index = self.sinkpads.index(pad) if pad in self.sinkpads else None
-            if pad_index is None:
-                print("Unexpected pad!")
-                return Gst.FlowReturn.ERROR
-            self._buffers[pad_index] = buffer
+            batch = self._batcher.take() if self._batcher is not None else None
+        if batch:
+            self._process(batch)
 
-            if all(self._buffers):
 
-                frames = list()
-                for sinkpad, buffer in zip(self.sinkpads, self._buffers):
-                    # Extract data from buffer
-                    success, map_info = buffer.map(Gst.MapFlags.READ)
-                    if not success:
-                        print("Unexpected failure!")
-                        return Gst.FlowReturn.ERROR
+    def _process(self, framesets):
+        """
+        Map the buffers of the given frame sets, run do_op on them, and push the results. The input buffers stay mapped
+        until the outputs are pushed so do_op can use the frames without copying. If batching is enabled the frames from
+        each pad are stacked into a single array first and the results are split back into one buffer per frame set,
+        otherwise `framesets` has a single entry. With a worker pool do_op is only submitted here and the results are
+        pushed by `_on_result`. Must be called with the process lock held and the lock released.
+        """
+        if self._stats is not None:
+            for frameset in framesets:
+                self._record("queue", frameset.created)
+
+        buffers = [b for frameset in framesets for b in frameset]
+        stack = ExitStack()
+
+        try:
+            arrays = stack.enter_context(
+                map_buffers_to_numpy(buffers, Gst.MapFlags.READ, self._geometries * len(framesets))
+            )
+        except ValueError as e:
+            stack.close()
+            _LOG.error("Failed to map buffers: %s", e, obj=self)
+            return Gst.FlowReturn.ERROR
+
+        if self._batcher is None and self._change_detector is not None:
+            with self._lock:
+                force = self._last_outputs is None
+            if not self._change_detector.changed(arrays, force=force):
+                stack.close()
+                return self._reuse_outputs(framesets[0])
+
+        num_inputs = len(self._geometries)
+        convert = self._frombuffer if self._preprocess is None else self._preprocess_frame
+        frames = [convert(a, i % num_inputs) for i, a in enumerate(arrays)]
+        stack_frames = None if self._batcher is None else self._stack
+
+        if self._pool is None:
+            with stack:
+                results, duration = _timed_run_op(self.do_op, frames, num_inputs, stack_frames)
+                return self._timed_push_results(framesets, frames, results, duration, stack_frames is not None)
+
+        # a bound method of the element can't be sent to another process, so worker processes call the set do_op
+        do_op = self.do_op if self._pool.kind == "thread" else self._do_op
+        if do_op is None:
+            stack.close()
+            raise ValueError("do_op must be set with set_do_op to run in worker processes")
+
+        context = (framesets, frames, stack_frames is not None, stack)
+        self._pool.submit(context, _timed_run_op, do_op, frames, num_inputs, stack_frames)
+        return self._flow_return
+
+
+    def _on_result(self, context, timed_results, error):
+        """
+        Push the results of an asynchronous do_op call then unmap its input buffers, called by the worker pool in the
+        order the frame sets were submitted.
+        """
+        framesets, frames, batched, stack = context
+
+        with stack:
+            if error is not None:
+                _LOG.error("do_op failed: %r", error, obj=self)
+                with self._lock:
+                    self._last_outputs = None  # unchanged frame sets queued behind this one mustn't reuse older outputs
+                self._flow_return = Gst.FlowReturn.ERROR
+                return
+
+            if frames is None:  # unchanged frame set queued behind the ones in flight
+                ret = self._push_last_outputs(framesets[0])
+            else:
+                ret = self._timed_push_results(framesets, frames, *timed_results, batched)
+            if ret != Gst.FlowReturn.OK:
+                self._flow_return = ret
+
+
+    def _timed_push_results(self, framesets, frames, results, duration, batched):
+        if self._stats is None:
+            return self._push_results(framesets, frames, results, batched)
+
+        self._stats.record(self.get_name(), "do_op", duration)
+        start = time.perf_counter()
+        ret = self._push_results(framesets, frames, results, batched)
+        self._record("push", start)
+        return ret
+
 
-                    caps = sinkpad.get_current_caps().get_structure(0)
-                    height, width, channels = caps.get_value("height"), caps.get_value("width"), caps.get_value("channels")
-                    dtype = np.uint8 if self._array_type == "numpy" else torch.uint8
-                    frame = self._frombuffer(map_info.data, dtype=dtype).reshape((height, width, 3))
+    def _record(self, metric, start):
+        self._stats.record(self.get_name(), metric, time.perf_counter() - start)
 
-                    frames.append(frame)
-                    buffer.unmap(map_info)
 
-                results = self.do_op(frames)
+    def _push_results(self, framesets, frames, results, batched):
+        # preprocessed frames are no longer the contents of their buffers so those can't be forwarded
+        buffers = [b for frameset in framesets for b in frameset] if self._preprocess is None else []
 
-                for b, p in zip(results, self.srcpads):
-                    dbuffer = Gst.Buffer.new_wrapped(self._tobuffer(b))
-                    p.push(dbuffer)
+        if batched:
+            # the stacked frames are copies so results are always safe to wrap
+            outputs = [[self._tobuffer(r[i]) for i in range(len(framesets))] for r in results]
+        else:
+            outputs = [[self._tobuffer(r, frames, buffers)] for r in results]
 
+        if self._change_detector is not None and not batched:
+            # with a worker pool this is the push thread, so the lock keeps the streaming thread from seeing a partial
+            # update
+            with self._lock:
+                self._last_outputs = [dbuffers[0] for dbuffers in outputs]
+
+        ret = Gst.FlowReturn.OK
+        for dbuffers, p in zip(outputs, self.srcpads):
+            for dbuffer, frameset in zip(dbuffers, framesets):
+                if dbuffer not in frameset:  # forwarded input buffers keep their own timestamps
+                    _copy_timestamps(frameset[0], dbuffer)
+
+                push_ret = p.push(dbuffer)
+                if push_ret != Gst.FlowReturn.OK:
+                    ret = push_ret
+
+        return ret
+
+
+    def _reuse_outputs(self, frameset):
+        """
+        Push the last outputs again for an unchanged frame set. With a worker pool this is queued behind the frame sets
+        in flight so outputs stay in order and the outputs of the last of those are the ones reused.
+        """
+        if self._pool is None:
+            return self._push_last_outputs(frameset)
+
+        self._pool.submit(([frameset], None, False, ExitStack()), _skip_op)
+        return self._flow_return
+
+
+    def _push_last_outputs(self, frameset):
+        with self._lock:
+            last_outputs = self._last_outputs
+
+        if last_outputs is None:  # the processing of the last changed frame set failed
             return Gst.FlowReturn.OK
 
+        ret = Gst.FlowReturn.OK
+        for last, p in zip(last_outputs, self.srcpads):
+            dbuffer = last.copy()  # shares the memory of the last output but has its own timestamps
+            _copy_timestamps(frameset[0], dbuffer)
+
+            push_ret = p.push(dbuffer)
+            if push_ret != Gst.FlowReturn.OK:
+                ret = push_ret
+
+        return ret
+
 
     def do_op(self, sink_data):
         """
@@ -246,9 +682,109 @@ class GstStreamRunnerBackend(Gst.Element):
         return self._do_op(sink_data)
 
 
-    def _from_numpy(self, data):
-        return data.tobytes()
+    def _frames_in_use(self):
+        """
+        Get the number of frames per input that can be in use at once, which is every frame of the batches in flight
+        plus those of the batch being collected.
+        """
+        policy = self._queue_policy
+        max_in_flight = (policy.max_in_flight or 2 * policy.workers) if policy.asynchronous else 0
+        return policy.max_batch_size * (max_in_flight + 1)
+
+
+    def _reset_rings(self):
+        """
+        Allocate the tensor ring of each input with negotiated caps, with a tensor for each frame that can be in use.
+        """
+        self._reserve_preprocess()
+
+        if self._array_type != "torch":
+            return
+
+        size = self._frames_in_use()
+        self._rings = [
+            None if g is None else TensorRing(g.shape, g.dtype, size, self._tensor_format) for g in self._geometries
+        ]
+
+
+    def _reserve_preprocess(self):
+        if isinstance(self._preprocess, (list, tuple)):
+            preprocesses, size = self._preprocess, self._frames_in_use()
+        else:
+            # a single function converts the frames of every input
+            preprocesses, size = [self._preprocess], self._frames_in_use() * max(len(self.sinkpads), 1)
+
+        for preprocess in preprocesses:
+            if hasattr(preprocess, "reserve"):
+                preprocess.reserve(size)
+
+
+    def _preprocess_frame(self, array, index):
+        preprocess = self._preprocess[index] if isinstance(self._preprocess, (list, tuple)) else self._preprocess
+        frame = preprocess(array)
+        return torch.from_numpy(frame) if self._array_type == "torch" else frame
+
+
+    def _to_numpy(self, array, index):
+        return array
+
+
+    def _to_torch(self, array, index):
+        return self._rings[index].put(array)
+
+
+    def _from_numpy(self, data, frames=(), buffers=()):
+        # an unmodified input frame is forwarded by pushing its buffer
+        for f, b in zip(frames, buffers):
+            if data is f:
+                return b
+
+        # results aliasing the input frames can't be wrapped since the input buffers may be freed before the output
+        if any(np.may_share_memory(data, f) for f in frames):
+            data = np.array(data)
+        return wrap_array_in_buffer(data)
+
+
+    def _from_torch(self, data, frames=(), buffers=()):
+        # only frames aliasing their buffer can be forwarded, ring tensors may have been converted or modified in place
+        for f, b in zip(frames, buffers):
+            if data is f and not any(r is not None and r.owns(f) for r in self._rings):
+                return b
+
+        return self._from_numpy(data.detach().cpu().numpy(), [f.numpy() for f in frames])
+
+
+
+def _run_op(do_op, frames, num_inputs, stack=None):
+    """
+    Call do_op on the frames, first stacking the frames of each input into a batch if a `stack` function is given.
+    This is a module function so that it can be sent to worker processes.
+    """
+    if stack is None:
+        return do_op(frames)
+    return do_op([stack(frames[i::num_inputs]) for i in range(num_inputs)])
+
+
+
+def _timed_run_op(do_op, frames, num_inputs, stack=None):
+    """
+    Call `_run_op`, returning its results with the time it took so that it can be measured in worker processes.
+    """
+    start = time.perf_counter()
+    results = _run_op(do_op, frames, num_inputs, stack)
+    return results, time.perf_counter() - start
+
+
+
+def _skip_op():
+    """
+    Stands in for `_timed_run_op` for frame sets skipped by the change detector while others are in flight.
+    """
+    return None, 0.0
+
 
 
-    def _from_torch(self, data):
-        return data.numpy().tobytes()
+def _copy_timestamps(source, dest):
+    dest.pts = source.pts
+    dest.dts = source.dts
+    dest.duration = source.duration
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from monaistream.streamrunners.stats import DEFAULT_STATS
+
+
+
+class ElementProbes:
+    """
+    Pad probes measuring the time buffers spend in an element. Each buffer entering a sink pad is stamped with the
+    time it arrived, keyed by its PTS, and when a buffer with that PTS leaves through a src pad the elapsed time is
+    recorded in `stats` as the metric "pad:<src pad name>" of the element. Only the first arrival of each PTS is kept
+    so for elements with several inputs this is the time from the earliest input. Stamps of buffers that never leave,
+    eg. because they were dropped, are discarded once more than `max_pending` are waiting.
+    """
+
+    def __init__(self, element, stats=DEFAULT_STATS, max_pending=256):
+        self.element = element
+        self.stats = stats
+        self.max_pending = max_pending
+        self._name = element.get_name()
+        self._arrivals = OrderedDict()
+        self._lock = threading.Lock()
+        self._probes = list()
+
+        for pad in element.sinkpads:
+            self._probes.append((pad, pad.add_probe(Gst.PadProbeType.BUFFER, self._on_ingress)))
+        for pad in element.srcpads:
+            self._probes.append((pad, pad.add_probe(Gst.PadProbeType.BUFFER, self._on_egress)))
+
+
+    def remove(self):
+        for pad, probe_id in self._probes:
+            pad.remove_probe(probe_id)
+        self._probes = list()
+
+
+    def _on_ingress(self, pad, info):
+        pts = info.get_buffer().pts
+        if pts != Gst.CLOCK_TIME_NONE:
+            with self._lock:
+                self._arrivals.setdefault(pts, time.perf_counter())
+                while len(self._arrivals) > self.max_pending:
+                    self._arrivals.popitem(last=False)
+
+        return Gst.PadProbeReturn.OK
+
+
+    def _on_egress(self, pad, info):
+        now = time.perf_counter()
+        pts = info.get_buffer().pts
+
+        with self._lock:
+            arrival = self._arrivals.get(pts)
+            # drop stamps older than this buffer as they'll never be matched, but keep this one for the other src pads
+            while self._arrivals and next(iter(self._arrivals)) != pts and arrival is not None:
+                self._arrivals.popitem(last=False)
+
+        if arrival is not None:
+            self.stats.record(self._name, f"pad:{pad.get_name()}", now - arrival)
+
+        return Gst.PadProbeReturn.OK
+
+
+
+def instrument_element(element, stats=DEFAULT_STATS, max_pending=256):
+    """
+    Add probes measuring the time buffers spend in `element` per src pad, and if it's a stream runner also have it
+    record its queueing, do_op, and push times into `stats`. Returns the ElementProbes, whose `remove` method removes
+    the probes again.
+    """
+    if hasattr(element, "set_stats"):
+        element.set_stats(stats)
+
+    return ElementProbes(element, stats, max_pending)
+
+
+
+def instrument_bin(bin, stats=DEFAULT_STATS, max_pending=256):
+    """
+    Instrument every element in `bin` and its child bins, eg. the pipeline of a GstStreamRunnerSubnet, so that the
+    time spent in decoders, queues and runners can be told apart. Returns the list of ElementProbes.
+    """
+    probes = list()
+    iterator = bin.iterate_recurse()
+
+    while True:
+        result, element = iterator.next()
+        if result == Gst.IteratorResult.OK:
+            if not isinstance(element, Gst.Bin):
+                probes.append(instrument_element(element, stats, max_pending))
+        elif result == Gst.IteratorResult.RESYNC:
+            iterator.resync()
+            for p in probes:
+                p.remove()
+            probes = list()
+        else:
+            break
+
+    return probes
@@ -2,7 +2,12 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst
 
+from monaistream.streamrunners.debug import get_logger
+from monaistream.streamrunners.gstreamer.instrumentation import instrument_bin
 from monaistream.streamrunners.gstreamer.utils import parse_node_entry
+from monaistream.streamrunners.stats import DEFAULT_STATS
+
+_LOG = get_logger("monaistream-subnet", "MONAI Stream runner subnets")
 
 
 class GstStreamRunnerSubnet:
@@ -15,7 +20,6 @@ class GstStreamRunnerSubnet:
         self.outputs = list()
 
         # validate that each name appears just once within its collection
-        print(input_urls)
         input_name_set = set((u.name for u in input_urls))
         if len(input_name_set) != len(input_urls):
             raise ValueError("input names must be unique: got {input_name_set}")
@@ -24,10 +28,8 @@ class GstStreamRunnerSubnet:
             raise ValueError("output names must be unique: got {output_name_set}")
 
         # validate that the names are compatible with the runner
-        print("input_urls:", input_urls)
-        print("output_urls:", output_urls)
-        print("input_names:", runner.input_names)
-        print("output_names:", runner.output_names)
+        _LOG.debug("input_urls: %s, output_urls: %s", input_urls, output_urls)
+        _LOG.debug("input_names: %s, output_names: %s", runner.input_names, runner.output_names)
         for input_url in input_urls:
             if input_url.name not in runner.input_names:
                 raise ValueError(f"input {input_url.name} not in {runner.input_names}")
@@ -39,7 +41,7 @@ class GstStreamRunnerSubnet:
         for input_url in input_urls:
             element = parse_node_entry(input_url)
             self.inputs.append(element)
-            print("element:", element)
+            _LOG.debug("input element: %s", element)
             self._pipeline.add(element)
 
         self._pipeline.add(runner.backend)
@@ -50,14 +52,20 @@ class GstStreamRunnerSubnet:
             self._pipeline.add(element)
 
         for element, desc in zip(self.inputs, input_urls):
-            print("input_desc pad name:", desc.name)
+            _LOG.debug("linking input to pad %s", desc.name)
             element.link_pads("src", runner.backend, desc.name)
 
         for element, desc in zip(self.outputs, output_urls):
-            print("output_desc pad name =", desc.name)
-            print("element:", element)
+            _LOG.debug("linking pad %s to output element %s", desc.name, element)
             runner.backend.link_pads(desc.name, element, "sink")
 
     @property
     def pipeline(self):
         return self._pipeline
+
+    def instrument(self, stats=DEFAULT_STATS):
+        """
+        Measure the time buffers spend in every element of the pipeline, and the runner's queueing, do_op and push
+        times, recording them into `stats`. Returns the list of ElementProbes added.
+        """
+        return instrument_bin(self._pipeline, stats)
@@ -24,6 +24,55 @@ def register(runner_type, runner_alias):
 
 
 
+PROFILE_PROPERTIES = {
+    "profile-frames": (
+        int,
+        "Frames to profile",
+        "Setting this profiles the next N frames with cProfile, reading it gives the frames left to profile",
+        0,
+        GLib.MAXINT,
+        0,
+        GObject.ParamFlags.READWRITE,
+    ),
+    "profile-path": (
+        str,
+        "Profile path",
+        "File the profile stats are written to once the frames have been profiled",
+        "streamrunner.prof",
+        GObject.ParamFlags.READWRITE,
+    ),
+}
+
+
+
+def get_profile_property(profiler, prop):
+    """
+    Get the value of one of the PROFILE_PROPERTIES from the given FrameProfiler.
+    """
+    if prop.name == "profile-frames":
+        return profiler.remaining
+    if prop.name == "profile-path":
+        return profiler.path
+    raise AttributeError(f"No such property {prop.name}")
+
+
+
+def set_profile_property(profiler, prop, value):
+    """
+    Set one of the PROFILE_PROPERTIES on the given FrameProfiler, setting "profile-frames" starts profiling.
+    """
+    if prop.name == "profile-frames":
+        if value > 0:
+            profiler.start(value)
+        else:
+            profiler.stop()
+    elif prop.name == "profile-path":
+        profiler.path = value
+    else:
+        raise AttributeError(f"No such property {prop.name}")
+
+
+
 def create_registerable_plugin(base_type, class_name, inputs, outputs, do_op):
     # TODO: is this class actually gstreamer specific?
     def init_with_do_op(self):
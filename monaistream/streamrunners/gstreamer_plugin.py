@@ -1,17 +1,239 @@
+import functools
 import inspect
 import threading
+import time
+from contextlib import ExitStack
 
 import gi
 
 gi.require_version("Gst", "1.0")
 gi.require_version("GstBase", "1.0")
-from gi.repository import Gst, GstBase
+from gi.repository import Gst, GObject, GstBase
 
 import numpy as np
 
+from monaistream.gstreamer.numpy_ops import DEFAULT_LABEL_COLORS, LabelOverlay
+from monaistream.gstreamer.utils import (
+    BYTE_FORMATS,
+    configure_video_buffer_pool,
+    get_color_channels,
+    get_video_geometry,
+    map_buffer_to_numpy,
+    map_buffers_to_numpy,
+)
+from monaistream.streamrunners.debug import LOG, get_logger
+from monaistream.streamrunners.gstreamer.utils import PROFILE_PROPERTIES, get_profile_property, set_profile_property
+from monaistream.streamrunners.profiling import FrameProfiler
+from monaistream.streamrunners.skipping import QosController
+
 
 
 FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR}"
+OVERLAY_FORMATS = "{RGBx,BGRx,xRGB,xBGR,RGBA,BGRA,ARGB,ABGR,RGB,BGR,GRAY8}"  # 8 bit video formats LabelOverlay blends
+
+_INPLACE_LOG = get_logger("monaistream-inplace", "MONAI Stream in place runner")
+_ADAPTOR_LOG = get_logger("monaistream-adaptor", "MONAI Stream adaptor runner")
+_AGGREGATOR_LOG = get_logger("monaistream-aggregator", "MONAI Stream multiple input runners")
+_PROTOTYPE_LOG = get_logger("monaistream-prototype", "MONAI Stream prototype runners")
+
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_output(do_op):
+    """
+    Returns True if the given do_op function has an `output` parameter to write its result into.
+    """
+    try:
+        return "output" in inspect.signature(do_op).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+
+def _timed_do_op(runner, *args, **kwargs):
+    """
+    Call the runner's do_op, recording the time taken as its "do_op" metric if it has been given stats to record into.
+    """
+    if runner._stats is None:
+        return runner.do_op(*args, **kwargs)
+
+    start = time.perf_counter()
+    result = runner.do_op(*args, **kwargs)
+    runner._stats.record(runner.get_name(), "do_op", time.perf_counter() - start)
+    return result
+
+
+
+def _reuse_unchanged(runner, frame, output):
+    """
+    Check the frame with the runner's change detector if it has one, and if it hasn't changed since the last frame
+    processed copy that frame's output into `output` and return True so that do_op can be skipped.
+    """
+    detector = runner._change_detector
+    if detector is None or detector.changed([frame], force=runner._last_output is None):
+        return False
+
+    np.copyto(output, runner._last_output)
+    return True
+
+
+
+def _keep_output(runner, output):
+    """
+    Keep a copy of the output of a processed frame for reuse by `_reuse_unchanged` if the runner has a change detector.
+    """
+    if runner._change_detector is None:
+        return
+
+    last = runner._last_output
+    if last is None or last.shape != output.shape or last.dtype != output.dtype:
+        runner._last_output = np.array(output)
+    else:
+        np.copyto(last, output)
+
+
+
+def _get_frame_duration(caps):
+    """
+    Get the duration of a frame in seconds from the framerate in the given caps, or None if it's unknown or variable.
+    """
+    ok, num, denom = caps.get_structure(0).get_fraction("framerate")
+    return denom / num if ok and num > 0 else None
+
+
+
+def _init_qos(runner):
+    """
+    Set up the QoS state of a BaseTransform runner. QoS is opt-in, enabled with `set_qos_enabled(True)` or the "qos"
+    property, and then both the late buffers the base class drops and those skipped by the runner's QosController are
+    counted as skipped, the former taken from the stats of the QoS messages the base class posts for each drop.
+    """
+    runner._qos = QosController()
+    runner._frame_duration = None
+    runner._late_dropped = 0
+
+
+
+def _on_qos_message(runner, message):
+    """
+    Keep the number of late buffers the base class has dropped from a QoS message posted by the runner.
+    """
+    if message.type == Gst.MessageType.QOS and message.src == runner:
+        fmt, _, dropped = message.parse_qos_stats()
+        if fmt == Gst.Format.BUFFERS:
+            runner._late_dropped = dropped
+
+
+
+def _skipped_frames(runner):
+    return runner._qos.skipped + runner._late_dropped
+
+
+
+def _on_qos_event(runner, event):
+    _, proportion, diff, _ = event.parse_qos()
+    runner._qos.update_proportion(proportion, diff / Gst.SECOND)
+
+
+
+def _qos_skip(runner, buffer):
+    """
+    Returns True if QoS is enabled for the runner and its QosController decides `buffer` should be skipped, since
+    do_op can't keep up with the framerate while downstream receives buffers late.
+    """
+    if not runner.is_qos_enabled():
+        return False
+
+    if buffer.duration != Gst.CLOCK_TIME_NONE and buffer.duration > 0:
+        frame_duration = buffer.duration / Gst.SECOND
+    else:
+        frame_duration = runner._frame_duration
+
+    return not runner._qos.should_process(frame_duration)
+
+
+
+def _pop_buffers(pads):
+    """
+    Pop the queued buffer of each of the given aggregator pads, or none of them if any pad has no buffer. Returns the
+    buffers, or None and the flow return for the aggregator to give: EOS if a pad without a buffer has ended, since no
+    further outputs can be made, otherwise OK to be called again when the rest arrive, eg. after a live timeout.
+    """
+    if any(pad.peek_buffer() is None for pad in pads):
+        ended = any(pad.is_eos() and pad.peek_buffer() is None for pad in pads)
+        return None, Gst.FlowReturn.EOS if ended else Gst.FlowReturn.OK
+
+    return [pad.pop_buffer() for pad in pads], Gst.FlowReturn.OK
+
+
+
+def _copy_timestamps(src, dest):
+    """
+    Give the output buffer `dest` the timestamps and duration of the input buffer `src`.
+    """
+    dest.pts = src.pts
+    dest.dts = src.dts
+    dest.duration = src.duration
+
+
+
+def _src_caps_from_pad(aggregator, pad):
+    """
+    Get the result of `do_update_src_caps` for an aggregator whose output has the caps of the sink pad `pad`, giving
+    NEED_DATA until the pad has caps.
+    """
+    caps = pad.get_current_caps() if pad is not None else None
+    if caps is None:
+        return GstBase.AGGREGATOR_FLOW_NEED_DATA, None
+
+    caps = caps.intersect(aggregator.srcpad.get_pad_template_caps())
+    if caps.is_empty():
+        return Gst.FlowReturn.NOT_NEGOTIATED, None
+    return Gst.FlowReturn.OK, caps
+
+
+
+def _decide_pooled_allocation(aggregator, query):
+    """
+    Configure the buffer pool for the aggregator's output in `do_decide_allocation`, returning False if it can't be.
+    """
+    try:
+        aggregator._output_geometry = configure_video_buffer_pool(query)
+    except ValueError as e:
+        _AGGREGATOR_LOG.error("Failed to configure the output buffer pool: %s", e, obj=aggregator)
+        return False
+    return True
+
+
+
+def _aggregate_to_pooled_buffer(aggregator, images):
+    """
+    Run the aggregator's do_op on the given images and return an output buffer holding the result. The output buffer
+    is acquired from the pool negotiated in `do_decide_allocation` when present and mapped for writing, and if do_op
+    has an `output` parameter the mapped array is passed so that it can write its result directly into the buffer.
+    Otherwise the returned result is copied into the buffer.
+    """
+    pool = aggregator.get_buffer_pool()
+    if pool is None:  # no pool was negotiated so allocate a buffer for the result
+        result = _timed_do_op(aggregator, images)
+        output_buffer = Gst.Buffer.new_allocate(None, result.nbytes, None)
+        output_buffer.fill(0, result.tobytes())
+        return output_buffer
+
+    ret, output_buffer = pool.acquire_buffer(None)
+    if ret != Gst.FlowReturn.OK:
+        raise RuntimeError(f"Failed to acquire buffer from pool: {ret}")
+
+    with map_buffer_to_numpy(output_buffer, Gst.MapFlags.WRITE, aggregator._output_geometry) as output:
+        if _accepts_output(getattr(aggregator.do_op, "__func__", aggregator.do_op)):
+            result = _timed_do_op(aggregator, images, output=output)
+        else:
+            result = _timed_do_op(aggregator, images)
+
+        if result is not None and result is not output:
+            np.copyto(output, result)
+
+    return output_buffer
 
 
 
@@ -87,27 +309,93 @@ class GstInPlaceStreamRunner(GstBase.BaseTransform):
 
     __gstproperties__ = {}
 
+    __gproperties__ = dict(PROFILE_PROPERTIES)
+
+    def __init__(self):
+        super().__init__()
+        self._stats = None
+        self._profiler = FrameProfiler()
+        self._change_detector = None
+        self._last_output = None
+        _init_qos(self)
+
+    @property
+    def processed_frames(self):
+        """
+        The number of frames passed to do_op while QoS was enabled.
+        """
+        return self._qos.processed
+
+    @property
+    def skipped_frames(self):
+        """
+        The number of frames dropped without calling do_op while QoS was enabled, because they were late or do_op
+        couldn't keep up with the framerate.
+        """
+        return _skipped_frames(self)
+
+    def set_stats(self, stats):
+        """
+        Record the time spent in do_op as this element's "do_op" metric in the LatencyStats `stats`, or stop if None.
+        """
+        self._stats = stats
+
+    def set_change_detector(self, detector):
+        """
+        Set the ChangeDetector deciding whether each frame has changed enough since the last processed one to run
+        do_op, otherwise that frame's output is copied into the buffer instead. None disables skipping.
+        """
+        self._change_detector = detector
+        self._last_output = None
+
+    def profile(self, num_frames, path=None):
+        """
+        Profile the next `num_frames` buffers with cProfile and write the stats to `path`, the "profile-path" property
+        if None.
+        """
+        self._profiler.start(num_frames, path)
+
+    def do_get_property(self, prop):
+        return get_profile_property(self._profiler, prop)
+
+    def do_set_property(self, prop, value):
+        set_profile_property(self._profiler, prop, value)
+
     def do_op(self, data):
         raise NotImplementedError()
 
-    def do_transform_ip(self, buffer: Gst.Buffer) -> Gst.FlowReturn:
-        print("do_transform_ip")
+    def do_set_caps(self, incaps, outcaps):
+        self._geometry = get_video_geometry(outcaps)
+        self._frame_duration = _get_frame_duration(incaps)
+        return True
 
-        cstruct = self.srcpad.get_current_caps().get_structure(0)
-        height = cstruct.get_value("height")
-        width = cstruct.get_value("width")
-        format = cstruct.get_value("format")
+    def do_src_event(self, event):
+        if event.type == Gst.EventType.QOS:
+            _on_qos_event(self, event)
+        return GstBase.BaseTransform.do_src_event(self, event)
 
-        is_mapped, map_info = buffer.map(Gst.MapFlags.WRITE)
+    def do_post_message(self, message):
+        _on_qos_message(self, message)
+        return GstBase.BaseTransform.do_post_message(self, message)
 
-        if is_mapped:
-            data = np.ndarray((height, width, len(format)), dtype=np.uint8, buffer=map_info.data)
-            data = self.do_op(data)
-            buffer.unmap(map_info)
-        else:
-            raise RuntimeError("Mapping failed")
+    def do_transform_ip(self, buffer: Gst.Buffer) -> Gst.FlowReturn:
+        with self._profiler.frame():
+            _INPLACE_LOG.log_interval(1.0, LOG, "do_transform_ip", obj=self)
+
+            if _qos_skip(self, buffer):
+                return GstBase.BASE_TRANSFORM_FLOW_DROPPED
+
+            start = time.perf_counter()
+            try:
+                with map_buffer_to_numpy(buffer, Gst.MapFlags.WRITE, self._geometry) as data:
+                    if not _reuse_unchanged(self, data, data):
+                        _timed_do_op(self, data)
+                        _keep_output(self, data)
+            except ValueError as e:
+                raise RuntimeError("Mapping failed") from e
+            self._qos.record(time.perf_counter() - start)
 
-        return Gst.FlowReturn.OK
+            return Gst.FlowReturn.OK
 
 
 
@@ -181,11 +469,59 @@ class GstAdaptorStreamRunner(GstBase.BaseTransform):
         ),
     )
 
+    __gproperties__ = dict(PROFILE_PROPERTIES)
+
 
     def __init__(self, width=None, height=None):
         super().__init__()
         self.width = width
         self.height = height
+        self._stats = None
+        self._profiler = FrameProfiler()
+        self._change_detector = None
+        self._last_output = None
+        _init_qos(self)
+
+
+    @property
+    def processed_frames(self):
+        """
+        The number of frames passed to do_op while QoS was enabled.
+        """
+        return self._qos.processed
+
+
+    @property
+    def skipped_frames(self):
+        """
+        The number of frames dropped without calling do_op while QoS was enabled, because they were late or do_op
+        couldn't keep up with the framerate.
+        """
+        return _skipped_frames(self)
+
+
+    def set_stats(self, stats):
+        """
+        Record the time spent in do_op as this element's "do_op" metric in the LatencyStats `stats`, or stop if None.
+        """
+        self._stats = stats
+
+
+    def set_change_detector(self, detector):
+        """
+        Set the ChangeDetector deciding whether each input frame has changed enough since the last processed one to run
+        do_op, otherwise that frame's output is copied into the output buffer instead. None disables skipping.
+        """
+        self._change_detector = detector
+        self._last_output = None
+
+
+    def profile(self, num_frames, path=None):
+        """
+        Profile the next `num_frames` buffers with cProfile and write the stats to `path`, the "profile-path" property
+        if None.
+        """
+        self._profiler.start(num_frames, path)
 
 
     def do_op(self, data):
@@ -198,7 +534,7 @@ class GstAdaptorStreamRunner(GstBase.BaseTransform):
         elif prop.name == "height":
             return self.height
         else:
-            raise AttributeError(f"No such property {prop.name}")
+            return get_profile_property(self._profiler, prop)
 
 
     def do_set_property(self, prop, value):
@@ -207,36 +543,49 @@ class GstAdaptorStreamRunner(GstBase.BaseTransform):
         elif prop.name == "height":
             self.height = value
         else:
-            raise AttributeError(f"No such property {prop.name}")
+            set_profile_property(self._profiler, prop, value)
 
 
-    def do_transform(self, in_buffer: Gst.Buffer, out_buffer: Gst.Buffer) -> Gst.FlowReturn:
+    def do_set_caps(self, incaps, outcaps):
+        self._in_geometry = get_video_geometry(incaps)
+        self._out_geometry = get_video_geometry(outcaps)
+        self._frame_duration = _get_frame_duration(incaps)
+        return True
 
-        in_cstruct = self.sinkpad.get_current_caps().get_structure(0)
-        in_height = in_cstruct.get_value("height")
-        in_width = in_cstruct.get_value("width")
-        in_format = in_cstruct.get_value("format")
 
-        out_cstruct = self.srcpad.get_current_caps().get_structure(0)
-        out_height = out_cstruct.get_value("height")
-        out_width = out_cstruct.get_value("width")
-        out_format = out_cstruct.get_value("format")
+    def do_src_event(self, event):
+        if event.type == Gst.EventType.QOS:
+            _on_qos_event(self, event)
+        return GstBase.BaseTransform.do_src_event(self, event)
 
-        print(f"from ({in_height, in_width, in_format}) to ({out_height, out_width, out_format})")
 
-        snk_is_mapped, snk_map_info = in_buffer.map(Gst.MapFlags.READ)
-        src_is_mapped, src_map_info = out_buffer.map(Gst.MapFlags.WRITE)
+    def do_post_message(self, message):
+        _on_qos_message(self, message)
+        return GstBase.BaseTransform.do_post_message(self, message)
 
-        if snk_is_mapped and src_is_mapped:
-            in_data = np.ndarray((in_height, in_width, len(in_format)), dtype=np.uint8, buffer=snk_map_info.data)
-            out_data = np.ndarray((out_height, out_width, len(out_format)), dtype=np.uint8, buffer=src_map_info.data)
-            self.do_op(in_data, out_data)
-            in_buffer.unmap(snk_map_info)
-            out_buffer.unmap(src_map_info)
-        else:
-            raise RuntimeError("Mapping failed: source mapping status={src_is_mapped}; sink mapping status={sink_is_mapped}")
 
-        return Gst.FlowReturn.OK
+    def do_transform(self, in_buffer: Gst.Buffer, out_buffer: Gst.Buffer) -> Gst.FlowReturn:
+        with self._profiler.frame():
+            in_geometry = self._in_geometry
+            out_geometry = self._out_geometry
+
+            _ADAPTOR_LOG.log_interval(1.0, LOG, "from %s to %s", in_geometry.shape, out_geometry.shape, obj=self)
+
+            if _qos_skip(self, in_buffer):
+                return GstBase.BASE_TRANSFORM_FLOW_DROPPED
+
+            start = time.perf_counter()
+            try:
+                with map_buffer_to_numpy(in_buffer, Gst.MapFlags.READ, in_geometry) as in_data:
+                    with map_buffer_to_numpy(out_buffer, Gst.MapFlags.WRITE, out_geometry) as out_data:
+                        if not _reuse_unchanged(self, in_data, out_data):
+                            _timed_do_op(self, in_data, out_data)
+                            _keep_output(self, out_data)
+            except ValueError as e:
+                raise RuntimeError(f"Mapping failed: {e}") from e
+            self._qos.record(time.perf_counter() - start)
+
+            return Gst.FlowReturn.OK
 
 
 
@@ -253,6 +602,8 @@ class GstMultiInputStreamRunner(GstBase.Aggregator):
         ),
     )
 
+    __gproperties__ = dict(PROFILE_PROPERTIES)
+
 
     def __init__(self):
         super().__init__()
@@ -260,42 +611,72 @@ class GstMultiInputStreamRunner(GstBase.Aggregator):
         # TODO: support input and output buffer formats properties on the pipeline string
 
         self.input_count = 2
+        self._geometries = dict()  # negotiated frame geometry for each sink pad, updated on CAPS events
+        self._output_geometry = None
+        self._stats = None
+        self._profiler = FrameProfiler()
 
 
-    def do_op(self, data):
-        raise NotImplementedError()
+    def set_stats(self, stats):
+        """
+        Record the time spent in do_op as this element's "do_op" metric in the LatencyStats `stats`, or stop if None.
+        """
+        self._stats = stats
 
 
-    def collect_images(self, agg, pad, images):
+    def profile(self, num_frames, path=None):
+        """
+        Profile the next `num_frames` buffers with cProfile and write the stats to `path`, the "profile-path" property
+        if None.
+        """
+        self._profiler.start(num_frames, path)
 
-        width = pad.get_current_caps().get_structure(0).get_int("width")[1]
-        height = pad.get_current_caps().get_structure(0).get_int("height")[1]
 
-        buf = pad.pop_buffer()
-        success, map_info = buf.map(Gst.MapFlags.READ)
+    def do_get_property(self, prop):
+        return get_profile_property(self._profiler, prop)
 
-        img = np.frombuffer(map_info.data, dtype=np.uint8).reshape((width, height, 3))
-        images.append(img)
 
-        buf.unmap(map_info)
+    def do_set_property(self, prop, value):
+        set_profile_property(self._profiler, prop, value)
 
-        return True
 
+    def do_op(self, data):
+        raise NotImplementedError()
 
-    def do_aggregate(self, timeout):
-        images = list()
-        self.foreach_sink_pad(self.collect_images, images)
 
-        # Perform the overlay operation (placing overlay image at top-left corner)
-        # main_image[:128, :128] = overlay_image  # Replace top-left region with overlay
-        result = self.do_op(images)
+    def do_sink_event(self, aggregator_pad, event):
+        if event.type == Gst.EventType.CAPS:
+            self._geometries[aggregator_pad] = get_video_geometry(event.parse_caps())
+        return GstBase.Aggregator.do_sink_event(self, aggregator_pad, event)
 
-        # Create a new buffer for output
-        output_buffer = Gst.Buffer.new_wrapped(result.tobytes())
 
-        # Push the output buffer
-        self.srcpad.push(output_buffer)
-        return Gst.FlowReturn.OK
+    def do_update_src_caps(self, caps):
+        # the output has the size and format of the first input
+        return _src_caps_from_pad(self, self.sinkpads[0] if self.sinkpads else None)
+
+
+    def do_decide_allocation(self, query):
+        return _decide_pooled_allocation(self, query)
+
+
+    def do_aggregate(self, timeout):
+        with self._profiler.frame():
+            pads = list(self.sinkpads)
+            buffers, ret = _pop_buffers(pads)
+            if buffers is None:
+                return ret
+
+            geometries = [self._geometries[pad] for pad in pads]
+
+            try:
+                with map_buffers_to_numpy(buffers, Gst.MapFlags.READ, geometries) as images:
+                    output_buffer = _aggregate_to_pooled_buffer(self, images)
+            except ValueError as e:
+                _AGGREGATOR_LOG.error("Failed to map buffers: %s", e, obj=self)
+                return Gst.FlowReturn.ERROR
+
+            _copy_timestamps(buffers[0], output_buffer)
+            return self.finish_buffer(output_buffer)
 
 
 
@@ -312,63 +693,248 @@ class GstMultiInputStreamRunner2(GstBase.Aggregator):
         ),
     )
 
+    __gproperties__ = dict(PROFILE_PROPERTIES)
+
 
     def __init__(self):
         super(GstMultiInputStreamRunner2, self).__init__()
         self.input_pads = []  # Store requested pads
+        self._geometries = dict()  # negotiated frame geometry for each sink pad, updated on CAPS events
+        self._output_geometry = None
+        self._stats = None
+        self._profiler = FrameProfiler()
 
 
     def do_request_new_pad(self, templ, name, caps=None):
         """Handles dynamic pad creation when requested by the pipeline."""
-        pad = self.request_pad(templ, name)
+        pad = GstBase.Aggregator.do_request_new_pad(self, templ, name, caps)
         if pad:
-            print(f"Created sink pad: {pad.get_name()}")
+            _AGGREGATOR_LOG.debug("Created sink pad: %s", pad.get_name(), obj=self)
             self.input_pads.append(pad)
         else:
-            print(f"Failed to create sink pad: {name}")
+            _AGGREGATOR_LOG.warning("Failed to create sink pad: %s", name, obj=self)
         return pad
 
 
+    def set_stats(self, stats):
+        """
+        Record the time spent in do_op as this element's "do_op" metric in the LatencyStats `stats`, or stop if None.
+        """
+        self._stats = stats
+
+
+    def profile(self, num_frames, path=None):
+        """
+        Profile the next `num_frames` buffers with cProfile and write the stats to `path`, the "profile-path" property
+        if None.
+        """
+        self._profiler.start(num_frames, path)
+
+
+    def do_get_property(self, prop):
+        return get_profile_property(self._profiler, prop)
+
+
+    def do_set_property(self, prop, value):
+        set_profile_property(self._profiler, prop, value)
+
+
     def do_op(self, images):
         """Process images and return output image"""
         raise NotImplementedError()
 
 
-    def do_aggregate(self):
-        buffers = []
-        map_infos = []
-        images = []
+    def do_sink_event(self, aggregator_pad, event):
+        if event.type == Gst.EventType.CAPS:
+            self._geometries[aggregator_pad] = get_video_geometry(event.parse_caps())
+        return GstBase.Aggregator.do_sink_event(self, aggregator_pad, event)
 
-        for pad in self.input_pads:
-            aggregator_pad = GstBase.AggregatorPad.get_from_pad(pad)
-            buffer = aggregator_pad.peek_buffer()
-            if not buffer:
-                return Gst.FlowReturn.ERROR
 
-            success, map_info = buffer.map(Gst.MapFlags.READ)
-            if not success:
+    def do_update_src_caps(self, caps):
+        # the output has the size and format of the first input
+        return _src_caps_from_pad(self, self.input_pads[0] if self.input_pads else None)
+
+
+    def do_decide_allocation(self, query):
+        return _decide_pooled_allocation(self, query)
+
+
+    def do_aggregate(self, timeout):
+        with self._profiler.frame():
+            buffers, ret = _pop_buffers(self.input_pads)
+            if buffers is None:
+                return ret
+
+            geometries = [self._geometries[pad] for pad in self.input_pads]
+
+            try:
+                with map_buffers_to_numpy(buffers, Gst.MapFlags.READ, geometries) as images:
+                    # Perform operation on images, writing the result into a pooled buffer
+                    output_buffer = _aggregate_to_pooled_buffer(self, images)
+            except ValueError as e:
+                _AGGREGATOR_LOG.error("Failed to map buffers: %s", e, obj=self)
                 return Gst.FlowReturn.ERROR
 
-            buffers.append(buffer)
-            map_infos.append(map_info)
+            _copy_timestamps(buffers[0], output_buffer)
+            return self.finish_buffer(output_buffer)
 
-            width = pad.get_current_caps().get_structure(0).get_int("width")[1]
-            height = pad.get_current_caps().get_structure(0).get_int("height")[1]
-            np_input = np.frombuffer(map_info.data, dtype=np.uint8).reshape((height, width, 3))
-            images.append(np_input)
 
-        # Perform operation on images
-        result = self.do_op(images)
 
-        for buffer, map_info in zip(buffers, map_infos):
-            buffer.unmap(map_info)
+def _parse_colors(value):
+    return [tuple(int(c) for c in color.split(",")) for color in value.split(";") if color.strip()]
 
-        # Create a new buffer
-        output_buffer = Gst.Buffer.new_allocate(None, result.nbytes, None)
-        output_buffer.fill(0, result.tobytes())
 
-        # Push the buffer to the src pad
-        return self.finish_buffer(output_buffer)
+
+class GstOverlayStreamRunner(GstMultiInputStreamRunner2):
+    """
+    Composites label masks onto video frames with a LabelOverlay, eg. to show the segmentation of a model next to its
+    input. The "sink_0" pad receives the video and "sink_1" the mask, given as GRAY8 or GRAY16 frames of any size which
+    are upscaled to the size of the video with nearest neighbour interpolation. Each video frame is paired with the
+    newest mask whose timestamp isn't after the frame's, dropping older masks, so masks stay on their frames when the
+    mask branch drops or delays buffers. The last mask is reused while none is newer, eg. once the mask stream has
+    ended or a live pipeline times out waiting for one, and masks are taken in order if the video has no timestamps.
+    The output has the caps and timestamps of the video, which is copied into the output buffer and blended in place.
+
+    The "opacity" property sets the opacity of the overlay, and "colors" the colours of labels 1 onwards as ";"
+    separated "r,g,b" or "r,g,b,a" entries, eg. "255,0,0;0,255,0,128", or the default palette if empty.
+    """
+
+    __gstmetadata__ = ('OverlayStreamRunner', 'Filter', 'Blends label masks onto video frames', 'MONAI')
+
+    __gsttemplates__ = (
+        Gst.PadTemplate.new(
+            "sink_%u", Gst.PadDirection.SINK, Gst.PadPresence.REQUEST,
+            Gst.Caps.from_string(f"video/x-raw,format={BYTE_FORMATS}"),
+        ),
+        Gst.PadTemplate.new(
+            "src", Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS,
+            Gst.Caps.from_string(f"video/x-raw,format={OVERLAY_FORMATS}"),
+        ),
+    )
+
+    __gproperties__ = {
+        **PROFILE_PROPERTIES,
+        "opacity": (float, "Opacity", "Opacity of the overlay", 0.0, 1.0, 0.5, GObject.ParamFlags.READWRITE),
+        "colors": (str, "Colors", "Semicolon separated colours of labels 1 onwards", "", GObject.ParamFlags.READWRITE),
+    }
+
+
+    def __init__(self):
+        super(GstOverlayStreamRunner, self).__init__()
+        self.overlay = LabelOverlay()
+        self._colors = ""
+        self._last_mask = None
+
+
+    def do_get_property(self, prop):
+        if prop.name == "opacity":
+            return self.overlay.opacity
+        if prop.name == "colors":
+            return self._colors
+        return GstMultiInputStreamRunner2.do_get_property(self, prop)
+
+
+    def do_set_property(self, prop, value):
+        if prop.name == "opacity":
+            self.overlay.opacity = value
+        elif prop.name == "colors":
+            self.overlay.colors = _parse_colors(value) or DEFAULT_LABEL_COLORS
+            self._colors = value
+        else:
+            GstMultiInputStreamRunner2.do_set_property(self, prop, value)
+
+
+    def _pads(self):
+        """
+        Get the video and mask pads, either of which is None if it hasn't been requested.
+        """
+        pads = {p.get_name(): p for p in self.input_pads}
+        return pads.get("sink_0"), pads.get("sink_1")
+
+
+    def do_sink_event(self, aggregator_pad, event):
+        if event.type == Gst.EventType.CAPS and aggregator_pad.get_name() == "sink_0":
+            cformat = event.parse_caps().get_structure(0).get_value("format")
+            self.overlay.channels = get_color_channels(cformat)
+        elif event.type == Gst.EventType.FLUSH_STOP:
+            self._last_mask = None
+        return GstMultiInputStreamRunner2.do_sink_event(self, aggregator_pad, event)
+
+
+    def do_update_src_caps(self, caps):
+        # the output is the video with the overlay blended in
+        video_pad, _ = self._pads()
+        return _src_caps_from_pad(self, video_pad)
+
+
+    def do_aggregate(self, timeout):
+        with self._profiler.frame():
+            video_pad, mask_pad = self._pads()
+            if video_pad is None or mask_pad is None:
+                _AGGREGATOR_LOG.error("Both the video and mask pads must be linked", obj=self)
+                return Gst.FlowReturn.NOT_LINKED
+
+            video = video_pad.peek_buffer()
+            if video is None:
+                # the video has ended, or no frame arrived before the timeout of a live pipeline
+                return Gst.FlowReturn.EOS if video_pad.is_eos() else Gst.FlowReturn.OK
+
+            if not self._match_mask(mask_pad, video.pts, timeout):
+                return Gst.FlowReturn.OK  # called again once the mask for this frame arrives
+
+            video_pad.drop_buffer()
+            mask = self._last_mask
+
+            buffers = [video] if mask is None else [video, mask]
+            geometries = [self._geometries[video_pad]] + ([] if mask is None else [self._geometries[mask_pad]])
+
+            try:
+                with map_buffers_to_numpy(buffers, Gst.MapFlags.READ, geometries) as images:
+                    output_buffer = _aggregate_to_pooled_buffer(self, images)
+            except ValueError as e:
+                _AGGREGATOR_LOG.error("Failed to map buffers: %s", e, obj=self)
+                return Gst.FlowReturn.ERROR
+
+            _copy_timestamps(video, output_buffer)
+            return self.finish_buffer(output_buffer)
+
+
+    def _match_mask(self, mask_pad, pts, timeout):
+        """
+        Take the masks queued on the mask pad up to the video frame at `pts` into `_last_mask`, keeping the newest,
+        which is the one to blend onto the frame. Returns False if the frame's mask may still arrive, so the caller
+        should wait for it rather than reuse the last mask.
+        """
+        if pts == Gst.CLOCK_TIME_NONE:
+            mask = mask_pad.pop_buffer()
+            if mask is not None:
+                self._last_mask = mask
+            return True
+
+        while True:
+            mask = mask_pad.peek_buffer()
+            if mask is None:
+                matched = self._last_mask is not None and self._last_mask.pts == pts
+                return matched or timeout or mask_pad.is_eos()
+            if mask.pts != Gst.CLOCK_TIME_NONE and mask.pts > pts:
+                return True  # the mask is for a later frame, so the last one is reused
+
+            mask_pad.drop_buffer()
+            self._last_mask = mask
+            if mask.pts == Gst.CLOCK_TIME_NONE:
+                return True  # masks without timestamps are taken in order
+
+
+    def do_op(self, images, output=None):
+        """
+        Blend the mask, if one has been received, onto a copy of the video frame in `output`.
+        """
+        frame, masks = images[0], images[1:]
+        if output is None:
+            output = np.array(frame)
+        else:
+            np.copyto(output, frame)
+        return self.overlay(output, masks[0]) if masks else output
 
 
 
@@ -393,15 +959,15 @@ class GstMultiInputStreamRunner3(GstBase.Aggregator):
 
     def do_start(self):
         """Ensure pads are created when the element starts."""
-        print("Initializing GstMultiInputStreamRunner, creating sink pads...")
+        _AGGREGATOR_LOG.debug("Initializing GstMultiInputStreamRunner, creating sink pads...", obj=self)
         for i in range(2):  # Ensure two sink pads exist
             pad = self.request_pad(self.get_pad_template("sink_%u"), f"sink_{i}")
             if pad:
-                print(f"Created sink pad: {pad.get_name()}")
+                _AGGREGATOR_LOG.debug("Created sink pad: %s", pad.get_name(), obj=self)
                 pad.set_active(True)  # Ensure pad is active
                 self.input_pads.append(pad)
             else:
-                print(f"Failed to create sink pad {i}")
+                _AGGREGATOR_LOG.warning("Failed to create sink pad %d", i, obj=self)
                 return False
 
 
@@ -559,7 +1125,7 @@ class GstMultiInOutStreamRunnerPrototype2(Gst.Element):
 
     def do_chain(self, pad, parent, buffer):
 
-        print("do_chain")
+        _PROTOTYPE_LOG.log_interval(1.0, LOG, "do_chain", obj=self)
         if pad == self.sinkpad_1:
             self.buffer_1 = buffer
         elif pad == self.sinkpad_2:
@@ -631,7 +1197,7 @@ class GstMultiInOutStreamRunnerPrototype3(Gst.Element):
 
     def chain_0(self, pad, parent, buffer):
         with self._lock:
-            print(f"chain_0 called on thread {threading.get_ident()}")
+            _PROTOTYPE_LOG.log_interval(1.0, LOG, "chain_0 called on thread %d", threading.get_ident(), obj=self)
             self.buffer_0 = buffer
             if self.buffer_1:
                 self.process_buffers()
@@ -640,7 +1206,7 @@ class GstMultiInOutStreamRunnerPrototype3(Gst.Element):
 
     def chain_1(self, pad, parent, buffer):
         with self._lock:
-            print(f"chain_1 called on thread {threading.get_ident()}")
+            _PROTOTYPE_LOG.log_interval(1.0, LOG, "chain_1 called on thread %d", threading.get_ident(), obj=self)
             self.buffer_1 = buffer
             if self.buffer_0:
                 self.process_buffers()
@@ -648,41 +1214,33 @@ class GstMultiInOutStreamRunnerPrototype3(Gst.Element):
 
 
     def process_buffers(self):
-        print("=================================")
-        print(f"process_buffers called on thread {threading.get_ident()}")
+        _PROTOTYPE_LOG.log_interval(1.0, LOG, "process_buffers called on thread %d", threading.get_ident(), obj=self)
         # Process and push to both source pads
 
         if self.buffer_0 and self.buffer_1:
             buffers = (self.buffer_0, self.buffer_1)
 
 
-            frames = list()
-            # for sinkpad in (self.sinkpad_0, self.sinkpad_1):
-            for sinkpad, buffer in ((self.sinkpad_0, self.buffer_0), (self.sinkpad_1, self.buffer_1)):
-                # Extract data from buffer
-                success, map_info = buffer.map(Gst.MapFlags.READ)
-                if not success:
-                    print("Unexpected failure!")
-                    return Gst.FlowReturn.ERROR
+            caps = (self.sinkpad_0.get_current_caps(), self.sinkpad_1.get_current_caps())
 
-                caps = sinkpad.get_current_caps().get_structure(0)
-                # print("caps:", caps)
-                height, width, channels = caps.get_value("height"), caps.get_value("width"), caps.get_value("channels")
-                # print("data:", len(map_info.data))
-                frame = np.frombuffer(map_info.data, dtype=np.uint8).reshape((height, width, 3))
-                frames.append(frame)
-                buffer.unmap(map_info)
+            # keep the buffers mapped until the outputs are pushed so that the frames remain valid throughout
+            with ExitStack() as stack:
+                try:
+                    frames = stack.enter_context(map_buffers_to_numpy(buffers, Gst.MapFlags.READ, caps))
+                except ValueError as e:
+                    _PROTOTYPE_LOG.error("Failed to map buffers: %s", e, obj=self)
+                    return Gst.FlowReturn.ERROR
 
-            self._do_op(frames)
+                self._do_op(frames)
 
-            dframe = np.array(frames[0])
+                dframe = np.array(frames[0])
 
-            dbuffer0 = Gst.Buffer.new_wrapped(dframe.tobytes())
-            dbuffer1 = Gst.Buffer.new_wrapped(dframe.tobytes())
+                dbuffer0 = Gst.Buffer.new_wrapped(dframe.tobytes())
+                dbuffer1 = Gst.Buffer.new_wrapped(dframe.tobytes())
 
-            # Push buffers downstream
-            self.srcpad_0.push(dbuffer0)
-            self.srcpad_1.push(dbuffer1)
+                # Push buffers downstream
+                self.srcpad_0.push(dbuffer0)
+                self.srcpad_1.push(dbuffer1)
 
         return Gst.FlowReturn.OK
 
@@ -694,7 +1252,7 @@ class GstMultiInOutStreamRunnerPrototype3(Gst.Element):
         When used as a plugin for gstreamer, do_op should be subclassed to carry out the intended
         operation.
         """
-        print("doing op")
+        _PROTOTYPE_LOG.log_interval(1.0, LOG, "doing op", obj=self)
         if self._do_op is None:
             raise ValueError("do_op not set")
         self._do_op(sink_data)
@@ -0,0 +1,102 @@
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+from monaistream.streamrunners.debug import get_logger
+
+_LOG = get_logger("monaistream-profiling", "MONAI Stream frame profiling")
+_NOT_PROFILING = nullcontext()  # shared by every frame handled while profiling isn't active
+
+
+
+class FrameProfiler:
+    """
+    Profiles the next `num_frames` frames with cProfile when started, then writes the stats to `path` where they can be
+    read with `pstats` or a viewer like snakeviz. Runners wrap the handling of each frame in `frame()`, which costs
+    only an attribute check while profiling isn't active, so this can be left in production pipelines and started on
+    demand. Only one thread is profiled at a time; frames handled by other threads at the same time aren't profiled
+    or counted.
+    """
+
+    def __init__(self, path="streamrunner.prof"):
+        self.path = path
+        self._profile = None
+        self._remaining = 0
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+
+    @property
+    def remaining(self):
+        """
+        The number of frames still to be profiled, 0 if profiling isn't active.
+        """
+        return self._remaining
+
+
+    def start(self, num_frames, path=None):
+        """
+        Profile the next `num_frames` frames and write the stats to `path`, or the current path if None. Restarts
+        profiling, discarding anything collected so far, if it's already active.
+        """
+        if num_frames < 1:
+            raise ValueError(f"num_frames must be at least 1, got {num_frames}")
+
+        with self._lock:
+            if path is not None:
+                self.path = path
+            self._remaining = num_frames
+            self._profile = cProfile.Profile()
+
+
+    def stop(self):
+        """
+        Stop profiling early, writing the stats collected so far.
+        """
+        with self._busy, self._lock:  # wait for a frame being profiled to finish
+            self._finish(self._profile)
+
+
+    def frame(self):
+        """
+        Get the context manager to handle a frame in, profiling it if profiling is active.
+        """
+        profile = self._profile
+        if profile is None:
+            return _NOT_PROFILING
+        return self._profile_frame(profile)
+
+
+    @contextmanager
+    def _profile_frame(self, profile):
+        if not self._busy.acquire(blocking=False):
+            yield
+            return
+
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+        finally:
+            self._busy.release()
+
+        with self._lock:
+            if profile is self._profile:
+                self._remaining -= 1
+                if self._remaining <= 0:
+                    self._finish(profile)
+
+
+    def _finish(self, profile):
+        if profile is not None:
+            self._profile = None
+            self._remaining = 0
+            profile.dump_stats(self.path)
+            _LOG.info("Wrote profile stats to %s", self.path)
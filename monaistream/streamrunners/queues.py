@@ -0,0 +1,378 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from queue import Empty
+
+from monaistream.streamrunners.workers import WORKER_KINDS, OrderedWorkerPool
+
+
+
+@dataclass(frozen=True)
+class QueuePolicy:
+    """
+    Describes how frames arriving at a runner are queued and grouped before being passed to do_op.
+
+    Args:
+        mode: how frame sets are queued between the inputs and do_op, either None to call do_op directly in the
+            streaming thread, or one of the names in `FRAME_QUEUES` to queue frame sets for a separate thread calling
+            do_op: "blocking" blocks the inputs while the queue is full, "drop-oldest" and "drop-newest" discard the
+            oldest queued or newly arrived frame set when full, and "latest-only" keeps only the newest frame set; if
+            `workers` is given and this is None a "blocking" queue is used
+        capacity: the number of frame sets the queue holds, ignored for "latest-only" which always holds one
+        max_batch_size: the number of frame sets passed to do_op at once as a stacked array, batching is disabled if 1
+        max_wait_ms: the longest time the first frame set of an incomplete batch waits for the batch to fill before it
+            is passed on anyway, or None to wait until the batch is full or the stream ends
+        sync_tolerance_ms: if given, frame sets are formed by pairing buffers across inputs whose timestamps are within
+            this tolerance, with each buffer used at most once; if None a frame set is formed from the latest buffer of
+            every input each time any input receives a buffer
+        sync_max_age_ms: how long an unmatched buffer is kept waiting for partners, relative to the newest buffer from
+            the same input, before it is dropped
+        workers: if above 0, do_op is called asynchronously on this many workers so that several frame sets can be
+            processed at once, with the results still pushed in the order the frame sets arrived
+        worker_kind: whether the workers are "thread"s or "process"es, with processes do_op must be picklable
+        max_in_flight: the number of frame sets, or batches if batching, being processed or waiting to be pushed at
+            once, beyond which frame sets wait in the queue; defaults to twice the number of workers
+    """
+
+    mode: str | None = None
+    capacity: int = 4
+    max_batch_size: int = 1
+    max_wait_ms: float | None = None
+    sync_tolerance_ms: float | None = None
+    sync_max_age_ms: float = 1000.0
+    workers: int = 0
+    worker_kind: str = "thread"
+    max_in_flight: int | None = None
+
+    def __post_init__(self):
+        if self.mode is not None and self.mode not in FRAME_QUEUES:
+            raise ValueError(f"unknown queue mode {self.mode}; must be None or one of {tuple(FRAME_QUEUES)}")
+        if self.capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {self.capacity}")
+        if self.max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {self.max_batch_size}")
+        if self.max_wait_ms is not None and self.max_wait_ms < 0:
+            raise ValueError(f"max_wait_ms must be non-negative, got {self.max_wait_ms}")
+        if self.sync_tolerance_ms is not None and self.sync_tolerance_ms < 0:
+            raise ValueError(f"sync_tolerance_ms must be non-negative, got {self.sync_tolerance_ms}")
+        if self.workers < 0:
+            raise ValueError(f"workers must be non-negative, got {self.workers}")
+        if self.worker_kind not in WORKER_KINDS:
+            raise ValueError(f"unknown worker kind {self.worker_kind}; must be one of {tuple(WORKER_KINDS)}")
+        if self.max_in_flight is not None and self.max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {self.max_in_flight}")
+
+    @property
+    def batching(self):
+        return self.max_batch_size > 1
+
+
+    @property
+    def asynchronous(self):
+        return self.workers > 0
+
+
+    def create_queue(self):
+        """
+        Create the FrameQueue for this policy, or return None if frame sets aren't queued.
+        """
+        mode = self.mode or ("blocking" if self.asynchronous else None)
+        if mode is None:
+            return None
+        return FRAME_QUEUES[mode](self.capacity)
+
+
+    def create_pool(self, on_result):
+        """
+        Create the OrderedWorkerPool for this policy passing results to `on_result`, or return None if do_op is called
+        synchronously.
+        """
+        if not self.asynchronous:
+            return None
+        return OrderedWorkerPool(on_result, self.workers, self.worker_kind, self.max_in_flight)
+
+
+    def create_matcher(self, num_inputs):
+        """
+        Create the TimestampMatcher for this policy, or return None if buffers aren't matched by timestamp.
+        """
+        if self.sync_tolerance_ms is None:
+            return None
+        return TimestampMatcher(num_inputs, int(self.sync_tolerance_ms * 1e6), int(self.sync_max_age_ms * 1e6))
+
+
+
+class FrameSet(list):
+    """
+    A list of buffers, one per input, that are processed together, with the `time.perf_counter` time it was formed at
+    so that the time it spends queued can be measured.
+    """
+
+    def __init__(self, items=(), created=None):
+        super().__init__(items)
+        self.created = time.perf_counter() if created is None else created
+
+
+
+class FrameBatcher:
+    """
+    Collects items into batches of up to `max_batch_size` items. A batch is complete when it is full or, if
+    `max_wait_ms` is given, when its first item has waited that long. This isn't thread safe, callers are expected to
+    hold their own lock when using it.
+    """
+
+    def __init__(self, max_batch_size, max_wait_ms=None, clock=time.monotonic):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._clock = clock
+        self._items = list()
+        self._first_time = None
+
+
+    def __len__(self):
+        return len(self._items)
+
+
+    @property
+    def deadline(self):
+        """
+        The time by which the current batch should be passed on, or None if there is no batch or no time limit.
+        """
+        if self._first_time is None or self.max_wait_ms is None:
+            return None
+        return self._first_time + self.max_wait_ms / 1000
+
+
+    def add(self, item):
+        """
+        Add an item to the current batch, returning the batch if this completes it or None otherwise.
+        """
+        if not self._items:
+            self._first_time = self._clock()
+
+        self._items.append(item)
+
+        if len(self._items) >= self.max_batch_size or self.expired():
+            return self.take()
+        return None
+
+
+    def expired(self):
+        deadline = self.deadline
+        return deadline is not None and self._clock() >= deadline
+
+
+    def take(self):
+        """
+        Remove and return the items of the current batch, which may be empty.
+        """
+        items = self._items
+        self._items = list()
+        self._first_time = None
+        return items
+
+
+
+class TimestampMatcher:
+    """
+    Forms sets of items, one from each input, whose timestamps are all within `tolerance` of each other. Timestamps
+    from each input are expected to increase, so once an input's oldest waiting item is more than `tolerance` older
+    than another input's oldest waiting item it can never be matched and is dropped. Items waiting for partners from
+    a stalled input are dropped once they are more than `max_age` older than the newest item from their own input.
+    Each item is used in at most one set. This isn't thread safe, callers are expected to hold their own lock.
+    """
+
+    def __init__(self, num_inputs, tolerance, max_age):
+        self.tolerance = tolerance
+        self.max_age = max_age
+        self.matched = 0
+        self.dropped = 0
+        self._pending = [deque() for _ in range(num_inputs)]
+
+
+    def add(self, index, timestamp, item):
+        """
+        Add an item with the given timestamp from the given input, returning the list of sets matched as a result, each
+        set being a list of items in input order.
+        """
+        pending = self._pending[index]
+        pending.append((timestamp, item))
+
+        while pending[0][0] < timestamp - self.max_age:
+            pending.popleft()
+            self.dropped += 1
+
+        matches = list()
+        while all(self._pending):
+            heads = [p[0][0] for p in self._pending]
+            newest = max(heads)
+
+            if newest - min(heads) <= self.tolerance:
+                matches.append([p.popleft()[1] for p in self._pending])
+                self.matched += 1
+            else:
+                # discard items too old to match the newest of the other inputs' oldest items
+                for p in self._pending:
+                    while p and p[0][0] < newest - self.tolerance:
+                        p.popleft()
+                        self.dropped += 1
+
+        return matches
+
+
+    def clear(self):
+        for p in self._pending:
+            p.clear()
+
+
+
+class FrameQueue:
+    """
+    A bounded thread-safe FIFO of items such as frame sets waiting to be processed. What happens when an item is put
+    into a full queue is decided by subclasses, and the number of items discarded by doing so is kept in `dropped`.
+    Like `queue.Queue`, consumers call `task_done` for each item they get and `join` waits for all accepted items to be
+    processed. Closing the queue wakes any waiting producers and consumers.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self._closed = False
+
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+    def put(self, item, timeout=None):
+        """
+        Put an item into the queue, returning True if it was accepted and False if it was discarded.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+
+            if len(self._items) >= self.capacity and not self._make_room(timeout):
+                self.dropped += 1
+                return False
+            if self._closed:  # closed while waiting for room
+                return False
+
+            self._items.append(item)
+            self._unfinished += 1
+            self._cond.notify_all()
+            return True
+
+
+    def get(self, timeout=None):
+        """
+        Get the oldest item, waiting for one if the queue is empty. Returns None if the queue is closed and empty, and
+        raises `queue.Empty` if no item arrives within `timeout` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                raise Empty()
+            if not self._items:
+                return None
+
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+
+    def task_done(self):
+        with self._cond:
+            self._finish(1)
+
+
+    def join(self, timeout=None):
+        """
+        Wait until every accepted item has been processed or discarded, returning False if this times out.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._unfinished == 0 or self._closed, timeout)
+
+
+    def clear(self):
+        """
+        Discard all queued items without counting them as dropped, eg. when flushing.
+        """
+        with self._cond:
+            self._finish(len(self._items))
+            self._items.clear()
+
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+    def _finish(self, count):
+        self._unfinished -= count
+        self._cond.notify_all()
+
+
+    def _make_room(self, timeout):
+        """
+        Called with the lock held when putting into a full queue, returns True if there is now room for the new item.
+        """
+        raise NotImplementedError()
+
+
+
+class BlockingFrameQueue(FrameQueue):
+    """
+    Blocks producers while the queue is full, so slow processing applies backpressure to the inputs. An item is only
+    dropped if there is still no room after `timeout` seconds.
+    """
+
+    def _make_room(self, timeout):
+        return self._cond.wait_for(lambda: len(self._items) < self.capacity or self._closed, timeout)
+
+
+
+class DropOldestFrameQueue(FrameQueue):
+    """
+    Discards the oldest queued item to make room for a new one, so processing falls behind by at most `capacity` items.
+    """
+
+    def _make_room(self, timeout):
+        self._items.popleft()
+        self._finish(1)
+        self.dropped += 1
+        return True
+
+
+
+class DropNewestFrameQueue(FrameQueue):
+    """
+    Discards new items while the queue is full.
+    """
+
+    def _make_room(self, timeout):
+        return False
+
+
+
+class LatestFrameQueue(DropOldestFrameQueue):
+    """
+    Keeps only the newest item so that processing always uses the most recent frame set.
+    """
+
+    def __init__(self, capacity=1):
+        super().__init__(1)
+
+
+
+FRAME_QUEUES = {
+    "blocking": BlockingFrameQueue,
+    "drop-oldest": DropOldestFrameQueue,
+    "drop-newest": DropNewestFrameQueue,
+    "latest-only": LatestFrameQueue,
+}
@@ -0,0 +1,177 @@
+import numpy as np
+
+
+
+CHANGE_METHODS = ("mad", "hash")
+
+_DEFAULT_THRESHOLDS = {"mad": 2.0, "hash": 2}
+
+
+
+def _average_hash(frame, hash_size):
+    """
+    Get the average hash of a (H, W) or (H, W, C) frame as a flat boolean array of `hash_size` squared bits, which are
+    set where the mean of the corresponding block of the grayscale frame is above the mean of the whole frame.
+    """
+    gray = frame.mean(axis=2, dtype=np.float32) if frame.ndim == 3 else frame.astype(np.float32)
+    rows = np.linspace(0, gray.shape[0], min(hash_size, gray.shape[0]), endpoint=False).astype(np.intp)
+    cols = np.linspace(0, gray.shape[1], min(hash_size, gray.shape[1]), endpoint=False).astype(np.intp)
+
+    sums = np.add.reduceat(np.add.reduceat(gray, rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(rows, append=gray.shape[0]), np.diff(cols, append=gray.shape[1]))
+    blocks = sums / counts
+    return (blocks > blocks.mean()).ravel()
+
+
+
+class ChangeDetector:
+    """
+    Decides whether frames have changed enough since the last processed frame for do_op to be worth running, so that
+    runners can reuse the previous output for static stretches of video such as a paused ultrasound or a frozen
+    endoscope. Frames are compared by a signature computed from every `step`th pixel in each direction:
+
+     - "mad": the mean absolute difference of the sampled pixels, in pixel values.
+     - "hash": the number of differing bits between average hashes of `hash_size` x `hash_size` blocks, which
+       ignores noise and small changes in brightness.
+
+    A frame set has changed if any of its frames differ from the corresponding reference frame by more than
+    `threshold`, in which case its frames become the new references. After `max_skip` consecutive unchanged frame
+    sets one is processed anyway, so slow drifts still reach do_op. `processed` and `skipped` count the decisions.
+    """
+
+    def __init__(self, threshold=None, method="mad", step=8, hash_size=8, max_skip=None):
+        if method not in CHANGE_METHODS:
+            raise ValueError(f"method must be one of {CHANGE_METHODS}, got {method}")
+
+        self.threshold = _DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        self.method = method
+        self.step = step
+        self.hash_size = hash_size
+        self.max_skip = max_skip
+        self.processed = 0
+        self.skipped = 0
+        self._references = None
+        self._consecutive = 0
+
+
+    def reset(self):
+        """
+        Forget the reference frames so that the next frame set is processed, eg. after a flush.
+        """
+        self._references = None
+        self._consecutive = 0
+
+
+    def changed(self, frames, force=False):
+        """
+        Return True if the list of (H, W) or (H, W, C) numpy arrays `frames` should be processed, either because they
+        have changed or `force` is set, or False if the previous output can be reused.
+        """
+        signatures = [self._signature(f) for f in frames]
+
+        if force or self._differs(signatures) or (self.max_skip is not None and self._consecutive >= self.max_skip):
+            self._references = signatures
+            self._consecutive = 0
+            self.processed += 1
+            return True
+
+        self._consecutive += 1
+        self.skipped += 1
+        return False
+
+
+    def _signature(self, frame):
+        sampled = frame[::self.step, ::self.step]
+        if self.method == "hash":
+            return _average_hash(sampled, self.hash_size)
+        return sampled.astype(np.float32)  # so that differences of unsigned frames don't wrap
+
+
+    def _differs(self, signatures):
+        references = self._references
+        if references is None or len(references) != len(signatures):
+            return True
+
+        for signature, reference in zip(signatures, references):
+            if signature.shape != reference.shape:
+                return True
+            if self.method == "hash":
+                distance = np.count_nonzero(signature != reference)
+            else:
+                distance = np.abs(signature - reference).mean()
+            if distance > self.threshold:
+                return True
+
+        return False
+
+
+
+class QosController:
+    """
+    Decides which frames a runner processes when do_op can't keep up with the live framerate. The load is the QoS
+    proportion reported by downstream, or while downstream reports buffers arriving late, the larger of that and the
+    average processing time relative to the frame duration, both smoothed with an exponential moving average of weight
+    `smoothing`. Slow processing alone therefore never skips frames, eg. in pipelines reading files or with sinks that
+    don't sync to the clock. At a load of L above 1 only a fraction 1/L of the frames is processed, spread evenly, so
+    that the stream stays real-time. `processed` and `skipped` count the decisions.
+    """
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.reset()
+
+
+    def reset(self):
+        self.average_time = None
+        self.proportion = 1.0
+        self.late = False
+        self.processed = 0
+        self.skipped = 0
+        self._credit = 1.0  # so the first frame once overloaded is processed
+
+
+    def record(self, duration):
+        """
+        Record the time in seconds processing a frame took.
+        """
+        if self.average_time is None:
+            self.average_time = duration
+        else:
+            self.average_time += self.smoothing * (duration - self.average_time)
+
+
+    def update_proportion(self, proportion, jitter=None):
+        """
+        Record the proportion and jitter from a QoS event, the proportion being above 1 and the jitter positive if
+        downstream receives buffers late. Lateness is judged from the proportion if the jitter isn't given.
+        """
+        self.proportion += self.smoothing * (proportion - self.proportion)
+        self.late = jitter > 0 if jitter is not None else proportion > 1.0
+
+
+    def load(self, frame_duration=None):
+        """
+        Get the current load for frames lasting `frame_duration` seconds, or from the QoS proportion alone if None or
+        downstream isn't receiving buffers late.
+        """
+        if self.late and frame_duration and self.average_time is not None:
+            return max(self.proportion, self.average_time / frame_duration)
+        return self.proportion
+
+
+    def should_process(self, frame_duration=None):
+        """
+        Return True if the next frame, lasting `frame_duration` seconds if known, should be processed.
+        """
+        load = self.load(frame_duration)
+        if load <= 1.0:
+            self._credit = 1.0
+        else:
+            process = self._credit >= 1.0
+            self._credit += 1.0 / load - process
+            if not process:
+                self.skipped += 1
+                return False
+
+        self.processed += 1
+        return True
@@ -0,0 +1,193 @@
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+
+
+def _default_bounds():
+    # 10us to about 84s doubling each bucket, which covers everything from a pad push to a stalled model
+    return tuple(1e-5 * 2**i for i in range(24))
+
+
+
+class LatencyHistogram:
+    """
+    A thread-safe histogram of durations in seconds, with buckets bounded by `bounds` and a final bucket for anything
+    longer. The exact count, sum, minimum and maximum are kept alongside the buckets, while percentiles are estimated
+    as the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds) if bounds is not None else _default_bounds()
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.min = math.inf
+            self.max = 0.0
+
+
+    def record(self, duration):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, duration)] += 1
+            self.count += 1
+            self.total += duration
+            self.min = min(self.min, duration)
+            self.max = max(self.max, duration)
+
+
+    def percentile(self, q):
+        """
+        Estimate the `q`th percentile (0 to 100) as the upper bound of its bucket, clamped to the maximum seen.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+
+            rank = math.ceil(q / 100 * self.count)
+            seen = 0
+            for bound, count in zip(self.bounds + (self.max,), self._counts):
+                seen += count
+                if seen >= rank:
+                    return min(bound, self.max)
+            return self.max
+
+
+    def to_dict(self):
+        """
+        Get the histogram as a JSON compatible dictionary with durations in milliseconds.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count, total, minimum, maximum = self.count, self.total, self.min, self.max
+
+        return {
+            "count": count,
+            "mean_ms": total / count * 1000 if count else None,
+            "min_ms": minimum * 1000 if count else None,
+            "max_ms": maximum * 1000 if count else None,
+            "p50_ms": _to_ms(self.percentile(50)),
+            "p90_ms": _to_ms(self.percentile(90)),
+            "p99_ms": _to_ms(self.percentile(99)),
+            "buckets_ms": [b * 1000 for b in self.bounds],
+            "counts": counts,
+        }
+
+
+
+def _to_ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+
+class LatencyStats:
+    """
+    A registry of latency histograms keyed by element name and metric name. Runners record the metrics "queue" for
+    the time frames wait before processing, "do_op" for the time in do_op, and "push" for the time taken to push
+    results downstream, while pad probes record "pad:<name>" for the time from a buffer entering an element to it
+    leaving through that src pad.
+    """
+
+    def __init__(self, bounds=None):
+        self.bounds = bounds
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+
+    def histogram(self, element, metric):
+        """
+        Get the histogram for the given element and metric, creating it if necessary.
+        """
+        key = (element, metric)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram(self.bounds))
+        return histogram
+
+
+    def record(self, element, metric, duration):
+        self.histogram(element, metric).record(duration)
+
+
+    def snapshot(self):
+        """
+        Get all histograms as a JSON compatible dictionary of the form {element: {metric: histogram}}.
+        """
+        with self._lock:
+            items = sorted(self._histograms.items())
+
+        result = dict()
+        for (element, metric), histogram in items:
+            result.setdefault(element, dict())[metric] = histogram.to_dict()
+        return result
+
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+
+DEFAULT_STATS = LatencyStats()
+
+
+
+class StatsDumper:
+    """
+    Periodically writes a snapshot of `stats` as JSON to `path` from a background thread, so that it can be read by a
+    local scraper. The file is replaced atomically so readers never see a partial write.
+    """
+
+    def __init__(self, path, stats=DEFAULT_STATS, interval=5.0):
+        self.path = path
+        self.stats = stats
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        """
+        Stop the background thread, writing one final snapshot.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+    def dump(self):
+        snapshot = {"time": time.time(), "elements": self.stats.snapshot()}
+
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".stats", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+        self.dump()
@@ -1,12 +1,25 @@
 from dataclasses import dataclass
 
+from monaistream.streamrunners.debug import get_logger
 from monaistream.streamrunners.gstreamer.backend import GstStreamRunnerBackend
+from monaistream.streamrunners.queues import QueuePolicy
+
+_LOG = get_logger("monaistream-runner", "MONAI Stream runners")
 
 
 
 def parse_queue_policy(policy):
-    # TODO: support queuing policies
-    return lambda q: q
+    """
+    Get a QueuePolicy from the given policy, which can be None for the default policy, a QueuePolicy, or a dictionary
+    of QueuePolicy arguments.
+    """
+    if policy is None:
+        return QueuePolicy()
+    if isinstance(policy, QueuePolicy):
+        return policy
+    if isinstance(policy, dict):
+        return QueuePolicy(**policy)
+    raise ValueError(f"unknown queue policy {policy}; must be None, a QueuePolicy, or a dict of QueuePolicy arguments")
 
 
 
@@ -39,15 +52,21 @@ class StreamRunner:
                  queue_policy=None,
                  backend="gstreamer",
                  array_type="numpy",
-                 do_op=None
+                 do_op=None,
+                 tensor_format=None,
+                 preprocess=None
     ):
-        # TODO: support passing in a queue policy / queue backend
         # TODO: support selecting / passing in a backend
         # TODO: passing in inputs / outputs on init
         self._queue = parse_queue_policy(queue_policy)
         self._backend = parse_backend(backend, array_type)
-        print("backend:", self._backend)
+        _LOG.debug("backend: %s", self._backend)
         self._backend.set_do_op(do_op)
+        self._backend.set_queue_policy(self._queue)
+        if tensor_format is not None:
+            self._backend.set_tensor_format(tensor_format)
+        if preprocess is not None:
+            self._backend.set_preprocess(preprocess)
 
         if input_configs is not None:
             for c in input_configs:
@@ -87,6 +106,39 @@ class StreamRunner:
         return self._backend
 
 
+    @property
+    def dropped_frames(self):
+        return self._backend.dropped_frames
+
+
+    @property
+    def unmatched_frames(self):
+        return self._backend.unmatched_frames
+
+
+    def set_stats(self, stats):
+        """
+        Record the backend's queueing, do_op and push times into the LatencyStats `stats`, or stop recording if None.
+        """
+        self._backend.set_stats(stats)
+
+
+    def set_change_detector(self, detector):
+        """
+        Skip do_op for frame sets the ChangeDetector `detector` finds unchanged, reusing the previous outputs, or stop
+        skipping if None.
+        """
+        self._backend.set_change_detector(detector)
+
+
+    def set_preprocess(self, preprocess):
+        """
+        Convert each frame with `preprocess`, eg. a FrameNormalizer, or the function at the same position for each
+        input if a list, before it's passed to do_op. None disables preprocessing.
+        """
+        self._backend.set_preprocess(preprocess)
+
+
     def register(self, name, permanent=False):
         raise NotImplementedError()
 
@@ -0,0 +1,93 @@
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import torch
+
+
+
+@dataclass(frozen=True)
+class TensorFormat:
+    """
+    Describes the tensors frames are converted to when a runner's array type is "torch".
+
+    Args:
+        dtype: the tensor dtype, or None to keep the dtype of the frames
+        channels_first: if True tensors have CHW layout, otherwise they have the HWC layout of the frames
+        scale: a factor the frame values are multiplied by during conversion, eg. 1/255 to bring uint8 frames into
+            [0, 1], or None to not scale
+        alias: if True, frames needing no conversion are given as tensors sharing the memory of the mapped input buffer
+            rather than being copied, in which case do_op must not modify them in place
+    """
+
+    dtype: torch.dtype | None = None
+    channels_first: bool = False
+    scale: float | None = None
+    alias: bool = False
+
+
+
+class TensorRing:
+    """
+    A ring of preallocated contiguous tensors that frames of a fixed shape and dtype are converted into, so that no
+    tensor is constructed per frame. Each frame is converted in a single pass from the mapped buffer, including any
+    change of dtype, layout or scale given by `format`. The tensor returned by `put` is reused `size` frames later,
+    so `size` must exceed the number of frames in use at once.
+    """
+
+    def __init__(self, shape, dtype, size, format=TensorFormat()):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.format = format
+
+        tensor_shape = (self.shape[2], self.shape[0], self.shape[1]) if format.channels_first else self.shape
+        tensor_dtype = format.dtype or torch.from_numpy(np.empty(0, self.dtype)).dtype
+
+        self._tensors = [torch.empty(tensor_shape, dtype=tensor_dtype) for _ in range(size)]
+        self._arrays = [t.numpy() for t in self._tensors]  # views used to convert frames with numpy
+        self._index = 0
+
+        self._converts = format.channels_first or format.scale is not None or self._arrays[0].dtype != self.dtype
+        if self.format.scale is not None and self._arrays[0].dtype.kind == "f":
+            self._loop_dtype = self._arrays[0].dtype  # multiply in the target precision rather than float64
+        else:
+            self._loop_dtype = None
+
+
+    def __len__(self):
+        return len(self._tensors)
+
+
+    def put(self, array):
+        """
+        Convert the frame `array` into the next tensor of the ring and return it, or return a tensor sharing its memory
+        if aliasing is enabled and the frame needs no conversion.
+        """
+        if array.shape != self.shape or array.dtype != self.dtype:
+            raise ValueError(f"frame of shape {array.shape} and dtype {array.dtype} doesn't match the ring's "
+                             f"{self.shape} and {self.dtype}")
+
+        if self.format.alias and not self._converts and array.flags.c_contiguous:
+            with warnings.catch_warnings():
+                # mapped buffers are read-only, which torch warns about since it has no read-only tensors
+                warnings.simplefilter("ignore", UserWarning)
+                return torch.from_numpy(array)
+
+        tensor = self._tensors[self._index]
+        dest = self._arrays[self._index]
+        self._index = (self._index + 1) % len(self._tensors)
+
+        src = array.transpose(2, 0, 1) if self.format.channels_first else array
+        if self.format.scale is None:
+            np.copyto(dest, src, casting="unsafe")
+        else:
+            np.multiply(src, self.format.scale, out=dest, dtype=self._loop_dtype, casting="unsafe")
+
+        return tensor
+
+
+    def owns(self, tensor):
+        """
+        Returns True if `tensor` is one of the ring's tensors, and so will be overwritten by later frames.
+        """
+        return any(tensor is t for t in self._tensors)
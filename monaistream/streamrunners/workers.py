@@ -0,0 +1,133 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from monaistream.streamrunners.debug import get_logger
+
+_LOG = get_logger("monaistream-workers", "MONAI Stream worker pools")
+
+
+
+def _create_thread_executor(num_workers):
+    return ThreadPoolExecutor(num_workers, thread_name_prefix="streamrunner-worker")
+
+
+
+def _create_process_executor(num_workers):
+    # forking a process with running streaming threads isn't safe, so workers are always spawned
+    return ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+
+WORKER_KINDS = {
+    "thread": _create_thread_executor,
+    "process": _create_process_executor,
+}
+
+
+
+class OrderedWorkerPool:
+    """
+    Runs functions on a pool of worker threads or processes and passes the results to `on_result` from a single push
+    thread in the order the calls were submitted, regardless of the order in which the workers finish. `on_result` is
+    called as `on_result(context, result, error)` where `error` is the exception raised by the call or None. With
+    "process" workers the function and its arguments must be picklable, and results are copies.
+
+    At most `max_in_flight` calls should be outstanding, that is submitted but not yet passed to `on_result`. This
+    isn't enforced by `submit` so that it can be called while holding a lock that `on_result` doesn't need; instead
+    producers call `wait_for_slot` beforehand.
+    """
+
+    def __init__(self, on_result, num_workers=1, kind="thread", max_in_flight=None):
+        if kind not in WORKER_KINDS:
+            raise ValueError(f"unknown worker kind {kind}; must be one of {tuple(WORKER_KINDS)}")
+
+        self.on_result = on_result
+        self.num_workers = num_workers
+        self.kind = kind
+        self.max_in_flight = max_in_flight or 2 * num_workers
+        self._executor = None
+        self._pusher = None
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+
+    def submit(self, context, func, *args):
+        """
+        Run `func(*args)` on a worker, passing `context` with the result to `on_result` once every earlier call's
+        result has been passed on.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("worker pool is closed")
+
+            if self._executor is None:
+                self._executor = WORKER_KINDS[self.kind](self.num_workers)
+                self._pusher = threading.Thread(target=self._run_pusher, daemon=True)
+                self._pusher.start()
+
+            self._pending.append((self._executor.submit(func, *args), context))
+            self._cond.notify_all()
+
+
+    def wait_for_slot(self, timeout=None):
+        """
+        Wait until fewer than `max_in_flight` calls are outstanding, returning False if this times out.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._pending) < self.max_in_flight or self._closed, timeout)
+
+
+    def join(self, timeout=None):
+        """
+        Wait until the results of all submitted calls have been passed on, returning False if this times out.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+
+    def close(self):
+        """
+        Wait for outstanding calls to be passed on then stop the workers. The pool can't be used afterwards.
+        """
+        self.join()
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        if self._pusher is not None:
+            self._pusher.join()
+            self._executor.shutdown()
+
+
+    def _run_pusher(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                future, context = self._pending[0]
+
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+
+            try:
+                self.on_result(context, result, error)
+            except Exception as e:
+                # keep pushing later results rather than leaving join() waiting forever
+                _LOG.error("on_result failed: %r", e)
+
+            # only now is the call finished, so join() returns once every result has been passed on
+            with self._cond:
+                self._pending.popleft()
+                self._cond.notify_all()
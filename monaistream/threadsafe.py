@@ -9,82 +9,423 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Callable
+import asyncio
+import multiprocessing
+from collections import OrderedDict, deque
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Optional, Sequence
 
+import numpy as np
 import torch
 
-from queue import Empty, Queue
-from threading import Thread, RLock
+from queue import Empty, Full
+from threading import Condition, Lock
+from monai.data import list_data_collate
 from monai.transforms import Transform
 from monai.utils.enums import CommonKeys
 
-__all__ = ["IterableBufferDataset", "StreamSinkTransform"]
+__all__ = ["IterableBufferDataset", "SharedBufferDataset", "StreamSinkTransform"]
 
 
 class IterableBufferDataset(torch.utils.data.IterableDataset):
-    """Defines a iterable dataset using a Queue object to permit asynchronous additions of new items, eg. frames."""
+    """
+    Defines a iterable dataset using a buffer to permit asynchronous additions of new items, eg. frames. Iterating
+    waits on a condition variable so it wakes as soon as an item is added or `stop` is called, without polling.
+
+    If `batch_size` is given, each iteration drains up to that many items already in the buffer, waiting only for the
+    first, and yields them transformed and collated into one batch with `collate_fn`. Batches are therefore smaller
+    than `batch_size` when items arrive slower than they're consumed, which keeps latency low while letting a consumer
+    that falls behind catch up with larger batches.
+    """
 
     STOP = "STOP"  # stop sentinel used to indicate to the read thread to quit
 
-    def __init__(self, transform: Callable, buffer_size: int = 0, timeout: float = 0.01):
+    def __init__(
+        self,
+        transform: Callable,
+        buffer_size: int = 0,
+        timeout: float = 0.01,
+        batch_size: Optional[int] = None,
+        collate_fn: Callable = list_data_collate,
+    ):
         super().__init__()
         self.transform = transform
         self.buffer_size = buffer_size
         self.timeout = timeout
-        self.buffer: Queue = Queue(self.buffer_size)
+        self.batch_size = batch_size
+        self.collate_fn = collate_fn
+        self.buffer: deque = deque()
         self._is_running = False
-        self._lock = RLock()
+        self._lock = Lock()
+        self._not_empty = Condition(self._lock)
+        self._not_full = Condition(self._lock)
 
     @property
     def is_running(self):
-        with self._lock:
-            return self._is_running
+        return self._is_running
 
     def add_item(self, item):
         """
         The idea is that the source of the streaming data would add items here and these would be consumed by the
         engine immediately. The engine's `run` method would be running in the main or some other thread separate from
-        the source, eg. something reading from port or from a device which puts individual video frames here.
+        the source, eg. something reading from port or from a device which puts individual video frames here. If the
+        buffer is full this waits up to `timeout` seconds for space and then raises `queue.Full`.
         """
-        self.buffer.put(item, timeout=self.timeout)
+        with self._not_full:
+            if self.buffer_size > 0:
+                if not self._not_full.wait_for(lambda: len(self.buffer) < self.buffer_size, self.timeout):
+                    raise Full()
+            self.buffer.append(item)
+            self._not_empty.notify()
 
     def stop(self):
         with self._lock:
             self._is_running = False
+            self._not_empty.notify_all()
+
+    def _is_stop(self, item):
+        return isinstance(item, str) and item == IterableBufferDataset.STOP
+
+    def _take(self, max_items):
+        """
+        Wait for at least one item and return up to `max_items` items from the buffer, stopping at the STOP sentinel,
+        and whether iteration should end afterwards.
+        """
+        with self._not_empty:
+            self._not_empty.wait_for(lambda: self.buffer or not self._is_running)
+            if not self._is_running:
+                return [], True
+
+            items = []
+            stopped = False
+            while self.buffer and len(items) < max_items:
+                item = self.buffer.popleft()
+                if self._is_stop(item):  # stop looping when sentinel received
+                    stopped = True
+                    break
+                items.append(item)
+
+            self._not_full.notify(len(items) + stopped)
+            return items, stopped
 
     def __iter__(self):
         """
-        This will continually attempt to get an item from the queue until STOP is received or stop() called.
+        This will continually get items from the buffer until STOP is received or stop() called.
         """
         with self._lock:
             self._is_running = True
 
         try:
-            while self.is_running:  # checking exit condition prevents deadlock
-                try:
-                    item = self.buffer.get(timeout=self.timeout)
+            while True:
+                items, stopped = self._take(self.batch_size or 1)
 
-                    if item == IterableBufferDataset.STOP:  # stop looping when sentinel received
-                        break
+                if items:
+                    if self.batch_size is None:
+                        yield self.transform(items[0])
+                    else:
+                        yield self.collate_fn([self.transform(item) for item in items])
 
-                    yield self.transform(item)
-                except Empty:
-                    pass  # queue was empty this time, try again
+                if stopped:
+                    break
         finally:
             self.stop()
 
 
+def _unshare(result, frame):
+    """Copy the arrays in `result`, which may be nested in lists, tuples or dicts, that may share memory with `frame`."""
+    if isinstance(result, np.ndarray) and np.may_share_memory(result, frame):
+        return result.copy()
+    if isinstance(result, torch.Tensor) and result.device.type == "cpu":
+        if np.may_share_memory(result.detach().numpy(), frame):
+            return result.clone()
+    if isinstance(result, (list, tuple)):
+        return type(result)(_unshare(r, frame) for r in result)
+    if isinstance(result, dict):
+        return {k: _unshare(v, frame) for k, v in result.items()}
+    return result
+
+
+class SharedBufferDataset(torch.utils.data.IterableDataset):
+    """
+    Defines an iterable dataset like `IterableBufferDataset` which can be used with a `DataLoader` with worker
+    processes, so that `transform` runs in parallel. Frames added with `add_item` are copied into a pool of `num_slots`
+    frame buffers in shared memory and only the slot index is sent to the workers, through one queue per worker. Items
+    are sharded round-robin across the `num_workers` workers, which must match the DataLoader's `num_workers` and is
+    checked when iterated in a worker. The DataLoader takes one batch from each worker in turn, so frames come out in
+    the order they were added only if each batch is a single frame, ie. with `batch_size=None` or 1; with larger batches
+    each batch holds every `num_workers`th frame. When iterated outside a worker, eg. with `num_workers=0`, every shard
+    is read in turn.
+
+    `transform` is given a view of the shared frame, whose slot is reused once `transform` returns, so a result sharing
+    memory with the frame is copied. Call `close` once finished to free the shared memory.
+    """
+
+    STOP = IterableBufferDataset.STOP
+
+    def __init__(
+        self,
+        transform: Callable,
+        frame_shape: Sequence[int],
+        dtype=np.uint8,
+        num_workers: int = 1,
+        num_slots: int = 8,
+        timeout: float = 0.01,
+        mp_context=None,
+    ):
+        super().__init__()
+        self.transform = transform
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.num_workers = max(num_workers, 1)
+        self.num_slots = num_slots
+        self.timeout = timeout
+
+        ctx = mp_context or multiprocessing.get_context()
+        frame_size = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self._shm = SharedMemory(create=True, size=max(frame_size * num_slots, 1))
+        self._frames = None
+        self._free = ctx.Queue()
+        self._ready = [ctx.Queue() for _ in range(self.num_workers)]
+        self._count = 0
+
+        for slot in range(num_slots):
+            self._free.put(slot)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_frames"] = None  # recreated from the shared memory in the worker rather than copied
+        return state
+
+    @property
+    def frames(self) -> np.ndarray:
+        if self._frames is None:
+            self._frames = np.ndarray((self.num_slots,) + self.frame_shape, self.dtype, self._shm.buf)
+        return self._frames
+
+    def add_item(self, item):
+        """
+        Copy the frame `item` into a free slot and queue it for the next worker. Waits up to `timeout` seconds for a
+        slot to be freed and then raises `queue.Full`. Adding the STOP sentinel is the same as calling `stop`.
+        """
+        if isinstance(item, str) and item == SharedBufferDataset.STOP:
+            self.stop()
+            return
+
+        try:
+            slot = self._free.get(timeout=self.timeout)
+        except Empty:
+            raise Full() from None
+
+        try:
+            np.copyto(self.frames[slot], item.numpy() if isinstance(item, torch.Tensor) else item)
+        except BaseException:
+            self._free.put(slot)  # eg. a frame of the wrong shape, which mustn't leak the slot
+            raise
+
+        self._ready[self._count % self.num_workers].put(slot)
+        self._count += 1
+
+    def stop(self):
+        """
+        Stop every shard once the frames already added to it have been read.
+        """
+        for ready in self._ready:
+            ready.put(None)
+
+    def close(self):
+        self._frames = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def __iter__(self):
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None and worker_info.num_workers != self.num_workers:
+            raise ValueError(
+                f"DataLoader has {worker_info.num_workers} workers but the dataset was created for {self.num_workers}"
+            )
+
+        shards = [worker_info.id] if worker_info is not None else list(range(self.num_workers))
+
+        while shards:
+            for shard in list(shards):
+                slot = self._ready[shard].get()
+                if slot is None:
+                    shards.remove(shard)
+                    continue
+
+                frame = self.frames[slot]
+                try:
+                    result = _unshare(self.transform(frame), frame)
+                finally:
+                    self._free.put(slot)
+
+                yield result
+
+
 class StreamSinkTransform(Transform):
-    def __init__(self, result_key: str = CommonKeys.PRED, buffer_size: int = 0, timeout: float = 1.0):
+    """
+    Stores the result `data[result_key]` of each item passing through, eg. as the last postprocessing transform of an
+    engine, so that it can be retrieved by another thread. Results are keyed by the frame ID or PTS in `data[id_key]`,
+    or by a sequence number counting from 0 if `id_key` is None, so consumers can match results to frames when several
+    are in flight.
+
+    Storing never blocks the engine: once `buffer_size` results are waiting the oldest is dropped and counted in
+    `dropped`. Results can be taken with the blocking `get_result`, the non-blocking `try_get`, or awaited with
+    `get_result_async`, and `callback(frame_id, result)` is called with each result if given. Results passed to the
+    callback or accepted by an awaiting coroutine aren't stored, but a result whose awaiting coroutines were all
+    cancelled is.
+
+    The `queue` attribute was previously a `queue.Queue` of results, and for existing callers is now a view of the
+    stored results with the `get`, `get_nowait`, `qsize` and `empty` methods of a queue, taking results oldest first.
+    Unlike the previous queue, a full store drops the oldest result rather than blocking and raising `queue.Full`.
+    """
+
+    def __init__(
+        self,
+        result_key: str = CommonKeys.PRED,
+        buffer_size: int = 0,
+        timeout: float = 1.0,
+        id_key: Optional[str] = None,
+        callback: Optional[Callable] = None,
+    ):
         super().__init__()
         self.result_key = result_key
         self.buffer_size = buffer_size
         self.timeout = timeout
-        self.queue: Queue = Queue(self.buffer_size)
+        self.id_key = id_key
+        self.callback = callback
+        self.dropped = 0
+        self.results: OrderedDict = OrderedDict()
+        self._count = 0
+        self._waiters: dict = {}
+        self._cond = Condition()
+        self.queue = _ResultQueue(self)
 
     def __call__(self, data):
-        self.queue.put(data[self.result_key], timeout=self.timeout)
+        result = data[self.result_key]
+
+        with self._cond:
+            if self.id_key is not None:
+                frame_id = data[self.id_key]
+            else:
+                frame_id = self._count
+                self._count += 1
+
+            waiters = [w for w in self._waiters.pop(frame_id, ()) if not w[1].done()]
+            if not waiters and self.callback is None:
+                self._store(frame_id, result)
+
+        # the number of waiters left to resolve and whether any accepted the result, see `_resolve`
+        delivery = [len(waiters), False]
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, frame_id, result, delivery)
+            except RuntimeError:  # the waiter's loop has been closed
+                self._resolve(None, frame_id, result, delivery)
+
+        if self.callback is not None:
+            self.callback(frame_id, result)
+
         return data
 
-    def get_result(self):
-        return self.queue.get(timeout=self.timeout)
+    def _store(self, frame_id, result):
+        """
+        Store a result, dropping the oldest if there are more than `buffer_size`. Must be called with the lock held.
+        """
+        self.results[frame_id] = result
+        while 0 < self.buffer_size < len(self.results):
+            self.results.popitem(last=False)
+            self.dropped += 1
+        self._cond.notify_all()
+
+    def _resolve(self, future, frame_id, result, delivery):
+        """
+        Pass the result to the awaiting `future`, called in its loop. Once every waiter has been resolved the result is
+        stored if none accepted it since their coroutines were cancelled, so it isn't lost.
+        """
+        accepted = future is not None and not future.done()
+        if accepted:
+            future.set_result(result)
+
+        with self._cond:
+            delivery[0] -= 1
+            delivery[1] = delivery[1] or accepted
+            if delivery[0] == 0 and not delivery[1] and self.callback is None:
+                self._store(frame_id, result)
+
+    def _pop(self, frame_id):
+        if frame_id is None:
+            return self.results.popitem(last=False)[1] if self.results else _MISSING
+        return self.results.pop(frame_id, _MISSING)
+
+    def try_get(self, frame_id=None, default=None):
+        """
+        Take the result for `frame_id`, or the oldest result if None, returning `default` if it isn't available.
+        """
+        with self._cond:
+            result = self._pop(frame_id)
+        return default if result is _MISSING else result
+
+    def get_result(self, frame_id=None, timeout: Optional[float] = -1):
+        """
+        Take the result for `frame_id`, or the oldest result if None, waiting up to `timeout` seconds (the transform's
+        `timeout` by default, or indefinitely if None) for it to arrive before raising `queue.Empty`.
+        """
+        timeout = self.timeout if timeout == -1 else timeout
+        with self._cond:
+            if self._cond.wait_for(lambda: self.results if frame_id is None else frame_id in self.results, timeout):
+                return self._pop(frame_id)
+        raise Empty()
+
+    async def get_result_async(self, frame_id):
+        """
+        Await the result for `frame_id`. This must be called before the result arrives or while it's stored.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        with self._cond:
+            result = self.results.pop(frame_id, _MISSING)
+            if result is _MISSING:
+                self._waiters.setdefault(frame_id, []).append((loop, future))
+            else:
+                future.set_result(result)
+
+        try:
+            return await future
+        finally:
+            with self._cond:  # forget the waiter if cancelled before the result arrived
+                waiters = self._waiters.get(frame_id, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                    if not waiters:
+                        del self._waiters[frame_id]
+
+
+class _ResultQueue:
+    """
+    The `queue.Queue` style view of the results of a StreamSinkTransform given by its `queue` attribute.
+    """
+
+    def __init__(self, sink):
+        self._sink = sink
+
+    def get(self, block=True, timeout=None):
+        if not block:
+            return self.get_nowait()
+        return self._sink.get_result(timeout=timeout)
+
+    def get_nowait(self):
+        result = self._sink.try_get(default=_MISSING)
+        if result is _MISSING:
+            raise Empty()
+        return result
+
+    def qsize(self):
+        return len(self._sink.results)
+
+    def empty(self):
+        return not self._sink.results
+
+
+_MISSING = object()
@@ -1,11 +1,12 @@
 import unittest
 
+from ignite.engine import Events
 from ignite.engine.engine import Engine
 
 import monai
 from monai.engines import Workflow
 
-from monaistream.streamrunners.adaptors import IgniteEngineAdaptor
+from monaistream.streamrunners.adaptors import IgniteEngineAdaptor, PersistentIgniteEngineAdaptor
 
 
 class TestIgniteEngineAdaptor(unittest.TestCase):
@@ -52,5 +53,69 @@ class TestIgniteEngineAdaptor(unittest.TestCase):
 
         self.assertSequenceEqual(outputs, [i for i in range(10)])
 
+
+class TestPersistentIgniteEngineAdaptor(unittest.TestCase):
+
+    def test_engine_adaptor(self):
+        started = list()
+
+        e = Engine(lambda engine, batch: batch * 2)
+        e.add_event_handler(Events.STARTED, lambda engine: started.append(True))
+        ie = PersistentIgniteEngineAdaptor(e, buffer_size=2, timeout=10)
+
+        outputs = [ie(i) for i in range(5)]
+
+        # frames can be queued ahead of taking their outputs
+        ie.put(5)
+        ie.put(6)
+        outputs += [ie.get(), ie.get()]
+        ie.stop()
+
+        self.assertSequenceEqual(outputs, [i * 2 for i in range(7)])
+        self.assertEqual(len(started), 1)
+        self.assertFalse(ie.running)
+
+    def test_engine_failure(self):
+
+        def _fail(engine, batch):
+            raise ValueError("bad frame")
+
+        ie = PersistentIgniteEngineAdaptor(Engine(_fail), timeout=10)
+
+        with self.assertRaises(ValueError):
+            ie(0)
+
+    def test_restart_after_failure(self):
+
+        def _fail_odd(engine, batch):
+            if batch % 2:
+                raise ValueError("bad frame")
+            return batch
+
+        ie = PersistentIgniteEngineAdaptor(Engine(_fail_odd), timeout=10)
+
+        with self.assertRaises(ValueError):
+            ie(1)
+        self.assertFalse(ie.running)
+
+        self.assertEqual(ie(2), 2)
+        self.assertTrue(ie.running)
+        ie.stop()
+
+    def test_max_pending(self):
+        """
+        Test putting more frames than can be held without taking outputs raises instead of deadlocking.
+        """
+        ie = PersistentIgniteEngineAdaptor(Engine(lambda engine, batch: batch), buffer_size=1)
+
+        for i in range(ie.max_pending):
+            ie.put(i)
+        with self.assertRaises(RuntimeError):
+            ie.put(ie.max_pending)
+
+        self.assertEqual([ie.get() for _ in range(ie.max_pending)], list(range(ie.max_pending)))
+        ie.stop()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,118 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+from functools import lru_cache
+
+from tests.utils import SkipIfNoModule
+
+OP_DELAY = 0.2
+
+
+def _slow_op(frames):
+    time.sleep(OP_DELAY)
+    return [frames[0]]
+
+
+@lru_cache(maxsize=None)
+def _timed_backend_type():
+    """
+    Create a backend recording how long each call of its chain function takes, once since a GType can only be
+    registered once.
+    """
+    from monaistream.streamrunners.gstreamer.backend import GstStreamRunnerBackend
+
+    class TimedBackend(GstStreamRunnerBackend):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.chain_times = []
+
+        def do_chain(self, pad, parent, buffer):
+            start = time.perf_counter()
+            ret = super().do_chain(pad, parent, buffer)
+            self.chain_times.append(time.perf_counter() - start)
+            return ret
+
+    return TimedBackend
+
+
+@SkipIfNoModule("gi")
+class TestGstStreamRunnerBackend(unittest.TestCase):
+    def _run_pipeline(self, policy, num_buffers=20):
+        """
+        Run `num_buffers` frames through a backend with a slow do_op and the given queue policy to EOS, returning the
+        final bus message, the backend, and the time each call of its chain function took.
+        """
+        from gi.repository import Gst
+
+        from monaistream.streamrunners.gstreamer.utils import PadEntry
+
+        caps = "video/x-raw,format=RGB,width=64,height=48"
+        backend = _timed_backend_type()(
+            inputs=[PadEntry("sink_0", caps)], outputs=[PadEntry("src_0", caps)], do_op=_slow_op, queue_policy=policy
+        )
+
+        pipeline = Gst.Pipeline()
+        src = Gst.ElementFactory.make("videotestsrc")
+        src.set_property("num-buffers", num_buffers)
+        sink = Gst.ElementFactory.make("fakesink")
+        sink.set_property("sync", False)
+
+        for element in (src, backend, sink):
+            pipeline.add(element)
+        self.assertTrue(src.link(backend))
+        self.assertTrue(backend.link(sink))
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            bus = pipeline.get_bus()
+            msg = bus.timed_pop_filtered(30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        return msg, backend, backend.chain_times
+
+    def test_leaky_queue_doesnt_block(self):
+        """
+        Test do_chain returns without waiting for a slow do_op with a leaky queue policy, the frames arriving while
+        do_op is busy being dropped.
+        """
+        from gi.repository import Gst
+
+        from monaistream.streamrunners.queues import QueuePolicy
+
+        for mode in ("drop-oldest", "drop-newest", "latest-only"):
+            with self.subTest(mode=mode):
+                msg, backend, chain_times = self._run_pipeline(QueuePolicy(mode=mode, capacity=1))
+
+                self.assertEqual(msg.type, Gst.MessageType.EOS)
+                self.assertEqual(len(chain_times), 20)
+                self.assertLess(max(chain_times), OP_DELAY / 2)
+                self.assertGreater(backend.dropped_frames, 0)
+
+    def test_blocking_queue(self):
+        """
+        Test a blocking queue applies backpressure rather than dropping frames.
+        """
+        from gi.repository import Gst
+
+        from monaistream.streamrunners.queues import QueuePolicy
+
+        msg, backend, chain_times = self._run_pipeline(QueuePolicy(mode="blocking", capacity=1), num_buffers=5)
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertEqual(backend.dropped_frames, 0)
+        self.assertGreater(max(chain_times), OP_DELAY / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
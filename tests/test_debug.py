@@ -0,0 +1,99 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import unittest
+from unittest import mock
+
+from monaistream.streamrunners import debug
+from monaistream.streamrunners.debug import DEBUG, ERROR, LOG, NONE, WARNING, DebugLogger, parse_gst_debug
+
+
+def _python_logger(name, gst_debug):
+    # force the Python logging fallback so the messages can be captured with assertLogs
+    with mock.patch.object(debug, "_LIBGST", None), mock.patch.dict(os.environ, {"GST_DEBUG": gst_debug}):
+        return DebugLogger(name)
+
+
+class TestParseGstDebug(unittest.TestCase):
+    def test_thresholds(self):
+        self.assertEqual(parse_gst_debug(None, "monaistream-backend"), NONE)
+        self.assertEqual(parse_gst_debug("2", "monaistream-backend"), WARNING)
+        self.assertEqual(parse_gst_debug("2,monaistream*:6", "monaistream-backend"), LOG)
+        self.assertEqual(parse_gst_debug("2,monaistream*:6", "videotestsrc"), WARNING)
+        self.assertEqual(parse_gst_debug("monaistream-backend:debug", "monaistream-backend"), DEBUG)
+        self.assertEqual(parse_gst_debug("*:5,monaistream*:1", "monaistream-backend"), ERROR)
+
+
+class TestDebugLogger(unittest.TestCase):
+    def test_disabled(self):
+        """
+        Test that messages above the threshold aren't formatted or logged.
+        """
+        logger = _python_logger("monaistream-test-disabled", "1")
+        arg = mock.MagicMock()
+
+        with self.assertNoLogs("monaistream.monaistream-test-disabled"):
+            logger.debug("value %s", arg)
+            logger.log_every(1, LOG, "value %s", arg)
+            logger.log_interval(0.0, LOG, "value %s", arg)
+
+        arg.__str__.assert_not_called()
+
+        with self.assertLogs("monaistream.monaistream-test-disabled", "ERROR") as logs:
+            logger.error("failed: %s", "reason")
+        self.assertEqual(logs.records[0].getMessage(), "failed: reason")
+
+    def test_log_every(self):
+        logger = _python_logger("monaistream-test-every", "monaistream-test-*:6")
+
+        with self.assertLogs("monaistream.monaistream-test-every", "DEBUG") as logs:
+            for i in range(10):
+                logger.log_every(4, LOG, "frame %d", i)
+
+        self.assertEqual([r.getMessage() for r in logs.records], ["frame 3 (4 calls)", "frame 7 (4 calls)"])
+
+    def test_log_interval(self):
+        logger = _python_logger("monaistream-test-interval", "monaistream-test-*:6")
+
+        with mock.patch.object(debug.time, "monotonic", side_effect=[0.0, 0.5, 0.9, 1.0, 1.5, 2.5]):
+            with self.assertLogs("monaistream.monaistream-test-interval", "DEBUG") as logs:
+                for i in range(6):
+                    logger.log_interval(1.0, LOG, "frame %d", i)
+
+        self.assertEqual([r.getMessage() for r in logs.records], ["frame 0", "frame 3", "frame 5"])
+
+    def test_refresh(self):
+        logger = _python_logger("monaistream-test-refresh", "1")
+        self.assertFalse(logger.enabled(DEBUG))
+
+        with mock.patch.dict(os.environ, {"GST_DEBUG": "monaistream-test-refresh:5"}):
+            logger.refresh()
+        self.assertTrue(logger.enabled(DEBUG))
+        self.assertFalse(logger.enabled(LOG))
+
+    def test_lazy_refresh(self):
+        """
+        Test a threshold set after the logger is created, eg. by `Gst.init` parsing GST_DEBUG, is picked up once the
+        refresh interval has passed.
+        """
+        logger = _python_logger("monaistream-test-lazy", "")
+        now = debug.time.monotonic()
+
+        with mock.patch.dict(os.environ, {"GST_DEBUG": "monaistream-test-lazy:5"}):
+            with mock.patch.object(debug.time, "monotonic", return_value=now):
+                self.assertFalse(logger.enabled(DEBUG))
+            with mock.patch.object(debug.time, "monotonic", return_value=now + logger.refresh_interval + 1):
+                self.assertTrue(logger.enabled(DEBUG))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from functools import lru_cache
+
+from tests.utils import SkipIfNoModule
+
+
+@lru_cache(maxsize=None)
+def _inverting_runner_type(base_name):
+    """
+    Create and register a subclass of the named aggregator runner inverting its first input into the pooled output
+    buffer, once since a GType can only be registered once, returning the type and the name it's registered as.
+    """
+    import numpy as np
+
+    from monaistream.streamrunners import gstreamer_plugin
+    from monaistream.streamrunners.gstreamer.utils import register
+
+    class InvertingRunner(getattr(gstreamer_plugin, base_name)):
+        def __init__(self):
+            super().__init__()
+            self.output_shapes = []
+
+        def do_op(self, images, output=None):
+            self.output_shapes.append(None if output is None else output.shape)
+            return np.subtract(255, images[0], out=output)
+
+    name = f"inverting{base_name.lower()}"
+    register(InvertingRunner, name)
+    return InvertingRunner, name
+
+
+@SkipIfNoModule("gi")
+class TestGstOverlayStreamRunner(unittest.TestCase):
+    def _run_pipeline(self, video_format):
+        """
+        Run 5 video frames of the given format and 3 GRAY8 masks through the overlay to EOS, returning the final bus
+        message and the output buffers.
+        """
+        from gi.repository import Gst
+
+        from monaistream.streamrunners.gstreamer.utils import register
+        from monaistream.streamrunners.gstreamer_plugin import GstOverlayStreamRunner
+
+        if Gst.ElementFactory.find("overlaytest") is None:
+            register(GstOverlayStreamRunner, "overlaytest")
+
+        pipeline = Gst.parse_launch(
+            "overlaytest name=o "
+            f"videotestsrc num-buffers=5 ! video/x-raw,format={video_format},width=64,height=48 ! o.sink_0 "
+            "videotestsrc num-buffers=3 pattern=ball ! video/x-raw,format=GRAY8,width=32,height=24 ! o.sink_1 "
+            "o. ! fakesink name=sink"
+        )
+
+        buffers = []
+
+        def probe(pad, info):
+            buffers.append(info.get_buffer())
+            return Gst.PadProbeReturn.OK
+
+        sinkpad = pipeline.get_by_name("sink").get_static_pad("sink")
+        sinkpad.add_probe(Gst.PadProbeType.BUFFER, probe)
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            bus = pipeline.get_bus()
+            msg = bus.timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        return msg, buffers
+
+    def test_pipeline(self):
+        """
+        Test every video frame is output with its timestamps, the last mask being reused once the masks have ended.
+        """
+        from gi.repository import Gst
+
+        msg, buffers = self._run_pipeline("RGB")
+
+        self.assertIsNotNone(msg)
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertEqual(len(buffers), 5)
+
+        pts = [b.pts for b in buffers]
+        self.assertNotIn(Gst.CLOCK_TIME_NONE, pts)
+        self.assertEqual(pts, sorted(set(pts)))
+        self.assertTrue(all(b.duration == buffers[0].duration != Gst.CLOCK_TIME_NONE for b in buffers))
+
+    def test_mask_timestamps(self):
+        """
+        Test each frame is blended with the mask with its timestamp when the mask stream is missing frames, the last
+        mask being reused for frames without one rather than later masks drifting onto earlier frames.
+        """
+        import numpy as np
+        from gi.repository import Gst
+
+        from monaistream.streamrunners.gstreamer.utils import register
+        from monaistream.streamrunners.gstreamer_plugin import GstOverlayStreamRunner
+
+        if Gst.ElementFactory.find("overlaytest") is None:
+            register(GstOverlayStreamRunner, "overlaytest")
+
+        pipeline = Gst.parse_launch(
+            "overlaytest name=o opacity=1.0 "
+            "appsrc name=video caps=video/x-raw,format=RGB,width=8,height=8,framerate=30/1 format=time ! o.sink_0 "
+            "appsrc name=mask caps=video/x-raw,format=GRAY8,width=8,height=8,framerate=30/1 format=time ! o.sink_1 "
+            "o. ! appsink name=sink"
+        )
+
+        def _push(src, frames):
+            for pts, frame in frames:
+                buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+                buffer.pts = pts * Gst.SECOND // 30
+                buffer.duration = Gst.SECOND // 30
+                src.emit("push-buffer", buffer)
+            src.emit("end-of-stream")
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            _push(pipeline.get_by_name("video"), [(i, np.zeros((8, 8, 3), np.uint8)) for i in range(5)])
+            # masks for frames 0, 2 and 4 only, each with a different label
+            _push(pipeline.get_by_name("mask"), [(i, np.full((8, 8), i // 2 + 1, np.uint8)) for i in (0, 2, 4)])
+
+            sink = pipeline.get_by_name("sink")
+            samples = [sink.emit("pull-sample") for _ in range(5)]
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        self.assertNotIn(None, samples)
+        colors = [tuple(s.get_buffer().extract_dup(0, 3)) for s in samples]
+
+        self.assertEqual(colors[1], colors[0])
+        self.assertEqual(colors[3], colors[2])
+        self.assertEqual(len({colors[0], colors[2], colors[4]}), 3)
+
+    def test_gray_video(self):
+        """
+        Test GRAY8 video negotiates with the src pad.
+        """
+        from gi.repository import Gst
+
+        msg, buffers = self._run_pipeline("GRAY8")
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertEqual(len(buffers), 5)
+
+
+@SkipIfNoModule("gi")
+class TestGstMultiInputStreamRunners(unittest.TestCase):
+    def test_pooled_allocation(self):
+        """
+        Test the aggregator runners output a frame for each set of inputs with the size and timestamps of the first,
+        written by do_op directly into buffers from the negotiated pool.
+        """
+        from gi.repository import Gst
+
+        for base_name in ("GstMultiInputStreamRunner", "GstMultiInputStreamRunner2"):
+            with self.subTest(base_name=base_name):
+                _, name = _inverting_runner_type(base_name)
+                pipeline = Gst.parse_launch(
+                    f"{name} name=r "
+                    "videotestsrc num-buffers=5 pattern=black ! video/x-raw,format=RGB,width=64,height=48 ! r.sink_0 "
+                    "videotestsrc num-buffers=5 ! video/x-raw,format=RGB,width=32,height=24 ! r.sink_1 "
+                    "r. ! fakesink name=sink"
+                )
+
+                buffers = []
+
+                def probe(pad, info):
+                    buffers.append(info.get_buffer())
+                    return Gst.PadProbeReturn.OK
+
+                sinkpad = pipeline.get_by_name("sink").get_static_pad("sink")
+                sinkpad.add_probe(Gst.PadProbeType.BUFFER, probe)
+
+                pipeline.set_state(Gst.State.PLAYING)
+                try:
+                    bus = pipeline.get_bus()
+                    msg = bus.timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+                    caps = sinkpad.get_current_caps().get_structure(0)
+                finally:
+                    pipeline.set_state(Gst.State.NULL)
+
+                self.assertEqual(msg.type, Gst.MessageType.EOS)
+                self.assertEqual((caps.get_int("width")[1], caps.get_int("height")[1]), (64, 48))
+                self.assertEqual(len(buffers), 5)
+
+                runner = pipeline.get_by_name("r")
+                self.assertEqual(runner.output_shapes, [(48, 64, 3)] * 5)
+
+                pts = [b.pts for b in buffers]
+                self.assertNotIn(Gst.CLOCK_TIME_NONE, pts)
+                self.assertEqual(pts, sorted(set(pts)))
+                self.assertTrue(all(b.duration == buffers[0].duration != Gst.CLOCK_TIME_NONE for b in buffers))
+                self.assertTrue(all(b.extract_dup(0, 3) == bytes([255] * 3) for b in buffers))
+
+
+@SkipIfNoModule("gi")
+class TestGstInPlaceStreamRunnerQos(unittest.TestCase):
+    def test_late_drops(self):
+        """
+        Test late drops are counted from the stats of the QoS messages the runner posts, and that QoS messages from
+        other elements are ignored.
+        """
+        from gi.repository import Gst
+
+        from monaistream.streamrunners.gstreamer_plugin import GstInPlaceStreamRunner
+
+        runner = GstInPlaceStreamRunner()
+        other = Gst.ElementFactory.make("identity")
+
+        for src, dropped in ((runner, 3), (other, 10), (runner, 4)):
+            msg = Gst.Message.new_qos(src, True, 0, 0, 0, Gst.SECOND // 30)
+            msg.set_qos_stats(Gst.Format.BUFFERS, 20, dropped)
+            runner.post_message(msg)
+
+        self.assertEqual(runner.skipped_frames, 4)
+        self.assertEqual(runner.processed_frames, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import unittest
+
+import numpy as np
+
+from tests.utils import SkipIfNoModule
+
+
+@SkipIfNoModule("gi")
+class TestWrapArrayInBuffer(unittest.TestCase):
+    def test_contents(self):
+        """
+        Test the wrapped buffer has the contents of the array.
+        """
+        from gi.repository import Gst
+        from monaistream.gstreamer.utils import wrap_array_in_buffer
+
+        array = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+        buffer = wrap_array_in_buffer(array)
+
+        self.assertEqual(buffer.get_size(), array.nbytes)
+
+        is_mapped, map_info = buffer.map(Gst.MapFlags.READ)
+        self.assertTrue(is_mapped)
+        self.assertEqual(bytes(map_info.data), array.tobytes())
+        buffer.unmap(map_info)
+
+    def test_release(self):
+        """
+        Test the wrapped array is kept alive by the buffer and released when the buffer is freed.
+        """
+        from monaistream.gstreamer import utils
+
+        num_wrapped = len(utils._WRAPPED_ARRAYS)
+        buffer = utils.wrap_array_in_buffer(np.zeros((8, 8, 3), dtype=np.uint8))
+        self.assertEqual(len(utils._WRAPPED_ARRAYS), num_wrapped + 1)
+
+        del buffer
+        gc.collect()
+        self.assertEqual(len(utils._WRAPPED_ARRAYS), num_wrapped)
+
+    def test_gpointer(self):
+        from gi.repository import Gst
+        from monaistream.gstreamer.utils import get_gpointer
+
+        self.assertIsInstance(get_gpointer(Gst.Buffer.new()), int)
+        self.assertIsNone(get_gpointer(object()))
+
+    def test_copy_without_gpointer(self):
+        """
+        Test the array is copied into a new buffer if the buffer's address isn't available.
+        """
+        from unittest import mock
+        from monaistream.gstreamer import utils
+
+        array = np.arange(12, dtype=np.uint8)
+        num_wrapped = len(utils._WRAPPED_ARRAYS)
+
+        with mock.patch.object(utils, "get_gpointer", return_value=None):
+            buffer = utils.wrap_array_in_buffer(array)
+
+        self.assertEqual(len(utils._WRAPPED_ARRAYS), num_wrapped)
+        self.assertEqual(buffer.extract_dup(0, buffer.get_size()), array.tobytes())
+
+
+@SkipIfNoModule("gi")
+class TestVideoGeometry(unittest.TestCase):
+    def test_packed_geometry(self):
+        """
+        Test the geometry of a 4 component format, whose rows need no padding.
+        """
+        from gi.repository import Gst
+        from monaistream.gstreamer.utils import get_video_geometry
+
+        geometry = get_video_geometry(Gst.Caps.from_string("video/x-raw,format=RGBA,width=5,height=4"))
+
+        self.assertEqual(geometry.shape, (4, 5, 4))
+        self.assertEqual(geometry.dtype, np.uint8)
+        self.assertEqual(geometry.strides, (20, 4, 1))
+        self.assertEqual(geometry.size, 80)
+
+    def test_padded_rows(self):
+        """
+        Test rows of a 3 component format are padded to a multiple of 4 bytes and mapped with the padded stride.
+        """
+        from gi.repository import Gst
+        from monaistream.gstreamer.utils import get_video_geometry, map_buffer_to_numpy
+
+        geometry = get_video_geometry(Gst.Caps.from_string("video/x-raw,format=RGB,width=5,height=4"))
+
+        self.assertEqual(geometry.strides, (16, 3, 1))
+        self.assertEqual(geometry.size, 64)
+
+        buffer = Gst.Buffer.new_wrapped(bytes(range(64)))
+
+        with map_buffer_to_numpy(buffer, Gst.MapFlags.READ, geometry) as array:
+            self.assertEqual(array.shape, (4, 5, 3))
+            self.assertEqual(array[1, 0, 0], 16)
+
+
+@SkipIfNoModule("gi")
+class TestColorChannels(unittest.TestCase):
+    def test_formats(self):
+        from monaistream.gstreamer.utils import get_color_channels
+
+        self.assertEqual(get_color_channels("RGB"), (0, 1, 2))
+        self.assertEqual(get_color_channels("BGRx"), (2, 1, 0))
+        self.assertEqual(get_color_channels("ARGB"), (1, 2, 3))
+        self.assertEqual(get_color_channels("GRAY8"), (0,))
+
+
+if __name__ == "__main__":
+    unittest.main()
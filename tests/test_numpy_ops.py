@@ -0,0 +1,254 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from monaistream.gstreamer.numpy_ops import (
+    FrameNormalizer,
+    LabelOverlay,
+    Roi,
+    find_content_roi,
+    resize_frame,
+    upscale_mask,
+)
+
+
+class TestRoi(unittest.TestCase):
+    def test_view(self):
+        """
+        Test the region is a view of the frame, so writes to it appear in the frame.
+        """
+        frame = np.zeros((10, 12, 3), np.uint8)
+        view = Roi(2, 3, 4, 5).view(frame)
+        view[...] = 7
+
+        self.assertEqual(view.shape, (5, 4, 3))
+        self.assertTrue(np.shares_memory(view, frame))
+        self.assertEqual(int(frame.sum()), 7 * 5 * 4 * 3)
+        self.assertEqual(frame[3, 2, 0], 7)
+        self.assertEqual(frame[2, 2, 0], 0)
+
+    def test_clamp(self):
+        self.assertEqual(Roi(8, 2, 10, 4).clamp(10, 12), Roi(8, 2, 4, 4))
+        self.assertEqual(Roi(0, 0, 0, 0).clamp(10, 12), Roi(0, 0, 12, 10))
+        self.assertEqual(Roi(20, 0, 5, 5).clamp(10, 12), Roi(0, 0, 12, 10))
+
+    def test_coordinates(self):
+        roi = Roi(10, 20, 50, 50)
+        boxes = np.array([[1, 2, 3, 4]])
+
+        self.assertEqual(roi.to_frame(boxes).tolist(), [[11, 22, 13, 24]])
+        self.assertEqual(roi.from_frame(roi.to_frame(boxes)).tolist(), boxes.tolist())
+        self.assertEqual(roi.to_frame((0.5, 1.5)).tolist(), [10.5, 21.5])
+
+
+class TestFindContentRoi(unittest.TestCase):
+    def test_bounds(self):
+        frame = np.zeros((100, 120, 3), np.uint8)
+        frame[10:61, 21:90, 1] = 200
+
+        roi = find_content_roi(frame, step=4)
+        region = roi.view(frame)
+
+        # the region covers all of the content and at most the step around it
+        self.assertEqual(int(region.astype(int).sum()), int(frame.astype(int).sum()))
+        self.assertTrue(7 <= roi.y <= 10 and 18 <= roi.x <= 21)
+        self.assertTrue(61 <= roi.y + roi.height <= 64 and 90 <= roi.x + roi.width <= 93)
+
+    def test_exact(self):
+        frame = np.zeros((50, 40), np.uint8)
+        frame[5:20, 7:30] = 100
+
+        self.assertEqual(find_content_roi(frame, step=1), Roi(7, 5, 23, 15))
+        self.assertEqual(find_content_roi(frame, step=1, margin=2), Roi(5, 3, 27, 19))
+
+    def test_black(self):
+        self.assertIsNone(find_content_roi(np.full((20, 20, 3), 10, np.uint8)))
+
+
+class TestFrameNormalizer(unittest.TestCase):
+    def test_values(self):
+        """
+        Test the output matches normalizing, reordering and transposing the frame step by step.
+        """
+        frame = np.random.default_rng(0).integers(0, 256, (6, 8, 3), dtype=np.uint8)
+        mean, std = (0.485, 0.456, 0.406), (0.229, 0.224, 0.225)
+        normalizer = FrameNormalizer(mean=mean, std=std, channels=(2, 1, 0))
+
+        out = normalizer(frame)
+        expected = ((frame[..., ::-1] / 255.0 - mean) / std).transpose(2, 0, 1)
+
+        self.assertEqual(out.shape, (3, 6, 8))
+        self.assertEqual(out.dtype, np.float32)
+        np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-5)
+
+    def test_channels_last(self):
+        frame = np.random.default_rng(1).integers(0, 256, (4, 5, 4), dtype=np.uint8)
+        normalizer = FrameNormalizer(scale=1.0, mean=10.0, channels=(0, 1, 2), channels_first=False)
+
+        out = normalizer(frame)
+
+        self.assertEqual(out.shape, (4, 5, 3))
+        np.testing.assert_allclose(out, frame[..., :3] - 10.0)
+
+    def test_gray(self):
+        out = FrameNormalizer(scale=2.0)(np.full((3, 4), 5, np.uint8))
+
+        self.assertEqual(out.shape, (1, 3, 4))
+        self.assertTrue(np.all(out == 10.0))
+
+    def test_reused_outputs(self):
+        """
+        Test outputs are reused after cycling through the reserved number of them.
+        """
+        normalizer = FrameNormalizer(num_outputs=2)
+        frames = [np.full((2, 2, 3), i, np.uint8) for i in range(3)]
+
+        first, second = normalizer(frames[0]), normalizer(frames[1])
+        self.assertFalse(np.shares_memory(first, second))
+        self.assertIs(normalizer(frames[2]), first)
+        self.assertAlmostEqual(float(second[0, 0, 0]), 1 / 255)
+
+        normalizer.reserve(3)
+        third = normalizer(frames[0])
+        self.assertFalse(np.shares_memory(third, first) or np.shares_memory(third, second))
+
+        # the least recently returned output is reused after growing, which is the second
+        self.assertIs(normalizer(frames[1]), second)
+
+    def test_cached_coefficients(self):
+        normalizer = FrameNormalizer(scale=1.0)
+        frame = np.full((2, 2, 3), 10, np.uint8)
+
+        self.assertTrue(np.all(normalizer(frame) == 10.0))
+        scales = normalizer._coefficients(3)[0]
+        self.assertIs(normalizer._coefficients(3)[0], scales)
+
+        normalizer.mean = 4.0
+        self.assertTrue(np.all(normalizer(frame) == 6.0))
+
+    def test_out(self):
+        frame = np.full((2, 3, 3), 255, np.uint8)
+        out = np.zeros((3, 2, 3), np.float32)
+
+        self.assertIs(FrameNormalizer()(frame, out=out), out)
+        self.assertTrue(np.allclose(out, 1.0))
+
+        with self.assertRaises(ValueError):
+            FrameNormalizer()(frame, out=np.zeros((2, 3, 3), np.float32))
+
+
+class TestResize(unittest.TestCase):
+    def test_bilinear(self):
+        """
+        Test bilinear resizing matches torch's interpolation with unaligned corners.
+        """
+        import torch
+
+        frame = np.random.default_rng(0).integers(0, 256, (60, 90, 3), dtype=np.uint8)
+        tensor = torch.from_numpy(frame).permute(2, 0, 1)[None].float()
+
+        for height, width in ((16, 24), (100, 200)):
+            out = resize_frame(frame, height, width)
+            expected = torch.nn.functional.interpolate(tensor, (height, width), mode="bilinear", align_corners=False)
+
+            self.assertEqual(out.shape, (height, width, 3))
+            self.assertEqual(out.dtype, np.uint8)
+            np.testing.assert_allclose(out, expected[0].permute(1, 2, 0).round().numpy(), atol=1)
+
+    def test_out(self):
+        frame = np.full((10, 10), 50, np.uint8)
+        out = np.zeros((5, 4), np.uint8)
+
+        self.assertIs(resize_frame(frame, 5, 4, out=out), out)
+        self.assertTrue(np.all(out == 50))
+
+    def test_upscale_mask(self):
+        """
+        Test masks are upscaled without introducing label values.
+        """
+        mask = np.random.default_rng(2).integers(0, 4, (16, 16), dtype=np.uint8)
+        upscaled = upscale_mask(mask, 64, 48)
+
+        self.assertEqual(upscaled.shape, (64, 48))
+        self.assertEqual(set(np.unique(upscaled)), set(np.unique(mask)))
+        self.assertTrue(np.array_equal(resize_frame(upscale_mask(mask, 64, 64), 16, 16, "nearest"), mask))
+
+    def test_invalid_method(self):
+        with self.assertRaises(ValueError):
+            resize_frame(np.zeros((4, 4)), 2, 2, method="cubic")
+
+
+class TestLabelOverlay(unittest.TestCase):
+    def test_blend(self):
+        """
+        Test labelled pixels are blended with their colours as in floating point, and others are left unchanged.
+        """
+        frame = np.random.default_rng(0).integers(0, 256, (30, 40, 3), dtype=np.uint8)
+        mask = np.zeros((30, 40), np.uint8)
+        mask[5:15, 10:30] = 1
+        mask[20:25, 2:8] = 2
+        colors = np.array([(0, 0, 0), (255, 0, 0), (0, 0, 255)], float)
+
+        blended = LabelOverlay(colors=colors[1:].astype(int).tolist(), opacity=0.5)(frame.copy(), mask)
+
+        labelled = mask > 0
+        expected = frame.astype(float)
+        expected[labelled] = expected[labelled] * 0.5 + colors[mask[labelled]] * 0.5
+
+        np.testing.assert_allclose(blended, expected, atol=1)
+        self.assertTrue(np.array_equal(blended[~labelled], frame[~labelled]))
+
+    def test_in_place(self):
+        frame = np.zeros((4, 4, 3), np.uint8)
+        self.assertIs(LabelOverlay()(frame, np.ones((4, 4), np.uint8)), frame)
+        self.assertTrue(frame.any())
+
+    def test_opacity_and_alpha(self):
+        frame = np.full((2, 3, 3), 100, np.uint8)
+        mask = np.array([[0, 1, 2], [1, 2, 0]], np.uint8)
+        overlay = LabelOverlay(colors=[(200, 200, 200), (0, 0, 0, 0)], opacity=1.0)
+
+        overlay(frame, mask)
+        self.assertEqual(frame[..., 0].tolist(), [[100, 200, 100], [200, 100, 100]])
+
+        overlay.opacity = 0.0
+        self.assertTrue(np.array_equal(overlay(np.full((2, 3, 3), 7, np.uint8), mask), np.full((2, 3, 3), 7)))
+
+    def test_channels(self):
+        """
+        Test colours are written to the positions of the red, green and blue components, leaving padding unchanged.
+        """
+        frame = np.zeros((2, 2, 4), np.uint8)
+        LabelOverlay(colors=[(10, 20, 30)], opacity=1.0, channels=(2, 1, 0))(frame, np.ones((2, 2), np.uint8))
+        self.assertEqual(frame[0, 0].tolist(), [30, 20, 10, 0])
+
+        gray = np.zeros((2, 2), np.uint8)
+        LabelOverlay(colors=[(255, 255, 255)], opacity=1.0, channels=(0,))(gray, np.ones((2, 2, 1), np.uint8))
+        self.assertTrue(np.all(gray == 255))
+
+        with self.assertRaises(ValueError):
+            LabelOverlay(channels=(0, 2))
+
+    def test_upscaled_mask(self):
+        frame = np.zeros((8, 8, 3), np.uint8)
+        mask = np.zeros((2, 2), np.uint8)
+        mask[0, 0] = 1
+
+        LabelOverlay(opacity=1.0)(frame, mask)
+        self.assertTrue(frame[:4, :4].all(axis=2).all())
+        self.assertFalse(frame[4:].any() or frame[:, 4:].any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -50,5 +50,314 @@ class TestNumpyInplaceTransform(unittest.TestCase):
             self.assertTrue(os.path.isfile(os.path.join(td, "img.jpg")))
 
 
+@SkipIfNoModule("gi")
+class TestNumpyRoiTransform(unittest.TestCase):
+    def test_roi_property(self):
+        """
+        Test do_op is given a view of the region set through the properties.
+        """
+        import numpy as np
+        from monaistream.gstreamer import NumpyRoiTransform
+
+        transform = NumpyRoiTransform()
+        transform.set_property("roi-x", 2)
+        transform.set_property("roi-width", 4)
+        transform.set_property("roi-height", 3)
+
+        frame = np.zeros((8, 10, 3), np.uint8)
+        roi = transform.current_roi(frame)
+        roi.view(frame)[...] = 1
+
+        self.assertEqual(transform.get_property("roi-x"), 2)
+        self.assertEqual(int(frame.sum()), 4 * 3 * 3)
+
+    def test_auto_roi(self):
+        import numpy as np
+        from monaistream.gstreamer import NumpyRoiTransform
+
+        transform = NumpyRoiTransform()
+        transform.set_property("auto-roi", True)
+
+        frame = np.zeros((40, 40, 3), np.uint8)
+        frame[8:32, 8:32] = 255
+        roi = transform.current_roi(frame)
+
+        self.assertEqual(int(roi.view(frame).astype(int).sum()), int(frame.astype(int).sum()))
+        self.assertLess(roi.width * roi.height, 40 * 40)
+
+    def test_auto_roi_alpha(self):
+        """
+        Test an opaque alpha channel isn't mistaken for content.
+        """
+        import numpy as np
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyRoiTransform
+
+        transform = NumpyRoiTransform()
+        transform.set_property("auto-roi", True)
+        caps = Gst.Caps.from_string("video/x-raw,format=BGRA,width=40,height=40")
+        transform.do_set_caps(caps, caps)
+
+        frame = np.zeros((40, 40, 4), np.uint8)
+        frame[..., 3] = 255
+        frame[8:32, 8:32, :3] = 200
+        roi = transform.current_roi(frame)
+
+        self.assertLess(roi.width * roi.height, 40 * 40)
+
+
+    def _run_letterboxed(self, element):
+        """
+        Push a 40x30 RGB frame with black borders around a grey 24x14 region at (8, 6) through `element` in a pipeline,
+        returning the output sample.
+        """
+        import numpy as np
+        from gi.repository import Gst
+
+        pipeline = Gst.parse_launch(
+            "appsrc name=src caps=video/x-raw,format=RGB,width=40,height=30,framerate=1/1 format=time "
+            f"! {element} auto-roi=true ! appsink name=sink"
+        )
+
+        frame = np.zeros((30, 40, 3), np.uint8)
+        frame[6:20, 8:32] = 100
+        buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+        buffer.pts = 0
+        buffer.duration = Gst.SECOND
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            src = pipeline.get_by_name("src")
+            src.emit("push-buffer", buffer)
+            src.emit("end-of-stream")
+            sample = pipeline.get_by_name("sink").emit("pull-sample")
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        self.assertIsNotNone(sample)
+        return sample
+
+    def test_pipeline(self):
+        """
+        Test the transform can be used by name in a pipeline and passes frames through with their caps unchanged.
+        """
+        import numpy as np
+        from monaistream.gstreamer import NumpyRoiTransform  # noqa: F401 importing registers the element
+
+        sample = self._run_letterboxed("numpyroitransform")
+        structure = sample.get_caps().get_structure(0)
+        buffer = sample.get_buffer()
+        out = np.frombuffer(buffer.extract_dup(0, buffer.get_size()), np.uint8)
+
+        self.assertEqual(structure.get_value("format"), "RGB")
+        self.assertEqual((structure.get_value("width"), structure.get_value("height")), (40, 30))
+        self.assertEqual(int(out.astype(int).sum()), 24 * 14 * 3 * 100)
+
+    def test_pipeline_crop(self):
+        """
+        Test do_op is only given the content of a letterboxed frame in a pipeline, the borders being left untouched.
+        """
+        import numpy as np
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyRoiTransform
+
+        class InvertRoiTransform(NumpyRoiTransform):
+            def do_op(self, roi_frame, roi):
+                roi_frame[...] = 255 - roi_frame
+
+        if Gst.ElementFactory.find("invertroitest") is None:
+            Gst.Element.register(None, "invertroitest", Gst.Rank.NONE, InvertRoiTransform)
+
+        buffer = self._run_letterboxed("invertroitest").get_buffer()
+        out = np.frombuffer(buffer.extract_dup(0, buffer.get_size()), np.uint8).reshape(30, 40, 3)
+
+        # the automatic region is grown by the sampling step of 4 less 1 to cover the rows and columns skipped
+        self.assertTrue(np.all(out[6:20, 8:32] == 155))
+        self.assertFalse(out[:5].any() or out[20:].any() or out[:, :5].any() or out[:, 32:].any())
+
+
+@SkipIfNoModule("gi")
+class TestNumpyNormalizeTransform(unittest.TestCase):
+    def test_properties(self):
+        from monaistream.gstreamer import NumpyNormalizeTransform
+
+        transform = NumpyNormalizeTransform()
+        transform.set_property("mean", "0.5,0.5,0.5")
+        transform.set_property("channels", "2,1,0")
+
+        self.assertEqual(transform.get_property("mean"), "0.5,0.5,0.5")
+        self.assertEqual(transform.normalizer.mean, [0.5, 0.5, 0.5])
+        self.assertEqual(transform.normalizer.channels, (2, 1, 0))
+
+    def test_pipeline(self):
+        """
+        Test the transform can be used by name in a pipeline and writes normalized (C, H, W) tensors.
+        """
+        import numpy as np
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyNormalizeTransform  # noqa: F401 importing registers the element
+
+        pipeline = Gst.parse_launch(
+            "videotestsrc num-buffers=1 pattern=white ! video/x-raw,format=RGB,width=8,height=4 "
+            "! numpynormalizetransform name=normalize ! appsink name=sink"
+        )
+        normalize = pipeline.get_by_name("normalize")
+        normalize.set_property("mean", "0.1,0.2,0.3")
+        normalize.set_property("std", "0.5,0.5,0.5")
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            sample = pipeline.get_by_name("sink").emit("pull-sample")
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        self.assertIsNotNone(sample)
+        structure = sample.get_caps().get_structure(0)
+        self.assertEqual(structure.get_name(), "other/tensor")
+        self.assertEqual(structure.get_value("dimension"), "8:4:3")
+
+        buffer = sample.get_buffer()
+        out = np.frombuffer(buffer.extract_dup(0, buffer.get_size()), np.float32).reshape(3, 4, 8)
+        expected = (1.0 - np.array([0.1, 0.2, 0.3])) / 0.5
+        np.testing.assert_allclose(out, np.broadcast_to(expected[:, None, None], out.shape), rtol=1e-5)
+
+    def test_change_layout(self):
+        """
+        Test changing the layout while playing renegotiates the output caps.
+        """
+        import numpy as np
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyNormalizeTransform  # noqa: F401 importing registers the element
+
+        pipeline = Gst.parse_launch(
+            "appsrc name=src caps=video/x-raw,format=RGB,width=8,height=4,framerate=1/1 format=time "
+            "! numpynormalizetransform name=normalize ! appsink name=sink sync=false"
+        )
+        src, sink = pipeline.get_by_name("src"), pipeline.get_by_name("sink")
+        frame = np.arange(96, dtype=np.uint8).reshape(4, 8, 3)
+
+        def _push_pull(pts):
+            buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+            buffer.pts = pts * Gst.SECOND
+            buffer.duration = Gst.SECOND
+            src.emit("push-buffer", buffer)
+            return sink.emit("pull-sample")
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            first = _push_pull(0)
+            pipeline.get_by_name("normalize").set_property("channels-first", False)
+            second = _push_pull(1)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        self.assertEqual(first.get_caps().get_structure(0).get_value("dimension"), "8:4:3")
+        self.assertEqual(second.get_caps().get_structure(0).get_value("dimension"), "3:8:4")
+
+        buffer = second.get_buffer()
+        out = np.frombuffer(buffer.extract_dup(0, buffer.get_size()), np.float32).reshape(4, 8, 3)
+        np.testing.assert_allclose(out, frame / 255, rtol=1e-5)
+
+    def test_tensor_caps(self):
+        from monaistream.gstreamer import get_tensor_caps
+
+        caps = get_tensor_caps((3, 224, 256))
+        self.assertEqual(caps.get_structure(0).get_value("dimension"), "256:224:3")
+
+
+@SkipIfNoModule("gi")
+class TestNumpyResizeTransform(unittest.TestCase):
+    def test_transform_caps(self):
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyResizeTransform
+
+        transform = NumpyResizeTransform()
+        transform.set_property("width", 64)
+        transform.set_property("method", "nearest")
+
+        caps = Gst.Caps.from_string("video/x-raw,format=RGB,width=320,height=240")
+        out = transform.do_transform_caps(Gst.PadDirection.SINK, caps, None).get_structure(0)
+
+        self.assertEqual((out.get_value("width"), out.get_value("height")), (64, 256))
+
+    def test_pipeline(self):
+        """
+        Test the transform can be used by name in a pipeline and downscales frames to the size set.
+        """
+        import numpy as np
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyResizeTransform, resize_frame  # noqa: F401 importing registers it
+
+        pipeline = Gst.parse_launch(
+            "appsrc name=src caps=video/x-raw,format=RGB,width=16,height=8,framerate=1/1 format=time "
+            "! numpyresizetransform width=8 height=4 method=nearest ! appsink name=sink"
+        )
+
+        # 2x2 blocks of distinct values so that every output pixel comes from a known block
+        frame = np.repeat(np.repeat(np.arange(32, dtype=np.uint8).reshape(4, 8), 2, 0), 2, 1)
+        frame = np.stack([frame, frame + 100, frame + 200], axis=2)
+        buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+        buffer.pts = 0
+        buffer.duration = Gst.SECOND
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            src = pipeline.get_by_name("src")
+            src.emit("push-buffer", buffer)
+            src.emit("end-of-stream")
+            sample = pipeline.get_by_name("sink").emit("pull-sample")
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        self.assertIsNotNone(sample)
+        structure = sample.get_caps().get_structure(0)
+        self.assertEqual((structure.get_value("width"), structure.get_value("height")), (8, 4))
+
+        out_buffer = sample.get_buffer()
+        out = np.frombuffer(out_buffer.extract_dup(0, out_buffer.get_size()), np.uint8).reshape(4, 8, 3)
+
+        np.testing.assert_array_equal(out, resize_frame(frame, 4, 8, "nearest"))
+        self.assertEqual(out[0, 0].tolist(), [0, 100, 200])
+        self.assertEqual(out[1, 2].tolist(), [10, 110, 210])
+        self.assertEqual(out[3, 7].tolist(), [31, 131, 231])
+
+    def test_change_size(self):
+        """
+        Test changing the size while playing renegotiates the output caps.
+        """
+        import numpy as np
+        from gi.repository import Gst
+        from monaistream.gstreamer import NumpyResizeTransform  # noqa: F401 importing registers the element
+
+        pipeline = Gst.parse_launch(
+            "appsrc name=src caps=video/x-raw,format=RGB,width=16,height=8,framerate=1/1 format=time "
+            "! numpyresizetransform name=resize width=8 height=4 ! appsink name=sink sync=false"
+        )
+        src, sink = pipeline.get_by_name("src"), pipeline.get_by_name("sink")
+        frame = np.zeros((8, 16, 3), np.uint8)
+
+        def _push_pull(pts):
+            buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+            buffer.pts = pts * Gst.SECOND
+            buffer.duration = Gst.SECOND
+            src.emit("push-buffer", buffer)
+            sample = sink.emit("pull-sample")
+            structure = sample.get_caps().get_structure(0)
+            return structure.get_value("width"), structure.get_value("height"), sample.get_buffer().get_size()
+
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            first = _push_pull(0)
+            resize = pipeline.get_by_name("resize")
+            resize.set_property("width", 4)
+            resize.set_property("height", 2)
+            second = _push_pull(1)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+        self.assertEqual(first, (8, 4, 8 * 4 * 3))
+        self.assertEqual(second, (4, 2, 4 * 2 * 3))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pstats
+import tempfile
+import unittest
+
+from monaistream.streamrunners.profiling import FrameProfiler
+
+
+def _work():
+    return sum(i * i for i in range(1000))
+
+
+class TestFrameProfiler(unittest.TestCase):
+    def test_profile_frames(self):
+        """
+        Test the stats are written once the requested number of frames have been profiled.
+        """
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "frames.prof")
+            profiler = FrameProfiler()
+
+            with profiler.frame():  # not active so nothing is profiled
+                _work()
+
+            profiler.start(2, path)
+            self.assertTrue(profiler.active)
+
+            for remaining in (1, 0):
+                with profiler.frame():
+                    _work()
+                self.assertEqual(profiler.remaining, remaining)
+
+            self.assertFalse(profiler.active)
+            stats = pstats.Stats(path)
+            self.assertTrue(any(func[2] == "_work" for func in stats.stats))
+
+    def test_stop(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            profiler = FrameProfiler(os.path.join(tempdir, "stopped.prof"))
+            profiler.start(10)
+
+            with profiler.frame():
+                _work()
+            profiler.stop()
+
+            self.assertFalse(profiler.active)
+            self.assertTrue(os.path.isfile(profiler.path))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            FrameProfiler().start(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
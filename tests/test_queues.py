@@ -0,0 +1,218 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+from queue import Empty
+
+from monaistream.streamrunners.queues import (
+    BlockingFrameQueue,
+    DropNewestFrameQueue,
+    DropOldestFrameQueue,
+    FrameBatcher,
+    LatestFrameQueue,
+    QueuePolicy,
+    TimestampMatcher,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueuePolicy(unittest.TestCase):
+    def test_defaults(self):
+        policy = QueuePolicy()
+        self.assertFalse(policy.batching)
+
+    def test_create_queue(self):
+        self.assertIsNone(QueuePolicy().create_queue())
+        self.assertIsInstance(QueuePolicy(mode="latest-only").create_queue(), LatestFrameQueue)
+
+        queue = QueuePolicy(mode="drop-oldest", capacity=3).create_queue()
+        self.assertIsInstance(queue, DropOldestFrameQueue)
+        self.assertEqual(queue.capacity, 3)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            QueuePolicy(mode="unknown")
+        with self.assertRaises(ValueError):
+            QueuePolicy(capacity=0)
+        with self.assertRaises(ValueError):
+            QueuePolicy(max_batch_size=0)
+        with self.assertRaises(ValueError):
+            QueuePolicy(max_batch_size=2, max_wait_ms=-1)
+        with self.assertRaises(ValueError):
+            QueuePolicy(sync_tolerance_ms=-1)
+
+    def test_create_matcher(self):
+        self.assertIsNone(QueuePolicy().create_matcher(2))
+
+        matcher = QueuePolicy(sync_tolerance_ms=5, sync_max_age_ms=200).create_matcher(2)
+        self.assertEqual(matcher.tolerance, 5_000_000)
+        self.assertEqual(matcher.max_age, 200_000_000)
+
+
+class TestFrameBatcher(unittest.TestCase):
+    def test_full_batch(self):
+        """
+        Test a batch is returned once it has max_batch_size items.
+        """
+        batcher = FrameBatcher(3)
+
+        self.assertIsNone(batcher.add(0))
+        self.assertIsNone(batcher.add(1))
+        self.assertEqual(batcher.add(2), [0, 1, 2])
+        self.assertEqual(len(batcher), 0)
+        self.assertIsNone(batcher.deadline)
+
+    def test_max_wait(self):
+        """
+        Test an incomplete batch expires once its first item has waited max_wait_ms.
+        """
+        clock = FakeClock()
+        batcher = FrameBatcher(4, max_wait_ms=50, clock=clock)
+
+        self.assertIsNone(batcher.add(0))
+        self.assertAlmostEqual(batcher.deadline, 0.05)
+
+        clock.now = 0.04
+        self.assertFalse(batcher.expired())
+        self.assertIsNone(batcher.add(1))
+
+        clock.now = 0.05
+        self.assertTrue(batcher.expired())
+        self.assertEqual(batcher.take(), [0, 1])
+
+        # an arrival after the deadline completes the batch
+        batcher.add(2)
+        clock.now = 0.2
+        self.assertEqual(batcher.add(3), [2, 3])
+
+
+class TestTimestampMatcher(unittest.TestCase):
+    def test_different_rates(self):
+        """
+        Test a 30fps input paired with a 10fps input only produces sets at 10fps, each buffer being used at most once.
+        """
+        matcher = TimestampMatcher(2, tolerance=5, max_age=1000)
+        matches = list()
+
+        for t in range(0, 300, 10):
+            if t % 30 == 0:
+                matches += matcher.add(1, t + 1, f"b{t}")
+            matches += matcher.add(0, t, f"a{t}")
+
+        self.assertEqual(matches, [[f"a{t}", f"b{t}"] for t in range(0, 300, 30)])
+        self.assertEqual(matcher.matched, 10)
+
+    def test_discard_unmatchable(self):
+        """
+        Test buffers too old to match the other input are dropped rather than paired with a later buffer.
+        """
+        matcher = TimestampMatcher(2, tolerance=5, max_age=1000)
+
+        self.assertEqual(matcher.add(0, 0, "a0"), [])
+        self.assertEqual(matcher.add(0, 100, "a100"), [])
+        self.assertEqual(matcher.add(1, 50, "b50"), [])
+        self.assertEqual(matcher.dropped, 2)
+        self.assertEqual(matcher.add(1, 98, "b98"), [["a100", "b98"]])
+
+    def test_max_age(self):
+        """
+        Test buffers waiting for a stalled input are dropped once older than max_age.
+        """
+        matcher = TimestampMatcher(2, tolerance=5, max_age=100)
+
+        for t in range(0, 500, 10):
+            matcher.add(0, t, t)
+
+        self.assertEqual(matcher.dropped, 39)
+        self.assertEqual(matcher.add(1, 490, "b"), [[490, "b"]])
+
+
+class TestFrameQueues(unittest.TestCase):
+    def _drain(self, queue):
+        items = list()
+        while len(queue):
+            items.append(queue.get())
+            queue.task_done()
+        return items
+
+    def test_drop_oldest(self):
+        queue = DropOldestFrameQueue(2)
+        for i in range(5):
+            self.assertTrue(queue.put(i))
+
+        self.assertEqual(queue.dropped, 3)
+        self.assertEqual(self._drain(queue), [3, 4])
+        self.assertTrue(queue.join(0))
+
+    def test_drop_newest(self):
+        queue = DropNewestFrameQueue(2)
+        accepted = [queue.put(i) for i in range(5)]
+
+        self.assertEqual(accepted, [True, True, False, False, False])
+        self.assertEqual(queue.dropped, 3)
+        self.assertEqual(self._drain(queue), [0, 1])
+
+    def test_latest_only(self):
+        queue = LatestFrameQueue()
+        for i in range(5):
+            queue.put(i)
+
+        self.assertEqual(queue.dropped, 4)
+        self.assertEqual(self._drain(queue), [4])
+
+    def test_blocking(self):
+        """
+        Test a put into a full blocking queue waits for room and only drops after timing out.
+        """
+        queue = BlockingFrameQueue(1)
+        queue.put(0)
+
+        self.assertFalse(queue.put(1, timeout=0.01))
+        self.assertEqual(queue.dropped, 1)
+
+        consumer = threading.Timer(0.05, queue.get)
+        consumer.start()
+        self.assertTrue(queue.put(2, timeout=5))
+        consumer.join()
+
+        self.assertEqual(queue.get(), 2)
+
+    def test_get_timeout_and_close(self):
+        queue = BlockingFrameQueue(1)
+
+        with self.assertRaises(Empty):
+            queue.get(timeout=0.01)
+
+        queue.close()
+        self.assertIsNone(queue.get())
+        self.assertFalse(queue.put(0))
+
+    def test_clear(self):
+        queue = DropOldestFrameQueue(4)
+        queue.put(0)
+        queue.put(1)
+        queue.clear()
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.dropped, 0)
+        self.assertTrue(queue.join(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
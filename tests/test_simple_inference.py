@@ -0,0 +1,125 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from ignite.engine import Events
+from monai.inferers import SimpleInferer
+
+from monaistream.simple_inference import InferenceEngine, SimpleInferenceEngine
+
+
+class _Failing(torch.nn.Module):
+    def forward(self, x):
+        raise ValueError("bad frame")
+
+
+class TestInferenceEngineStreaming(unittest.TestCase):
+    def test_streaming(self):
+        """
+        Test submitted frames get their own predictions, from a single engine run with per-iteration events only.
+        """
+        engine = InferenceEngine(network=torch.nn.Identity(), device="cpu")
+        events = []
+        engine.add_event_handler(Events.STARTED, lambda e: events.append("started"))
+        engine.add_event_handler(Events.ITERATION_COMPLETED, lambda e: events.append("iteration"))
+
+        engine.start_streaming()
+        futures = [engine.submit(torch.full((1, 4, 4), float(i))) for i in range(5)]
+        results = [f.result(timeout=10) for f in futures]
+        engine.stop_streaming(timeout=10)
+
+        self.assertFalse(engine.is_streaming)
+        self.assertEqual([float(r[0, 0]) for r in results], [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(events, ["started"] + ["iteration"] * 5)
+
+        # the engine can still be called per frame afterwards
+        self.assertEqual(float(engine(torch.full((1, 4, 4), 7.0))[0, 0]), 7.0)
+
+    def test_concurrent_submit(self):
+        """
+        Test frames submitted from several threads each get the prediction for their own frame.
+        """
+        engine = InferenceEngine(network=torch.nn.Identity(), device="cpu")
+        engine.start_streaming(buffer_size=2, timeout=10)
+
+        def submit_all(start):
+            return [(i, engine.submit(torch.full((1, 4, 4), float(i)))) for i in range(start, start + 25)]
+
+        with ThreadPoolExecutor(4) as pool:
+            submitted = [pair for pairs in pool.map(submit_all, range(0, 100, 25)) for pair in pairs]
+
+        results = {i: float(f.result(timeout=10)[0, 0]) for i, f in submitted}
+        engine.stop_streaming(timeout=10)
+
+        self.assertEqual(results, {i: float(i) for i in range(100)})
+
+    def test_not_streaming(self):
+        engine = InferenceEngine(network=torch.nn.Identity(), device="cpu")
+        with self.assertRaises(RuntimeError):
+            engine.submit(torch.zeros(1, 4, 4))
+
+    def test_failure(self):
+        engine = InferenceEngine(network=_Failing(), device="cpu")
+        engine.start_streaming()
+        future = engine.submit(torch.zeros(1, 4, 4))
+
+        with self.assertRaises(ValueError):
+            future.result(timeout=10)
+
+        engine.stop_streaming(timeout=10)
+        self.assertFalse(engine.is_streaming)
+
+
+class TestSimpleInferenceEngineBatches(unittest.TestCase):
+    def test_infer_batch(self):
+        """
+        Test a batch gives the same outputs as inferring its frames one at a time.
+        """
+        network = torch.nn.Conv2d(1, 2, 3, padding=1)
+        engine = SimpleInferenceEngine(SimpleInferer(), network, preprocess=lambda x: x * 2, postprocess=torch.sigmoid)
+        frames = [torch.rand(1, 8, 8) for _ in range(3)]
+
+        outputs = engine.infer_batch(frames)
+
+        self.assertEqual(len(outputs), 3)
+        for frame, output in zip(frames, outputs):
+            with torch.no_grad():
+                expected = engine(frame[None])[0]
+            torch.testing.assert_close(output, expected)
+
+    def test_reused_inputs(self):
+        """
+        Test the input tensor is reused between batches and outputs aren't overwritten by later batches.
+        """
+        engine = SimpleInferenceEngine(SimpleInferer(), torch.nn.Identity(), batched_preprocess=True)
+
+        first = engine.infer_batch([torch.full((1, 2, 2), float(i)) for i in range(4)])
+        inputs = engine._inputs
+        second = engine.infer_batch([torch.full((1, 2, 2), 9.0) for _ in range(2)])
+
+        self.assertIs(engine._inputs, inputs)
+        self.assertEqual([float(o[0, 0, 0]) for o in first], [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual([float(o[0, 0, 0]) for o in second], [9.0, 9.0])
+
+    def test_stream(self):
+        engine = SimpleInferenceEngine(SimpleInferer(), torch.nn.Identity())
+        frames = (torch.full((1, 2, 2), float(i)) for i in range(5))
+
+        outputs = list(engine.stream(frames, batch_size=2))
+
+        self.assertEqual([float(o[0, 0, 0]) for o in outputs], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
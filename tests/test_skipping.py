@@ -0,0 +1,137 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from monaistream.streamrunners.skipping import ChangeDetector, QosController
+
+
+def _frame(value, noise=0, seed=0):
+    frame = np.full((64, 80, 3), value, np.int16)
+    frame += np.random.default_rng(seed).integers(-noise, noise + 1, frame.shape, dtype=np.int16)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+class TestChangeDetector(unittest.TestCase):
+    def test_mad(self):
+        detector = ChangeDetector(threshold=4.0)
+
+        self.assertTrue(detector.changed([_frame(100)]))
+        self.assertFalse(detector.changed([_frame(100, noise=2, seed=1)]))
+        self.assertFalse(detector.changed([_frame(103)]))
+        self.assertTrue(detector.changed([_frame(110)]))
+        self.assertEqual((detector.processed, detector.skipped), (2, 2))
+
+    def test_compares_to_last_processed(self):
+        """
+        Test a slow drift is detected since frames are compared to the last processed frame rather than the last frame.
+        """
+        detector = ChangeDetector(threshold=4.0)
+        decisions = [detector.changed([_frame(100 + i)]) for i in range(10)]
+
+        self.assertEqual(decisions, [True, False, False, False, False, True, False, False, False, False])
+
+    def test_hash(self):
+        detector = ChangeDetector(method="hash")
+        frame = _frame(0)
+        frame[:, 40:] = 200
+
+        self.assertTrue(detector.changed([frame]))
+        # a change in brightness leaves the hash unchanged
+        self.assertFalse(detector.changed([np.clip(frame.astype(np.int16) + 30, 0, 255).astype(np.uint8)]))
+        self.assertTrue(detector.changed([frame[:, ::-1]]))
+
+    def test_multiple_inputs(self):
+        detector = ChangeDetector()
+
+        self.assertTrue(detector.changed([_frame(100), _frame(50)]))
+        self.assertFalse(detector.changed([_frame(100), _frame(50)]))
+        self.assertTrue(detector.changed([_frame(100), _frame(150)]))
+
+    def test_force_and_max_skip(self):
+        detector = ChangeDetector(max_skip=2)
+
+        decisions = [detector.changed([_frame(100)]) for _ in range(6)]
+        self.assertEqual(decisions, [True, False, False, True, False, False])
+
+        self.assertTrue(detector.changed([_frame(100)], force=True))
+        detector.reset()
+        self.assertTrue(detector.changed([_frame(100)]))
+
+    def test_shape_change(self):
+        detector = ChangeDetector()
+
+        self.assertTrue(detector.changed([_frame(100)]))
+        self.assertTrue(detector.changed([np.full((32, 32, 3), 100, np.uint8)]))
+
+    def test_invalid_method(self):
+        with self.assertRaises(ValueError):
+            ChangeDetector(method="ssim")
+
+
+class TestQosController(unittest.TestCase):
+    def test_keeping_up(self):
+        qos = QosController()
+        qos.record(0.01)
+
+        self.assertTrue(all(qos.should_process(1 / 30) for _ in range(10)))
+        self.assertEqual((qos.processed, qos.skipped), (10, 0))
+
+    def test_slow_op_not_late(self):
+        """
+        Test a slow do_op doesn't skip frames unless downstream reports lateness, eg. when reading from a file.
+        """
+        qos = QosController()
+        qos.record(0.1)
+
+        self.assertTrue(all(qos.should_process(0.04) for _ in range(10)))
+
+        qos.update_proportion(1.0, jitter=-1)
+        self.assertTrue(all(qos.should_process(0.04) for _ in range(10)))
+
+    def test_slow_op(self):
+        """
+        Test a fraction of frames matching the speed of do_op is processed, spread evenly, once downstream is late.
+        """
+        qos = QosController()
+        qos.record(0.1)
+        qos.update_proportion(1.0, jitter=1)
+
+        decisions = [qos.should_process(0.04) for _ in range(100)]
+
+        self.assertAlmostEqual(qos.load(0.04), 2.5)
+        self.assertTrue(decisions[0])
+        self.assertFalse(any(a and b for a, b in zip(decisions, decisions[1:])))
+        self.assertEqual(qos.processed, 40)
+        self.assertEqual(qos.processed + qos.skipped, 100)
+
+    def test_proportion(self):
+        qos = QosController(smoothing=1.0)
+        qos.update_proportion(2.0)
+
+        decisions = [qos.should_process() for _ in range(4)]
+        self.assertEqual(decisions, [True, False, True, False])
+
+        qos.update_proportion(0.8)
+        self.assertTrue(all(qos.should_process() for _ in range(4)))
+
+    def test_average(self):
+        qos = QosController(smoothing=0.5)
+        qos.record(0.1)
+        qos.record(0.2)
+
+        self.assertAlmostEqual(qos.average_time, 0.15)
+
+
+if __name__ == "__main__":
+    unittest.main()
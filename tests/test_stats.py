@@ -0,0 +1,83 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+
+from monaistream.streamrunners.stats import LatencyHistogram, LatencyStats, StatsDumper
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_record(self):
+        histogram = LatencyHistogram(bounds=(0.001, 0.01, 0.1))
+        for duration in (0.0005, 0.002, 0.003, 0.05, 0.5):
+            histogram.record(duration)
+
+        result = histogram.to_dict()
+
+        self.assertEqual(result["count"], 5)
+        self.assertEqual(result["counts"], [1, 2, 1, 1])
+        self.assertAlmostEqual(result["min_ms"], 0.5)
+        self.assertAlmostEqual(result["max_ms"], 500)
+        self.assertAlmostEqual(result["mean_ms"], 111.1)
+
+    def test_percentile(self):
+        """
+        Test percentiles are estimated by the upper bound of their bucket, clamped to the largest duration.
+        """
+        histogram = LatencyHistogram(bounds=(0.001, 0.01, 0.1))
+        self.assertIsNone(histogram.percentile(50))
+
+        for _ in range(98):
+            histogram.record(0.005)
+        histogram.record(0.05)
+        histogram.record(0.02)
+
+        self.assertEqual(histogram.percentile(50), 0.01)
+        self.assertEqual(histogram.percentile(99), 0.05)
+        self.assertEqual(histogram.percentile(100), 0.05)
+
+
+class TestLatencyStats(unittest.TestCase):
+    def test_snapshot(self):
+        stats = LatencyStats()
+        stats.record("runner", "do_op", 0.01)
+        stats.record("runner", "pad:src_0", 0.02)
+        stats.record("decoder", "pad:src", 0.001)
+
+        snapshot = stats.snapshot()
+
+        self.assertEqual(sorted(snapshot), ["decoder", "runner"])
+        self.assertEqual(sorted(snapshot["runner"]), ["do_op", "pad:src_0"])
+        self.assertEqual(snapshot["runner"]["do_op"]["count"], 1)
+        self.assertIs(stats.histogram("runner", "do_op"), stats.histogram("runner", "do_op"))
+
+    def test_dump(self):
+        stats = LatencyStats()
+        stats.record("runner", "do_op", 0.01)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "stats.json")
+            dumper = StatsDumper(path, stats, interval=60)
+            dumper.start()
+            dumper.stop()  # writes a final snapshot
+
+            with open(path) as f:
+                result = json.load(f)
+
+            self.assertEqual(result["elements"]["runner"]["do_op"]["count"], 1)
+            self.assertEqual(os.listdir(tempdir), ["stats.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import warnings
+
+import numpy as np
+import torch
+
+from monaistream.streamrunners.tensors import TensorFormat, TensorRing
+
+
+def _read_only_frame(shape=(4, 5, 3)):
+    frame = np.arange(np.prod(shape), dtype=np.uint8).reshape(shape)
+    frame.flags.writeable = False
+    return frame
+
+
+class TestTensorRing(unittest.TestCase):
+    def test_copy(self):
+        """
+        Test frames are copied into the ring's tensors, which are reused once every tensor has been used.
+        """
+        ring = TensorRing((4, 5, 3), np.uint8, 2)
+        frame = _read_only_frame()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            tensors = [ring.put(frame) for _ in range(3)]
+
+        self.assertEqual(tensors[0].dtype, torch.uint8)
+        np.testing.assert_array_equal(tensors[0].numpy(), frame)
+        self.assertFalse(np.shares_memory(tensors[0].numpy(), frame))
+        self.assertIsNot(tensors[0], tensors[1])
+        self.assertIs(tensors[0], tensors[2])
+        self.assertTrue(ring.owns(tensors[1]))
+
+    def test_convert(self):
+        """
+        Test HWC uint8 frames are converted to scaled CHW float32 tensors.
+        """
+        ring = TensorRing((4, 5, 3), np.uint8, 2, TensorFormat(torch.float32, channels_first=True, scale=1 / 255))
+        frame = _read_only_frame()
+
+        tensor = ring.put(frame)
+
+        self.assertEqual(tensor.shape, (3, 4, 5))
+        self.assertEqual(tensor.dtype, torch.float32)
+        self.assertTrue(tensor.is_contiguous())
+        np.testing.assert_allclose(tensor.numpy(), frame.transpose(2, 0, 1) / 255, rtol=1e-6)
+
+    def test_alias(self):
+        """
+        Test frames are aliased rather than copied only if they need no conversion.
+        """
+        frame = _read_only_frame()
+
+        ring = TensorRing((4, 5, 3), np.uint8, 2, TensorFormat(alias=True))
+        tensor = ring.put(frame)
+        self.assertTrue(np.shares_memory(tensor.numpy(), frame))
+        self.assertFalse(ring.owns(tensor))
+
+        ring = TensorRing((4, 5, 3), np.uint8, 2, TensorFormat(torch.float32, alias=True))
+        self.assertTrue(ring.owns(ring.put(frame)))
+
+    def test_shape_mismatch(self):
+        ring = TensorRing((4, 5, 3), np.uint8, 2)
+
+        with self.assertRaises(ValueError):
+            ring.put(np.zeros((5, 4, 3), np.uint8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,272 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import threading
+import time
+import unittest
+from queue import Empty, Full
+
+import numpy as np
+import torch
+
+from monaistream.threadsafe import IterableBufferDataset, SharedBufferDataset, StreamSinkTransform
+
+
+def _consume(dataset, results):
+    for item in dataset:
+        results.append(item)
+
+
+def _frame_and_pid(frame):
+    return torch.as_tensor(frame), os.getpid()
+
+
+def _produce(dataset, num_frames):
+    for i in range(num_frames):
+        dataset.add_item(np.full(dataset.frame_shape, i, dataset.dtype))
+    dataset.add_item(SharedBufferDataset.STOP)
+
+
+class TestIterableBufferDataset(unittest.TestCase):
+    def test_items(self):
+        dataset = IterableBufferDataset(lambda x: x * 2)
+        for i in range(5):
+            dataset.add_item(i)
+        dataset.add_item(IterableBufferDataset.STOP)
+
+        self.assertEqual(list(dataset), [0, 2, 4, 6, 8])
+        self.assertFalse(dataset.is_running)
+
+    def test_wakes_on_item(self):
+        """
+        Test an item added while the consumer is waiting is yielded immediately.
+        """
+        dataset = IterableBufferDataset(lambda x: (x, time.perf_counter()))
+        results = []
+        thread = threading.Thread(target=_consume, args=(dataset, results))
+        thread.start()
+
+        time.sleep(0.05)
+        added = time.perf_counter()
+        dataset.add_item(1)
+        dataset.add_item(IterableBufferDataset.STOP)
+        thread.join(1.0)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results[0][0], 1)
+        self.assertLess(results[0][1] - added, 0.05)
+
+    def test_stop_wakes(self):
+        dataset = IterableBufferDataset(lambda x: x)
+        thread = threading.Thread(target=_consume, args=(dataset, []))
+        thread.start()
+
+        while not dataset.is_running:
+            time.sleep(0.001)
+
+        stopped = time.perf_counter()
+        dataset.stop()
+        thread.join(1.0)
+
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.perf_counter() - stopped, 0.05)
+
+    def test_full(self):
+        dataset = IterableBufferDataset(lambda x: x, buffer_size=2, timeout=0.01)
+        dataset.add_item(0)
+        dataset.add_item(1)
+
+        with self.assertRaises(Full):
+            dataset.add_item(2)
+
+    def test_batches(self):
+        """
+        Test batch mode drains the queued items into collated batches of at most batch_size, ending at STOP.
+        """
+        dataset = IterableBufferDataset(lambda x: torch.full((2,), x), batch_size=3)
+        for i in range(5):
+            dataset.add_item(i)
+        dataset.add_item(IterableBufferDataset.STOP)
+        dataset.add_item(5)
+
+        batches = list(dataset)
+
+        self.assertEqual([tuple(b.shape) for b in batches], [(3, 2), (2, 2)])
+        self.assertEqual(batches[1][:, 0].tolist(), [3, 4])
+        self.assertEqual(list(dataset.buffer), [5])
+
+
+class TestSharedBufferDataset(unittest.TestCase):
+    def test_main_process(self):
+        """
+        Test frames are yielded in order when read outside a worker, and that results aren't views of the slots.
+        """
+        dataset = SharedBufferDataset(lambda x: x, (2, 2), num_workers=2, num_slots=4)
+        try:
+            thread = threading.Thread(target=_produce, args=(dataset, 5))
+            thread.start()
+            results = list(dataset)
+            thread.join()
+            self.assertFalse(any(np.may_share_memory(r, dataset.frames) for r in results))
+        finally:
+            dataset.close()
+
+        self.assertEqual([int(r[0, 0]) for r in results], list(range(5)))
+
+    def test_full(self):
+        dataset = SharedBufferDataset(lambda x: x, (2, 2), num_slots=1)
+        try:
+            dataset.add_item(np.zeros((2, 2), np.uint8))
+            with self.assertRaises(Full):
+                dataset.add_item(np.zeros((2, 2), np.uint8))
+        finally:
+            dataset.close()
+
+    def test_invalid_frame(self):
+        """
+        Test a frame that can't be copied into a slot doesn't leave the slot unusable.
+        """
+        dataset = SharedBufferDataset(lambda x: x, (2, 2), num_slots=1)
+        try:
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    dataset.add_item(np.zeros((3, 3), np.uint8))
+
+            dataset.add_item(np.ones((2, 2), np.uint8))
+        finally:
+            dataset.close()
+
+    def test_data_loader_workers(self):
+        """
+        Test frames are transformed in the DataLoader's worker processes and come out in the order they were added.
+        """
+        dataset = SharedBufferDataset(_frame_and_pid, (4, 4, 3), num_workers=2, num_slots=4, timeout=10.0)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=2)
+        try:
+            thread = threading.Thread(target=_produce, args=(dataset, 9))
+            thread.start()
+            results = list(loader)
+            thread.join()
+        finally:
+            dataset.close()
+
+        self.assertEqual([int(frame[0, 0, 0]) for frame, _ in results], list(range(9)))
+        self.assertEqual(len({pid for _, pid in results}), 2)
+        self.assertNotIn(os.getpid(), {pid for _, pid in results})
+
+    def test_data_loader_workers_mismatch(self):
+        """
+        Test iterating in a DataLoader with a different number of workers than the dataset was created for fails.
+        """
+        dataset = SharedBufferDataset(_frame_and_pid, (4, 4, 3), num_workers=2, num_slots=4)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=None, num_workers=1)
+        try:
+            with self.assertRaises(ValueError):
+                list(loader)
+        finally:
+            dataset.close()
+
+
+class TestStreamSinkTransform(unittest.TestCase):
+    def test_keyed_results(self):
+        sink = StreamSinkTransform(result_key="pred", id_key="pts")
+        for pts in (10, 20, 30):
+            sink({"pts": pts, "pred": pts * 2})
+
+        self.assertEqual(sink.try_get(20), 40)
+        self.assertIsNone(sink.try_get(20))
+        self.assertEqual(sink.get_result(), 20)
+        self.assertEqual(sink.get_result(30), 60)
+
+    def test_drop_oldest(self):
+        """
+        Test storing never blocks once the buffer is full, dropping the oldest results instead.
+        """
+        sink = StreamSinkTransform(result_key="pred", buffer_size=2, timeout=0.01)
+        for i in range(5):
+            sink({"pred": i})
+
+        self.assertEqual(sink.dropped, 3)
+        self.assertEqual(list(sink.results.items()), [(3, 3), (4, 4)])
+
+        sink.get_result()
+        sink.get_result()
+        with self.assertRaises(Empty):
+            sink.get_result()
+
+    def test_get_result_waits(self):
+        sink = StreamSinkTransform(result_key="pred", id_key="id")
+        timer = threading.Timer(0.02, sink, args=({"id": "b", "pred": 2},))
+        timer.start()
+
+        self.assertEqual(sink.get_result("b", timeout=1.0), 2)
+        timer.join()
+
+    def test_callback(self):
+        received = []
+        sink = StreamSinkTransform(result_key="pred", callback=lambda *args: received.append(args))
+        sink({"pred": "x"})
+        sink({"pred": "y"})
+
+        self.assertEqual(received, [(0, "x"), (1, "y")])
+        self.assertEqual(len(sink.results), 0)
+
+    def test_async(self):
+        sink = StreamSinkTransform(result_key="pred", id_key="id")
+        sink({"id": 1, "pred": "stored"})
+
+        async def _wait():
+            waiting = asyncio.ensure_future(sink.get_result_async(2))
+            await asyncio.sleep(0)
+            threading.Thread(target=sink, args=({"id": 2, "pred": "later"},)).start()
+            return await sink.get_result_async(1), await asyncio.wait_for(waiting, 1.0)
+
+        self.assertEqual(asyncio.run(_wait()), ("stored", "later"))
+
+    def test_async_cancelled(self):
+        """
+        Test a result arriving for a waiter cancelled before it could be passed on is stored rather than lost.
+        """
+        sink = StreamSinkTransform(result_key="pred", id_key="id")
+
+        async def _cancel():
+            waiting = asyncio.ensure_future(sink.get_result_async(1))
+            await asyncio.sleep(0)
+            sink({"id": 1, "pred": "x"})
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            await asyncio.sleep(0)
+
+        asyncio.run(_cancel())
+        self.assertEqual(sink.try_get(1), "x")
+        self.assertEqual(sink._waiters, {})
+
+    def test_queue(self):
+        """
+        Test the queue view gives the results oldest first like the queue it replaced.
+        """
+        sink = StreamSinkTransform(result_key="pred")
+        sink({"pred": "a"})
+        sink({"pred": "b"})
+
+        self.assertEqual(sink.queue.qsize(), 2)
+        self.assertEqual(sink.queue.get(timeout=0.01), "a")
+        self.assertEqual(sink.queue.get_nowait(), "b")
+        self.assertTrue(sink.queue.empty())
+        with self.assertRaises(Empty):
+            sink.queue.get(block=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+# Copyright (c) MONAI Consortium
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from monaistream.streamrunners.queues import BlockingFrameQueue, QueuePolicy
+from monaistream.streamrunners.workers import OrderedWorkerPool
+
+
+def _delayed_square(x, delay):
+    time.sleep(delay)
+    return x * x
+
+
+def _fail(x):
+    raise ValueError(x)
+
+
+class TestOrderedWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.results = list()
+        self.pool = OrderedWorkerPool(lambda *r: self.results.append(r), num_workers=4)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_ordered_results(self):
+        """
+        Test results are passed on in submission order even when later calls finish first.
+        """
+        for i in range(8):
+            self.pool.submit(i, _delayed_square, i, 0.01 * (8 - i))
+
+        self.assertTrue(self.pool.join(5))
+        self.assertEqual(self.results, [(i, i * i, None) for i in range(8)])
+
+    def test_concurrent(self):
+        """
+        Test calls run concurrently on the workers.
+        """
+        start = time.monotonic()
+        for i in range(4):
+            self.pool.submit(i, _delayed_square, i, 0.2)
+        self.pool.join()
+
+        self.assertLess(time.monotonic() - start, 0.6)
+
+    def test_error(self):
+        self.pool.submit("a", _fail, 1)
+        self.pool.submit("b", _delayed_square, 2, 0)
+        self.pool.join()
+
+        self.assertEqual(self.results[0][0], "a")
+        self.assertIsInstance(self.results[0][2], ValueError)
+        self.assertEqual(self.results[1], ("b", 4, None))
+
+    def test_max_in_flight(self):
+        """
+        Test wait_for_slot only returns once fewer than max_in_flight calls are outstanding.
+        """
+        pool = OrderedWorkerPool(lambda *r: None, num_workers=2, max_in_flight=2)
+        release = threading.Event()
+
+        pool.submit(0, release.wait)
+        self.assertTrue(pool.wait_for_slot(0))
+        pool.submit(1, release.wait)
+        self.assertFalse(pool.wait_for_slot(0.01))
+
+        release.set()
+        self.assertTrue(pool.wait_for_slot(5))
+        pool.close()
+
+        with self.assertRaises(RuntimeError):
+            pool.submit(2, release.wait)
+
+    def test_process_workers(self):
+        pool = OrderedWorkerPool(lambda *r: self.results.append(r), num_workers=2, kind="process")
+        for i in range(4):
+            pool.submit(i, _delayed_square, i, 0)
+        pool.close()
+
+        self.assertEqual(self.results, [(i, i * i, None) for i in range(4)])
+
+
+class TestQueuePolicyWorkers(unittest.TestCase):
+    def test_create_pool(self):
+        self.assertIsNone(QueuePolicy().create_pool(print))
+
+        policy = QueuePolicy(workers=3, worker_kind="process")
+        pool = policy.create_pool(print)
+        self.assertEqual(pool.num_workers, 3)
+        self.assertEqual(pool.kind, "process")
+        self.assertEqual(pool.max_in_flight, 6)
+
+        # asynchronous calls always need a queue to hand frame sets to the pool
+        self.assertIsInstance(policy.create_queue(), BlockingFrameQueue)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            QueuePolicy(workers=-1)
+        with self.assertRaises(ValueError):
+            QueuePolicy(workers=1, worker_kind="fibre")
+        with self.assertRaises(ValueError):
+            QueuePolicy(workers=1, max_in_flight=0)
+
+
+if __name__ == "__main__":
+    unittest.main()